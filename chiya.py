@@ -1,4 +1,11 @@
-import glob
+import time
+
+# Taken before the other imports so the startup report covers them.
+boot_started = time.perf_counter()
+
+from utils.boot import boot, import_profile
+import_profile.start()
+
 import logging
 import os
 
@@ -8,6 +15,9 @@ from discord_slash import SlashCommand
 
 import __init__
 import utils.database
+from utils.config import store as config_store
+from utils.reloader import reloader
+from utils.slash_sync import slash_sync
 
 bot = commands.Bot(
     command_prefix=os.getenv("BOT_PREFIX"),
@@ -16,14 +26,26 @@ bot = commands.Bot(
 )
 
 slash = SlashCommand(
-    bot, 
-    sync_commands=True, # False to avoid rate limiting, set to True to update commands and parameters.
+    bot,
+    sync_commands=False, # Synced by finish_startup() instead, only sending the commands that changed since the last sync.
     sync_on_cog_reload=False
 )
 
 log = logging.getLogger(__name__)
 
 
+async def finish_startup():
+    """ Syncs the slash commands once the bot is logged in, then logs where the startup time went. """
+    with boot.phase("login"):
+        await bot.wait_until_ready()
+
+    with boot.phase("slash sync"):
+        await slash_sync.sync(slash)
+
+    log.info(boot.report())
+    log.info(f"The settings table was read {config_store.loads} time(s) during startup.")
+
+
 @bot.event
 async def on_ready():
     """Called when the client is done preparing the data received from Discord.
@@ -51,16 +73,29 @@ async def on_message(message: discord.Message):
     # Do nothing
 
 if __name__ == '__main__':
+    boot.record("imports", time.perf_counter() - boot_started)
+
     # Attempt to create the db, tables, and columns for Chiya.
-    utils.database.setup_db()
-
-    # Recursively loads in all the cogs in the folder named cogs.
-    # Skips over any cogs that start with '__' or do not end with .py.
-    for cog in glob.iglob("cogs/**/[!^_]*.py", recursive=True):
-        if "\\" in cog:  # Fix pathing on Windows.
-            bot.load_extension(cog.replace("\\", ".")[:-3])
-        else:  # Fix pathing on Linux.
-            bot.load_extension(cog.replace("/", ".")[:-3])
+    with boot.phase("database"):
+        utils.database.setup_db()
+
+        # Read the whole settings table in one query.
+        config_store.load()
+
+    # The slash command decorators of every cog look their guild and role IDs up at import time, serve them all from
+    # the copy that was just read rather than reloading it if SETTINGS_CACHE_TTL lapses halfway.
+    with config_store.pinned():
+        # Recursively loads in all the cogs in the folder named cogs, recording their hashes for !utilities reload.
+        # Skips over any cogs that start with '__' or do not end with .py.
+        with boot.phase("cogs"):
+            for extension, path in reloader.discover().items():
+                with boot.step("cogs", extension):
+                    reloader.load(bot, extension, path)
+
+    # Anything imported from here on is imported lazily on first use, outside of the profile.
+    import_profile.stop()
+
+    bot.loop.create_task(finish_startup())
 
     # Run the bot with the token as an environment variable.
     bot.run(os.getenv("BOT_TOKEN"))
@@ -1,7 +1,6 @@
-import glob
 import io
 import logging
-import re
+import os
 import textwrap
 import traceback
 from contextlib import redirect_stdout
@@ -11,12 +10,20 @@ from discord.ext import commands
 from discord.ext.commands import Cog, Bot, Context
 
 from cogs.commands import settings
-from utils import embeds
+from utils import database, embeds, export
+from utils.message_pipeline import pipeline
 from utils.record import record_usage
+from utils.reloader import reloader
+from utils.slash_sync import slash_sync
 
 # Enabling logs
 log = logging.getLogger(__name__)
 
+# Folder exports are written to before being attached, and kept in when they are too large to attach.
+EXPORT_DIR = os.getenv("EXPORT_DIR") or "exports"
+# Exports with more parts than this are left in EXPORT_DIR rather than attached, one message per part.
+EXPORT_MAX_ATTACHED_PARTS = 10
+
 
 class AdministrationCog(Cog):
     """ Administration Cog Cog """
@@ -47,6 +54,97 @@ class AdministrationCog(Cog):
         """Returns the Discord WebSocket latency."""
         await ctx.send(f"{round(self.bot.latency * 1000)}ms.")
 
+    @commands.is_owner()
+    @utilities.command(name="dbstats")
+    async def dbstats(self, ctx):
+        """Returns the database connection pool statistics."""
+        stats = database.pool_stats()
+        embed = embeds.make_embed(title="Database connection pool", color="blurple")
+        embed.add_field(name="Checked out:", value=f"{stats['checked_out']}/{stats['size']}", inline=True)
+        embed.add_field(name="Idle:", value=stats["checked_in"], inline=True)
+        embed.add_field(name="Overflow:", value=f"{stats['overflow']}/{stats['max_overflow']}", inline=True)
+        embed.add_field(name="Checkouts:", value=stats["checkouts"], inline=True)
+        embed.add_field(name="Average wait:", value=f"{stats['wait_avg'] * 1000:.2f}ms", inline=True)
+        embed.add_field(name="Longest wait:", value=f"{stats['wait_max'] * 1000:.2f}ms", inline=True)
+        await ctx.send(embed=embed)
+
+    @commands.is_owner()
+    @utilities.command(name="pipelinestats")
+    async def pipelinestats(self, ctx):
+        """Returns the time spent in each message pipeline stage."""
+        embed = embeds.make_embed(title="Message pipeline", color="blurple")
+        for stage in pipeline.stats():
+            embed.add_field(
+                name=f"{stage['priority']}. {stage['name']}",
+                value=(
+                    f"Calls: {stage['calls']}, handled: {stage['hits']}\n"
+                    f"Average: {stage['avg'] * 1000:.3f}ms, longest: {stage['max'] * 1000:.3f}ms"
+                ),
+                inline=False
+            )
+        if not embed.fields:
+            embed.description = "No stages are registered."
+        await ctx.send(embed=embed)
+
+    @commands.is_owner()
+    @utilities.command(name="export")
+    async def export_data(self, ctx, table: str, format: str = "jsonl", since: str = None, until: str = None, user: discord.User = None):
+        """Exports a table (mod_logs, timed_mod_actions or tickets) as gzip compressed jsonl or csv.
+
+        Dates are given as YYYY-MM-DD, use "-" to skip one. The export is attached in parts below Discord's upload
+        limit, or left in the EXPORT_DIR folder if there are too many parts to attach.
+        """
+        try:
+            since_time = export.parse_date(since) if since and since != "-" else None
+            until_time = export.parse_date(until) if until and until != "-" else None
+        except ValueError:
+            await embeds.error_message(ctx=ctx, description="Dates must be given as YYYY-MM-DD.")
+            return
+
+        # The export holds a database connection for a while, run it on the database thread pool.
+        async with ctx.typing():
+            try:
+                paths = await database.run(
+                    export.export_table,
+                    table,
+                    EXPORT_DIR,
+                    format=format,
+                    since=since_time,
+                    until=until_time,
+                    user_id=user.id if user else None,
+                    part_size=export.ATTACHMENT_PART_SIZE
+                )
+            except ValueError as error:
+                await embeds.error_message(ctx=ctx, description=str(error))
+                return
+
+        if not paths:
+            await embeds.error_message(ctx=ctx, description="No rows matched the export.")
+            return
+
+        if len(paths) > EXPORT_MAX_ATTACHED_PARTS:
+            await ctx.send(f"The export was too large to attach, it was saved as {len(paths)} parts in `{os.path.abspath(EXPORT_DIR)}`.")
+            return
+
+        # Each part is close to the upload limit, which applies to a message as a whole, so they are sent one by one.
+        sent = 0
+        try:
+            for path in paths:
+                await ctx.send(file=discord.File(path))
+                sent += 1
+        except discord.HTTPException as error:
+            log.exception(f"Unable to attach part {sent + 1} of the {table} export.")
+            await embeds.error_message(
+                ctx=ctx,
+                description=f"Only {sent} of {len(paths)} parts of the export could be attached: {error.text or error}"
+            )
+        finally:
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    log.exception(f"Unable to remove the export part {path}.")
+
     @commands.is_owner()
     @utilities.command(name="say")
     async def say(self, ctx, *, args):
@@ -124,46 +222,41 @@ class AdministrationCog(Cog):
                 embed.add_field(name="Output:", value=output, inline=False)
                 await ctx.send(embed=embed)
 
+    @commands.is_owner()
+    @utilities.command(name="sync")
+    async def sync_commands(self, ctx: commands.Context, full: bool = False):
+        """ Registers the slash commands that changed since the last sync, or all of them with `full`. """
+        async with ctx.typing():
+            summary = await slash_sync.sync(self.bot.slash, full=full)
+        await ctx.send(summary)
+
     @commands.is_owner()
     @utilities.command(name="reload")
     async def reload_cog(self, ctx: commands.Context, name_of_cog: str = None):
-        """ Reloads specified cog or all cogs. """
-
-        regex = r"(?<=<).*(?=\..* object at 0x.*>)"
-        if name_of_cog is not None and name_of_cog in ctx.bot.cogs:
-            # Reload cog if it exists.
-            cog = re.search(regex, str(ctx.bot.cogs[name_of_cog]))
-            try:
-                self.bot.reload_extension(cog.group())
-
-            except commands.ExtensionError as e:
-                await ctx.message.add_reaction("❌")
-                await ctx.send(f'{e.__class__.__name__}: {e}')
-
-            else:
-                await ctx.message.add_reaction("✔")
-                await ctx.send(f"Reloaded `{cog.group()}` module!")
-
-        elif name_of_cog is None:
-            # Reload all the cogs in the folder named cogs.
-            # Skips over any cogs that start with '__' or do not end with .py.
-            cogs = []
-            try:
-                for cog in glob.iglob("cogs/**/[!^_]*.py", recursive=True):
-                    if "\\" in cog:  # Pathing on Windows.
-                        self.bot.reload_extension(cog.replace("\\", ".")[:-3])
-                    else:  # Pathing on Linux.
-                        self.bot.reload_extension(cog.replace("/", ".")[:-3])
-            except commands.ExtensionError as e:
+        """ Reloads the cogs whose source changed and the cogs depending on them, or the specified cog. """
+        if name_of_cog is not None:
+            # Accept a cog name (e.g. BanCog) or an extension name (e.g. cogs.commands.moderation.bans).
+            extension = reloader.cog_extension(self.bot, name_of_cog)
+            if not extension:
                 await ctx.message.add_reaction("❌")
-                await ctx.send(f'{e.__class__.__name__}: {e}')
-
-            else:
-                await ctx.message.add_reaction("✔")
-                await ctx.send("Reloaded all modules!")
+                await ctx.send("Module not found, check spelling, it's case sensitive.")
+                return
+            result = reloader.reload(self.bot, only=extension)
         else:
-            await ctx.message.add_reaction("❌")
-            await ctx.send("Module not found, check spelling, it's case sensitive.")
+            result = reloader.reload(self.bot)
+
+        await ctx.message.add_reaction("❌" if result.failed else "✔")
+        embed = embeds.make_embed(
+            ctx=ctx,
+            title=f"Reloaded {result.touched} module{'s' if result.touched != 1 else ''}",
+            description=result.report()[:4096],
+            color="soft_red" if result.failed else "soft_green"
+        )
+        await ctx.send(embed=embed)
+
+        # Register the slash commands the reload changed, if any.
+        if result.touched:
+            await ctx.send(await slash_sync.sync(self.bot.slash))
 
     @commands.is_owner()
     @commands.bot_has_permissions(embed_links=True, send_messages=True)
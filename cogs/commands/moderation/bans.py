@@ -1,8 +1,10 @@
+import asyncio
 import datetime
 import logging
-import time
+import re
+from urllib.parse import urlsplit
 
-import dataset
+import aiohttp
 import discord
 from discord.ext import commands
 from discord.ext.commands import Cog, Bot
@@ -12,14 +14,51 @@ from discord_slash.utils.manage_commands import create_option, create_permission
 
 import utils.duration
 from cogs.commands import settings
-from utils import database
 from utils import embeds
+from utils import repositories
+from utils.ban_list import bans as ban_list
 from utils.moderation import can_action_member
 from utils.record import record_usage
 
 # Enabling logs
 log = logging.getLogger(__name__)
 
+# How many bans /massban sends at once. They all share one rate limit bucket, which discord.py waits on when emptied.
+MASSBAN_CONCURRENCY = 3
+# Most users a single /massban can take.
+MASSBAN_LIMIT = 1000
+# How often the /massban progress embed is refreshed, in seconds.
+MASSBAN_PROGRESS_INTERVAL = 2
+# The /massban file has to be a Discord attachment, so the bot never requests hosts a moderator picks.
+MASSBAN_FILE_HOSTS = ("cdn.discordapp.com", "media.discordapp.net")
+# Largest /massban file accepted, far more than MASSBAN_LIMIT IDs take.
+MASSBAN_FILE_SIZE = 1024 * 1024
+MASSBAN_FILE_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+
+def parse_user_ids(text: str) -> set:
+    """ Returns every user ID (snowflake) in a text, whatever separates them. """
+    return {int(user_id) for user_id in re.findall(r"\b\d{17,20}\b", text)}
+
+
+async def download_attachment(url: str) -> str:
+    """ Returns the text of a file uploaded to Discord, raising ValueError if the URL isn't one or the file is too large. """
+    parts = urlsplit(url)
+    if parts.scheme != "https" or parts.hostname not in MASSBAN_FILE_HOSTS or not parts.path.startswith("/attachments/"):
+        raise ValueError("Only links to files uploaded to Discord are accepted.")
+
+    async with aiohttp.ClientSession(timeout=MASSBAN_FILE_TIMEOUT) as session:
+        # Redirects are not followed, they could lead anywhere.
+        async with session.get(url, allow_redirects=False) as response:
+            response.raise_for_status()
+            if response.content_length is not None and response.content_length > MASSBAN_FILE_SIZE:
+                raise ValueError(f"The file is larger than {MASSBAN_FILE_SIZE // 1024} KiB.")
+            # The declared length can be missing or wrong, read one byte past the limit to tell.
+            data = await response.content.read(MASSBAN_FILE_SIZE + 1)
+            if len(data) > MASSBAN_FILE_SIZE:
+                raise ValueError(f"The file is larger than {MASSBAN_FILE_SIZE // 1024} KiB.")
+    return data.decode("utf-8", errors="replace")
+
 
 class BanCog(Cog):
     """ Ban Cog """
@@ -29,54 +68,50 @@ class BanCog(Cog):
 
     @staticmethod
     async def ban_member(ctx: SlashContext, user: discord.User, reason: str, temporary: bool = False, end_time: float = None, delete_message_days: int = 0):
-        # Info: https://discordpy.readthedocs.io/en/stable/api.html#discord.Guild.ban
-        await ctx.guild.ban(user=user, reason=reason, delete_message_days=delete_message_days)
+        # The ban is logged below, tell the ban listener not to log its ban event as well.
+        bans_handler = ctx.bot.get_cog("BansHandler")
+        if bans_handler:
+            bans_handler.expect_ban(ctx.guild, user.id)
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
+        # Info: https://discordpy.readthedocs.io/en/stable/api.html#discord.Guild.ban
+        try:
+            await ctx.guild.ban(user=user, reason=reason, delete_message_days=delete_message_days)
+        except discord.HTTPException:
+            if bans_handler:
+                bans_handler.forget_ban(ctx.guild, user.id)
+            raise
+        ban_list.add(ctx.guild, user.id)
 
         # Add the ban to the mod_log database.
-        db["mod_logs"].insert(dict(
-            user_id=user.id, mod_id=ctx.author.id, timestamp=int(time.time()), reason=reason, type="ban"
-        ))
+        await repositories.mod_logs.add(user_id=user.id, mod_id=ctx.author.id, type="ban", reason=reason)
 
         # Stores the action in a separate table for the scheduler to handle unbanning later.
         if temporary:
-            db["timed_mod_actions"].insert(dict(
-                user_id=user.id,
-                mod_id=ctx.author.id,
-                action_type="ban",
-                reason=reason,
-                start_time=datetime.datetime.now(tz=datetime.timezone.utc).timestamp(),
-                end_time=end_time,
-                is_done=False
-            ))
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
-
-    async def unban_user(self, user: discord.User, reason: str, ctx: SlashContext = None, guild: discord.Guild = None):
+            action_id = await repositories.timed_mod_actions.add(
+                user_id=user.id, mod_id=ctx.author.id, action_type="ban", reason=reason, end_time=end_time
+            )
+
+            # Register the deadline so the ban is reversed as soon as it expires.
+            timed_mod_actions = ctx.bot.get_cog("TimedModActionsTask")
+            if timed_mod_actions:
+                timed_mod_actions.schedule(action_id, end_time)
+
+    async def unban_user(self, user: discord.User, reason: str, ctx: SlashContext = None, guild: discord.Guild = None) -> bool:
+        """ Unbans the user, returning False if they weren't banned. """
         guild = guild or ctx.guild
         moderator = ctx.author if ctx else self.bot.user
 
         # Info: https://discordpy.readthedocs.io/en/stable/api.html#discord.Guild.unban
         try:
             await guild.unban(user=user, reason=reason)
-        except discord.HTTPException:
-            return
-
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
+        except discord.NotFound:
+            ban_list.discard(guild, user.id)
+            return False
+        ban_list.discard(guild, user.id)
 
         # Add the unban to the mod_log database.
-        db["mod_logs"].insert(dict(
-            user_id=user.id, mod_id=moderator.id, timestamp=int(time.time()), reason=reason, type="unban"
-        ))
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        await repositories.mod_logs.add(user_id=user.id, mod_id=moderator.id, type="unban", reason=reason)
+        return True
 
     async def is_user_in_guild(self, guild: discord.Guild, user: discord.User):
         # Checks to see if the user is in the guild. If true, return the member, or None otherwise.
@@ -87,13 +122,18 @@ class BanCog(Cog):
         return None
 
     async def is_user_banned(self, guild: discord.Guild, user: discord.User) -> bool:
-        # Checks to see if the user is already banned.
+        # Checks to see if the user is already banned, from the ban list mirror rather than the API.
         guild = self.bot.get_guild(guild)
+        if await ban_list.is_banned(guild, user.id):
+            return True
+
+        # The mirror can lag behind, confirm a miss with Discord before acting on it.
         try:
             await guild.fetch_ban(user)
-            return True
-        except discord.HTTPException:
+        except discord.NotFound:
             return False
+        ban_list.add(guild, user.id)
+        return True
 
     @staticmethod
     async def send_banned_dm_embed(ctx: SlashContext, user: discord.User, reason: str = None, duration: str = None) -> bool:
@@ -236,6 +276,161 @@ class BanCog(Cog):
         await self.ban_member(ctx=ctx, user=user, delete_message_days=daystodelete, reason=reason, temporary=True, end_time=ban_end_time.timestamp())
         await ctx.send(embed=embed)
 
+    @commands.bot_has_permissions(ban_members=True, send_messages=True)
+    @commands.before_invoke(record_usage)
+    @cog_ext.cog_slash(
+        name="massban",
+        description="Bans many users at once, e.g. during a raid",
+        guild_ids=[settings.get_value("guild_id")],
+        options=[
+            create_option(
+                name="ids",
+                description="The IDs of the users to ban, separated by spaces or commas",
+                option_type=3,
+                required=False
+            ),
+            create_option(
+                name="file",
+                description="Link to a text file uploaded to Discord with the IDs of the users to ban",
+                option_type=3,
+                required=False
+            ),
+            create_option(
+                name="joined",
+                description="Ban every member that joined in the last this many minutes",
+                option_type=4,
+                required=False
+            ),
+            create_option(
+                name="reason",
+                description="The reason why the users are being banned",
+                option_type=3,
+                required=False
+            ),
+            create_option(
+                name="daystodelete",
+                description="The number of days of messages to delete from the users, up to 7",
+                option_type=4,
+                required=False
+            ),
+        ],
+        default_permission=False,
+        permissions={
+            settings.get_value("guild_id"): [
+                create_permission(settings.get_value("role_staff"), SlashCommandPermissionType.ROLE, True)
+            ]
+        }
+    )
+    async def mass_ban(self, ctx: SlashContext, ids: str = None, file: str = None, joined: int = None, reason: str = None, daystodelete: int = 0):
+        """ Bans a list of users, the users from a file or the latest joins, without DMing them. """
+        await ctx.defer()
+
+        # Discord caps embed fields at a ridiculously low character limit, avoids problems with future embeds.
+        if not reason:
+            reason = "No reason provided."
+        elif len(reason) > 512:
+            await embeds.error_message(ctx=ctx, description="Reason must be less than 512 characters.")
+            return
+
+        # Gather the users to ban from every selector that was given.
+        user_ids = set()
+        if ids:
+            user_ids |= parse_user_ids(ids)
+        if file:
+            try:
+                user_ids |= parse_user_ids(await download_attachment(file))
+            except ValueError as error:
+                await embeds.error_message(ctx=ctx, description=str(error))
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                log.exception(f"Unable to download the /massban file {file}.")
+                await embeds.error_message(ctx=ctx, description="Unable to download the file of IDs.")
+                return
+        if joined:
+            joined_after = datetime.datetime.utcnow() - datetime.timedelta(minutes=joined)
+            user_ids |= {member.id for member in ctx.guild.members if member.joined_at and member.joined_at >= joined_after}
+
+        if not user_ids:
+            await embeds.error_message(ctx=ctx, description="No users to ban, give their IDs, a file of IDs or a join window.")
+            return
+        if len(user_ids) > MASSBAN_LIMIT:
+            await embeds.error_message(ctx=ctx, description=f"Cannot ban more than {MASSBAN_LIMIT} users at once ({len(user_ids)} given).")
+            return
+
+        # Skip the users that are already banned, from the ban list mirror rather than a request per user.
+        already_banned = user_ids & await ban_list.banned(ctx.guild)
+
+        # Skip the members the moderator isn't allowed to action as well.
+        protected = set()
+        for user_id in user_ids - already_banned:
+            member = ctx.guild.get_member(user_id)
+            if member and (member.bot or not await can_action_member(bot=self.bot, ctx=ctx, member=member)):
+                protected.add(user_id)
+
+        queue = asyncio.Queue()
+        for user_id in sorted(user_ids - already_banned - protected):
+            queue.put_nowait(user_id)
+        total = queue.qsize()
+        banned, failed = [], []
+
+        def progress_embed(done: bool = False) -> discord.Embed:
+            embed = embeds.make_embed(
+                ctx=ctx,
+                title="Mass ban complete" if done else "Mass ban in progress",
+                description=f"Banned {len(banned)} of {total} users for: {reason}",
+                thumbnail_url="https://i.imgur.com/l0jyxkz.png",
+                color="soft_red"
+            )
+            if already_banned:
+                embed.add_field(name="Already banned:", value=len(already_banned), inline=True)
+            if protected:
+                embed.add_field(name="Skipped:", value=f"{len(protected)} (bots or members you cannot action)", inline=True)
+            if failed:
+                embed.add_field(name="Failed:", value=" ".join(str(user_id) for user_id in failed)[:1024], inline=False)
+            return embed
+
+        # The bans are logged below, the ban listener shouldn't log their ban events as well.
+        bans_handler = self.bot.get_cog("BansHandler")
+
+        async def worker():
+            while not queue.empty():
+                user_id = queue.get_nowait()
+                if bans_handler:
+                    bans_handler.expect_ban(ctx.guild, user_id)
+                try:
+                    # The user doesn't need to be fetched to be banned, which saves a request per ban.
+                    await ctx.guild.ban(user=discord.Object(id=user_id), reason=reason, delete_message_days=daystodelete)
+                    banned.append(user_id)
+                except discord.HTTPException:
+                    failed.append(user_id)
+                    if bans_handler:
+                        bans_handler.forget_ban(ctx.guild, user_id)
+
+        async def report_progress():
+            while True:
+                await asyncio.sleep(MASSBAN_PROGRESS_INTERVAL)
+                await message.edit(embed=progress_embed())
+
+        message = await ctx.send(embed=progress_embed(done=not total))
+        if not total:
+            return
+
+        reporter = self.bot.loop.create_task(report_progress())
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(MASSBAN_CONCURRENCY, total))))
+        finally:
+            reporter.cancel()
+            # Retrieve how the reporter ended, e.g. the progress message was deleted, so it isn't lost.
+            outcome, = await asyncio.gather(reporter, return_exceptions=True)
+            if isinstance(outcome, Exception):
+                log.error("Unable to update the /massban progress.", exc_info=outcome)
+
+        # Add all the bans to the mod_log database at once.
+        await repositories.mod_logs.add_many([
+            dict(user_id=user_id, mod_id=ctx.author.id, type="ban", reason=reason) for user_id in banned
+        ])
+        await message.edit(embed=progress_embed(done=True))
+
     @commands.bot_has_permissions(ban_members=True, send_messages=True)
     @commands.before_invoke(record_usage)
     @cog_ext.cog_slash(
@@ -293,8 +488,11 @@ class BanCog(Cog):
             color="soft_green"
         )
 
-        # Unbans the user and returns the embed letting the moderator know they were successfully banned.
-        await self.unban_user(ctx=ctx, user=user, reason=reason)
+        # Unbans the user and returns the embed letting the moderator know they were successfully unbanned.
+        if not await self.unban_user(ctx=ctx, user=user, reason=reason):
+            # They were unbanned by someone else meanwhile.
+            await embeds.error_message(ctx=ctx, description=f"{user.mention} is not banned.")
+            return
         await ctx.send(embed=embed)
 
 
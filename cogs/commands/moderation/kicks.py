@@ -1,7 +1,5 @@
 import logging
-import time
 
-import dataset
 import discord
 from discord.ext import commands
 from discord.ext.commands import Cog, Bot
@@ -10,8 +8,8 @@ from discord_slash.model import SlashCommandPermissionType
 from discord_slash.utils.manage_commands import create_option, create_permission
 
 from cogs.commands import settings
-from utils import database
 from utils import embeds
+from utils import repositories
 from utils.moderation import can_action_member
 from utils.record import record_usage
 
@@ -106,17 +104,8 @@ class KickCog(Cog):
         # Info: https://discordpy.readthedocs.io/en/stable/api.html#discord.Guild.kick
         await ctx.guild.kick(user=member, reason=reason)
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Add the kick to the mod_log database.
-        db["mod_logs"].insert(dict(
-            user_id=member.id, mod_id=ctx.author.id, timestamp=int(time.time()), reason=reason, type="kick"
-        ))
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        await repositories.mod_logs.add(user_id=member.id, mod_id=ctx.author.id, type="kick", reason=reason)
 
 
 def setup(bot: Bot) -> None:
@@ -1,10 +1,7 @@
 import datetime
 import logging
-import time
 
-import dataset
 import discord
-import privatebinapi
 from discord.ext import commands
 from discord.ext.commands import Cog, Bot
 from discord_slash import cog_ext, SlashContext
@@ -13,10 +10,13 @@ from discord_slash.utils.manage_commands import create_option, create_permission
 
 import utils.duration
 from cogs.commands import settings
-from utils import database
 from utils import embeds
+from utils import repositories
+from utils import resources
 from utils.moderation import can_action_member
 from utils.record import record_usage
+from utils.transcript_journal import journal
+from utils.transcripts import uploader
 
 # Enabling logs
 log = logging.getLogger(__name__)
@@ -30,59 +30,41 @@ class MuteCog(Cog):
 
     @staticmethod
     async def mute_member(ctx: SlashContext, member: discord.Member, reason: str, temporary: bool = False, end_time: float = None) -> None:
-        role = discord.utils.get(ctx.guild.roles, id=settings.get_value("role_muted"))
+        role = resources.role(ctx.guild, "role_muted")
         await member.add_roles(role, reason=reason)
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Add the mute to the mod_log database.
-        db["mod_logs"].insert(dict(
-            user_id=member.id, mod_id=ctx.author.id, timestamp=int(time.time()), reason=reason, type="mute"
-        ))
+        await repositories.mod_logs.add(user_id=member.id, mod_id=ctx.author.id, type="mute", reason=reason)
 
         # Occurs when the duration parameter in /mute is specified (tempmute).
         if temporary:
-            db["timed_mod_actions"].insert(dict(
-                user_id=member.id,
-                mod_id=ctx.author.id,
-                action_type="mute",
-                reason=reason,
-                start_time=datetime.datetime.now(tz=datetime.timezone.utc).timestamp(),
-                end_time=end_time,
-                is_done=False
-            ))
-
-        # Commit the changes to the database.
-        db.commit()
-        db.close()
+            action_id = await repositories.timed_mod_actions.add(
+                user_id=member.id, mod_id=ctx.author.id, action_type="mute", reason=reason, end_time=end_time
+            )
+
+            # Register the deadline so the mute is reversed as soon as it expires.
+            timed_mod_actions = ctx.bot.get_cog("TimedModActionsTask")
+            if timed_mod_actions:
+                timed_mod_actions.schedule(action_id, end_time)
 
     async def unmute_member(self, member: discord.Member, reason: str, ctx: SlashContext = None, guild: discord.Guild = None) -> None:
         guild = guild or ctx.guild
         moderator = ctx.author if ctx else self.bot.user
 
         # Removes "Muted" role from member.
-        role = discord.utils.get(guild.roles, id=settings.get_value("role_muted"))
+        role = resources.role(guild, "role_muted")
         await member.remove_roles(role, reason=reason)
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
-        # Add the unmute to the mod_log database.
-        db["mod_logs"].insert(dict(
-            user_id=member.id, mod_id=moderator.id, timestamp=int(time.time()), reason=reason, type="unmute"
-        ))
-        tempmute_entry = db["timed_mod_actions"].find_one(user_id=member.id, is_done=False)
-        if tempmute_entry:
-            db["timed_mod_actions"].update(dict(id=tempmute_entry["id"], is_done=True), ["id"])
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        # Add the unmute to the mod_log database and resolve the tempmute, if any, dropping its deadline.
+        await repositories.mod_logs.add(user_id=member.id, mod_id=moderator.id, type="unmute", reason=reason)
+        entry = await repositories.timed_mod_actions.resolve(user_id=member.id)
+        timed_mod_actions = self.bot.get_cog("TimedModActionsTask")
+        if entry and timed_mod_actions:
+            timed_mod_actions.cancel(entry["id"])
 
     @staticmethod
     async def is_user_muted(ctx: SlashContext, member: discord.Member) -> bool:
-        if discord.utils.get(ctx.guild.roles, id=settings.get_value("role_muted")) in member.roles:
+        if resources.role(ctx.guild, "role_muted") in member.roles:
             return True
         return False
 
@@ -138,12 +120,12 @@ class MuteCog(Cog):
             duration = "Indefinite"
 
         # Create a channel in the category specified in settings.
-        category = discord.utils.get(ctx.guild.categories, id=settings.get_value("category_tickets"))
+        category = resources.channel(ctx.guild, "category_tickets")
         channel = await ctx.guild.create_text_channel(f"mute-{member.id}", category=category)
 
         # Give both the staff and the user perms to access the channel. 
-        await channel.set_permissions(discord.utils.get(ctx.guild.roles, id=settings.get_value("role_trial_mod")), read_messages=True)
-        await channel.set_permissions(discord.utils.get(ctx.guild.roles, id=settings.get_value("role_staff")), read_messages=True)
+        await channel.set_permissions(resources.role(ctx.guild, "role_trial_mod"), read_messages=True)
+        await channel.set_permissions(resources.role(ctx.guild, "role_staff"), read_messages=True)
         await channel.set_permissions(member, read_messages=True)
 
         # Create embed at the start of the channel letting the user know how long they're muted for and why.
@@ -171,25 +153,17 @@ class MuteCog(Cog):
             return
 
         guild = guild or ctx.guild
-        category = discord.utils.get(guild.categories, id=settings.get_value("category_tickets"))
+        category = resources.channel(guild, "category_tickets")
         mute_channel = discord.utils.get(category.channels, name=f"mute-{user_id}")
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
+        # Gets the most recent mute and unmute for the user.
+        mute_entry = await repositories.mod_logs.latest(user_id=user_id, type="mute")
+        unmute_entry = await repositories.mod_logs.latest(user_id=user_id, type="unmute")
 
-        #  TODO: Get the mute reason by looking up the latest mute for the user and getting the reason column data.
-        table = db["mod_logs"]
-        # Gets the most recent mute for the user, sorted by descending (-) ID.
-        mute_entry = table.find_one(user_id=user_id, type="mute", order_by="-id")
-        unmute_entry = table.find_one(user_id=user_id, type="unmute", order_by="-id")
         mute_reason = mute_entry["reason"]
         muter = await self.bot.fetch_user(mute_entry["mod_id"])
         unmuter = await self.bot.fetch_user(unmute_entry["mod_id"])
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
-
         # Get the member object of the ticket creator.
         member = await self.bot.fetch_user(user_id)
 
@@ -209,26 +183,23 @@ class MuteCog(Cog):
         mod_list.add(muter)
 
         # Fetch the staff and trial mod role.
-        role_staff = discord.utils.get(guild.roles, id=settings.get_value("role_staff"))
-        role_trial_mod = discord.utils.get(guild.roles, id=settings.get_value("role_trial_mod"))
+        role_staff = resources.role(guild, "role_staff")
+        role_trial_mod = resources.role(guild, "role_trial_mod")
 
         # TODO: Implement so it gets the channel when the moderator is the bot
-        # Loop through all messages in the ticket from old to new.
-        async for message in mute_channel.history(oldest_first=True):
-            # Ignore the bot replies.
-            if not message.author.bot:
-                # Time format is unnecessarily lengthy so trimming it down and keep the log go easier on the eyes.
-                formatted_time = str(message.created_at).split(".")[-2]
-                # Append the new messages to the current log as we loop.
-                message_log += f"[{formatted_time}] {message.author}: {message.content}\n"
-                # Iterates only through members that is still in the server.
-                if isinstance(member, discord.Member):
-                    # If the messenger has either staff role or trial mod role, add their ID to the mod_list set.
-                    if role_staff in message.author.roles or role_trial_mod in message.author.roles:
-                        mod_list.add(message.author)
-
-        # Dump message log to PrivateBin. This returns a dictionary, but only the url is needed for the embed.
-        url = privatebinapi.send("https://bin.piracy.moe", text=message_log, expiration="never")["full_url"]
+        # Get the messages in the mute channel from old to new, the bot replies are already left out.
+        entries = await journal.entries(mute_channel)
+        message_log += journal.format(entries)
+
+        for entry in entries:
+            # Iterates only through members that is still in the server.
+            if isinstance(member, discord.Member):
+                # If the messenger has either staff role or trial mod role, add their ID to the mod_list set.
+                if role_staff in entry.author.roles or role_trial_mod in entry.author.roles:
+                    mod_list.add(entry.author)
+
+        # Dump message log to PrivateBin, or keep a local copy to attach if it can't be reached right now.
+        transcript = await uploader.archive(message_log, name=mute_channel.name)
 
         # Get the amount of time elapsed since the user was muted.
         time_delta = datetime.datetime.utcnow() - mute_channel.created_at
@@ -273,11 +244,12 @@ class MuteCog(Cog):
         embed.add_field(name="Unmute Reason:", value=reason, inline=False)
         embed.add_field(name="Duration:", value=elapsed_time, inline=False)
         embed.add_field(name="Participating Moderators:", value=" ".join(mod.mention for mod in mod_list), inline=False)
-        embed.add_field(name="Mute Log: ", value=url, inline=False)
+        embed.add_field(name="Mute Log: ", value=transcript.link, inline=False)
 
-        # Send the embed to #mute-log.
-        mute_log = discord.utils.get(guild.channels, id=settings.get_value("channel_mute_log"))
-        await mute_log.send(embed=embed)
+        # Send the embed to #mute-log, along with the local copy of the transcript if the upload is still pending.
+        mute_log = resources.channel(guild, "channel_mute_log")
+        archive = await mute_log.send(embed=embed, file=transcript.file())
+        await uploader.track(transcript, archive)
 
         # Delete the mute channel.
         await mute_channel.delete()
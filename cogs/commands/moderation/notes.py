@@ -1,9 +1,7 @@
 import asyncio
 import datetime
 import logging
-import time
 
-import dataset
 import discord
 from discord.embeds import Embed
 from discord.ext import commands
@@ -13,8 +11,9 @@ from discord_slash.model import SlashCommandPermissionType
 from discord_slash.utils.manage_commands import create_option, create_permission
 
 from cogs.commands import settings
-from utils import database
 from utils import embeds
+from utils import repositories
+from utils.pagination import KeysetPageSource, LinePaginator
 from utils.record import record_usage
 
 # Enabling logs
@@ -63,13 +62,8 @@ class NotesCog(Cog):
         if not isinstance(user, discord.Member):
             user = await self.bot.fetch_user(user)
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Add the note to the mod_logs database.
-        note_id = db["mod_logs"].insert(dict(
-            user_id=user.id, mod_id=ctx.author.id, timestamp=int(time.time()), reason=note, type="note"
-        ))
+        note_id = await repositories.mod_logs.add(user_id=user.id, mod_id=ctx.author.id, type="note", reason=note)
 
         embed = embeds.make_embed(
             ctx=ctx,
@@ -82,10 +76,6 @@ class NotesCog(Cog):
         embed.add_field(name="Note: ", value=note, inline=False)
         await ctx.send(embed=embed)
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
-
     @cog_ext.cog_slash(
         name="search",
         description="View users notes and mod actions history",
@@ -120,72 +110,33 @@ class NotesCog(Cog):
         if not isinstance(user, discord.Member):
             user = await self.bot.fetch_user(user)
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Querying DB for the list of actions matching the filter criteria (if mentioned).
-        mod_logs = db["mod_logs"]
         options = ["ban", "unban", "mute", "unmute", "restrict", "unrestrict", "warn", "kick", "note"]
         if action:
             # Attempt to check for the plural form of the options and strip it.
             if action[-1] == "s":
                 action = action[:-1]
-            if any(action == option for option in options):
-                results = mod_logs.find(user_id=user.id, type=action.lower())
-            else:
+            if not any(action == option for option in options):
                 await embeds.error_message(
                     ctx=ctx,
                     description=f"\"{action}\" is not a valid mod action filter. \n\nValid filters: ban, unban, mute, unmute, restrict, unrestrict, warn, kick, note"
                 )
-                # Close the connection.
-                db.close()
                 return
-        else:
-            results = mod_logs.find(user_id=user.id)
 
-        # Creating a list to store actions for the paginator.
-        actions = []
-        page_no = 0
-        # Number of results per page.
-        per_page = 4
-        # Creating a temporary list to store the per_page number of actions.
-        page = []
+        action_type = action.lower() if action else None
 
-        for entry in results:
-            # Appending dict of action to the particular page.
-            page.append(dict(
-                id=entry["id"],
-                user_id=entry["user_id"],
-                mod_id=entry["mod_id"],
-                reason=entry["reason"],
-                type=entry["type"],
-                timestamp=entry["timestamp"]
-            ).copy())
-
-            if (page_no + 1) % per_page == 0 and page_no != 0:
-                # Appending the current page to the main actions list and resetting the page.
-                actions.append(page.copy())
-                page = []
-
-            # Incrementing the counter variable.
-            page_no += 1
-
-        if not (page_no + 1) % per_page == 0 and len(page) != 0:
-            # For the situations when some pages were left behind.
-            actions.append(page.copy())
-
-        if not actions:
+        # Only count the user's mod logs here, the pages are fetched as they are shown.
+        total = await repositories.mod_logs.count_for_user(user_id=user.id, type=action_type)
+        if not total:
             # Nothing was found, so returning an appropriate error.
             await embeds.error_message(ctx=ctx, description="No mod actions found for that user!")
             return
 
-        page_no = 0
-
-        # Close the connection.
-        db.close()
+        async def fetch(**kwargs) -> list:
+            return await repositories.mod_logs.page_for_user(user_id=user.id, type=action_type, **kwargs)
 
-        def get_page(action_list, user, page_no: int) -> Embed:
-            embed = embeds.make_embed(title="Mod Actions", description=f"Page {page_no + 1} of {len(action_list)}")
+        def get_page(action_list: list, page_no: int) -> Embed:
+            embed = embeds.make_embed(title="Mod Actions", description=f"Page {page_no + 1} of {source.page_count}")
             embed.set_author(name=user, icon_url=user.avatar_url)
             action_emoji = dict(
                 mute="🤐",
@@ -198,7 +149,7 @@ class NotesCog(Cog):
                 unrestrict="✅",
                 note="🗒️"
             )
-            for action in action_list[page_no]:
+            for action in action_list:
                 action_type = action["type"]
                 # Capitalising the first letter of the action type.
                 action_type = action_type[0].upper() + action_type[1:]
@@ -214,8 +165,13 @@ class NotesCog(Cog):
 
             return embed
 
+        # Number of results per page.
+        source = KeysetPageSource(fetch=fetch, render=get_page, total=total, per_page=4)
+        page_no = 0
+
         # Sending the first page. We'll edit this during pagination.
-        msg = await ctx.send(embed=get_page(action_list=actions, user=user, page_no=page_no))
+        msg = await ctx.send(embed=await source.get_page(page_no))
+        source.prefetch(page_no + 1)
 
         first_emoji = "\u23EE"  # [:track_previous:]
         left_emoji = "\u2B05"  # [:arrow_left:]
@@ -240,7 +196,7 @@ class NotesCog(Cog):
 
         while True:
             try:
-                reaction, user = await bot.wait_for("reaction_add", timeout=timeout, check=check)
+                reaction, reactor = await bot.wait_for("reaction_add", timeout=timeout, check=check)
             except asyncio.TimeoutError:
                 await msg.delete()
                 break
@@ -254,34 +210,127 @@ class NotesCog(Cog):
                 break
 
             if reaction.emoji == first_emoji:
-                await msg.remove_reaction(reaction.emoji, user)
+                await msg.remove_reaction(reaction.emoji, reactor)
                 page_no = 0
 
             if reaction.emoji == last_emoji:
-                await msg.remove_reaction(reaction.emoji, user)
-                page_no = len(actions) - 1
+                await msg.remove_reaction(reaction.emoji, reactor)
+                page_no = source.page_count - 1
 
             if reaction.emoji == left_emoji:
-                await msg.remove_reaction(reaction.emoji, user)
+                await msg.remove_reaction(reaction.emoji, reactor)
 
                 if page_no <= 0:
-                    page_no = len(actions) - 1
+                    page_no = source.page_count - 1
                 else:
                     page_no -= 1
 
             if reaction.emoji == right_emoji:
-                await msg.remove_reaction(reaction.emoji, user)
+                await msg.remove_reaction(reaction.emoji, reactor)
 
-                if page_no >= len(actions) - 1:
+                if page_no >= source.page_count - 1:
                     page_no = 0
                 else:
                     page_no += 1
 
-            embed = get_page(action_list=actions, user=user, page_no=page_no)
+            embed = await source.get_page(page_no)
 
             if embed is not None:
                 await msg.edit(embed=embed)
 
+            # Have the page the user is most likely to ask for next ready.
+            source.prefetch(page_no + 1 if page_no < source.page_count - 1 else 0)
+
+    @commands.bot_has_permissions(send_messages=True)
+    @commands.before_invoke(record_usage)
+    @cog_ext.cog_slash(
+        name="searchlogs",
+        description="Search the reasons of all notes and mod actions",
+        guild_ids=[settings.get_value("guild_id")],
+        options=[
+            create_option(
+                name="query",
+                description="The words to look for in the reasons",
+                option_type=3,
+                required=True
+            ),
+            create_option(
+                name="action",
+                description="Filter specific actions (ban, unban, mute, unmute, warn, kick)",
+                option_type=3,
+                required=False
+            ),
+            create_option(
+                name="since",
+                description="Only show actions taken on or after this date (YYYY-MM-DD)",
+                option_type=3,
+                required=False
+            ),
+            create_option(
+                name="until",
+                description="Only show actions taken before this date (YYYY-MM-DD)",
+                option_type=3,
+                required=False
+            ),
+        ],
+        default_permission=False,
+        permissions={
+            settings.get_value("guild_id"): [
+                create_permission(settings.get_value("role_staff"), SlashCommandPermissionType.ROLE, True),
+                create_permission(settings.get_value("role_trial_mod"), SlashCommandPermissionType.ROLE, True)
+            ]
+        }
+    )
+    async def search_log_reasons(self, ctx: SlashContext, query: str, action: str = None, since: str = None, until: str = None):
+        """ Searches the reasons of every mod action, best match first. """
+        await ctx.defer()
+
+        # Attempt to check for the plural form of the action filter and strip it.
+        options = ["ban", "unban", "mute", "unmute", "restrict", "unrestrict", "warn", "kick", "note"]
+        if action:
+            action = action.lower()
+            if action[-1] == "s":
+                action = action[:-1]
+            if action not in options:
+                await embeds.error_message(
+                    ctx=ctx,
+                    description=f"\"{action}\" is not a valid mod action filter. \n\nValid filters: {', '.join(options)}"
+                )
+                return
+
+        # Convert the date range to UTC timestamps.
+        try:
+            since_time = datetime.datetime.strptime(since, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp() if since else None
+            until_time = datetime.datetime.strptime(until, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp() if until else None
+        except ValueError:
+            await embeds.error_message(ctx=ctx, description="Dates must be given as YYYY-MM-DD.")
+            return
+
+        results = await repositories.mod_logs.search_reasons(query, type=action, since=since_time, until=until_time)
+        if not results:
+            await embeds.error_message(ctx=ctx, description="No mod actions found matching that search!")
+            return
+
+        lines = []
+        for entry in results:
+            timestamp = datetime.datetime.fromtimestamp(entry["timestamp"], tz=datetime.timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+            reason = entry["reason"] if len(entry["reason"] or "") <= 200 else entry["reason"][:200] + "..."
+            lines.append(
+                f"**{entry['type'].capitalize()} | ID: {entry['id']}** ({timestamp})\n"
+                f"**User:** <@!{entry['user_id']}> **Moderator:** <@!{entry['mod_id']}>\n"
+                f"**Reason:** {reason}"
+            )
+
+        embed = embeds.make_embed(
+            ctx=ctx,
+            title=f"Mod actions matching \"{query}\"",
+            thumbnail_url="https://i.imgur.com/A4c19BJ.png",
+            color="blurple"
+        )
+
+        # Paginate results.
+        await LinePaginator.paginate(lines, ctx=ctx, embed=embed, max_lines=5, max_size=2000, restrict_to_user=ctx.author)
+
     @commands.bot_has_permissions(send_messages=True)
     @commands.before_invoke(record_usage)
     @cog_ext.cog_slash(
@@ -313,12 +362,9 @@ class NotesCog(Cog):
     async def edit_log(self, ctx: SlashContext, id: int, note: str):
         await ctx.defer()
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
-        table = db["mod_logs"]
+        # Update the log with the new note if it exists, keeping the log as it was before the edit.
+        mod_log = await repositories.mod_logs.edit_reason(id=id, reason=note)
 
-        mod_log = table.find_one(id=id)
         if not mod_log:
             await embeds.error_message(ctx=ctx, description="Could not find a log with that ID!")
             return
@@ -335,13 +381,6 @@ class NotesCog(Cog):
         embed.add_field(name="After:", value=note, inline=False)
         await ctx.send(embed=embed)
 
-        mod_log["reason"] = note
-        table.update(mod_log, ["id"])
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
-
 
 def setup(bot: Bot) -> None:
     """ Load the Notes cog. """
@@ -1,5 +1,8 @@
+import asyncio
+import datetime
 import logging
 
+import discord
 from discord.ext import commands
 from discord.ext.commands import Cog, Bot
 from discord_slash import cog_ext, SlashContext
@@ -8,11 +11,18 @@ from discord_slash.utils.manage_commands import create_option, create_permission
 
 from cogs.commands import settings
 from utils import embeds
+from utils.purge import Purge, PurgeFilter, compile_pattern
 from utils.record import record_usage
 
 # Enabling logs
 log = logging.getLogger(__name__)
 
+# The maximum amount of messages a single /purge removes.
+PURGE_LIMIT = 10000
+# How often the /purge progress embed is refreshed, in seconds.
+PURGE_PROGRESS_INTERVAL = 3
+CANCEL_EMOJI = "⛔"
+
 
 class PurgeCog(Cog):
     """ Purge Cog """
@@ -34,19 +44,55 @@ class PurgeCog(Cog):
         # Otherwise, the purge is fine to execute
         return True
 
-    @commands.bot_has_permissions(manage_messages=True, send_messages=True, read_message_history=True)
+    @commands.bot_has_permissions(manage_messages=True, send_messages=True, read_message_history=True, add_reactions=True)
     @commands.before_invoke(record_usage)
     @cog_ext.cog_slash(
         name="purge",
-        description="Purges the last X amount of messages",
+        description="Purges the last X amount of messages, optionally only those matching filters",
         guild_ids=[settings.get_value("guild_id")],
         options=[
             create_option(
                 name="amount",
-                description="The amount of messages to be purged (100 message maximum cap)",
+                description=f"The amount of messages to be purged ({PURGE_LIMIT} message maximum cap)",
                 option_type=4,
                 required=True
             ),
+            create_option(
+                name="member",
+                description="Only purge the messages of this user",
+                option_type=6,
+                required=False
+            ),
+            create_option(
+                name="pattern",
+                description="Only purge the messages matching this regular expression",
+                option_type=3,
+                required=False
+            ),
+            create_option(
+                name="links",
+                description="Only purge the messages containing a link",
+                option_type=5,
+                required=False
+            ),
+            create_option(
+                name="attachments",
+                description="Only purge the messages with an attachment",
+                option_type=5,
+                required=False
+            ),
+            create_option(
+                name="bots",
+                description="Only purge the messages sent by bots",
+                option_type=5,
+                required=False
+            ),
+            create_option(
+                name="minutes",
+                description="Only purge the messages sent in the last X minutes",
+                option_type=4,
+                required=False
+            ),
             create_option(
                 name="reason",
                 description="The reason why the messages are being purged",
@@ -62,8 +108,19 @@ class PurgeCog(Cog):
             ]
         }
     )
-    async def remove_messages(self, ctx: SlashContext, amount: int, reason: str = None):
-        """ Scans the number of messages and removes all that match specified members, if none given, remove all. """
+    async def remove_messages(
+        self,
+        ctx: SlashContext,
+        amount: int,
+        member: discord.User = None,
+        pattern: str = None,
+        links: bool = False,
+        attachments: bool = False,
+        bots: bool = False,
+        minutes: int = None,
+        reason: str = None
+    ):
+        """ Streams the channel history and removes the messages matching the filters, if none given, remove all. """
         await ctx.defer()
 
         # Check to see if the bot is allowed to purge
@@ -77,26 +134,110 @@ class PurgeCog(Cog):
             await embeds.error_message(ctx=ctx, description="Reason must be less than 512 characters.")
             return
 
-        # Limit the command at 100 messages maximum to avoid abuse.
-        if amount > 100:
-            amount = 100
-
-        message = "messages"
-        if amount == 1:
-            message = message[:-1]
-
-        await ctx.channel.purge(limit=amount + 1)
+        if amount < 1:
+            await embeds.error_message(ctx=ctx, description="The amount of messages must be at least 1.")
+            return
 
-        embed = embeds.make_embed(
-            ctx=ctx,
-            title=f"Removed messages",
-            description=f"{ctx.author.mention} removed the previous {amount} {message}.",
-            thumbnail_url="https://i.imgur.com/EDy6jCp.png",
-            color="soft_red"
+        # Limit the command at PURGE_LIMIT messages maximum to avoid abuse.
+        amount = min(amount, PURGE_LIMIT)
+
+        # Compile the pattern up front so a typo is reported instead of purging nothing.
+        regex = None
+        if pattern:
+            if len(pattern) > 200:
+                await embeds.error_message(ctx=ctx, description="Pattern must be less than 200 characters.")
+                return
+            try:
+                regex = compile_pattern(pattern)
+            except ValueError as error:
+                await embeds.error_message(ctx=ctx, description=str(error))
+                return
+
+        # If we received an int instead of a discord.Member, the user is not in the server, their ID is enough to filter.
+        if isinstance(member, int):
+            member = discord.Object(id=member)
+
+        # Only look at the history before the command, so the progress message is never purged.
+        purge = Purge(
+            channel=ctx.channel,
+            filter=PurgeFilter(author=member, pattern=regex, links=links, attachments=attachments, bots=bots),
+            limit=amount,
+            before=discord.Object(id=ctx.interaction_id),
+            after=datetime.datetime.utcnow() - datetime.timedelta(minutes=minutes) if minutes else None
         )
-        embed.add_field(name="Reason:", value=reason, inline=False)
-        # Do not use ctx.send(). See: https://discord-py-slash-command.readthedocs.io/en/latest/faq.html#what-is-the-difference-between-ctx-send-and-ctx-channel-send
-        await ctx.channel.send(embed=embed)
+
+        # Describe the filters for the report.
+        filters = []
+        if member:
+            filters.append(f"sent by <@{member.id}>")
+        if bots:
+            filters.append("sent by bots")
+        if links:
+            filters.append("containing links")
+        if attachments:
+            filters.append("with attachments")
+        if pattern:
+            filters.append(f"matching `{pattern}`")
+        if minutes:
+            filters.append(f"from the last {minutes} minutes")
+
+        def progress_embed() -> discord.Embed:
+            if purge.cancelled:
+                title = "Purge cancelled"
+            elif purge.done:
+                title = "Removed messages"
+            else:
+                title = "Purging messages"
+            embed = embeds.make_embed(
+                ctx=ctx,
+                title=title,
+                description=f"{ctx.author.mention} removed {purge.deleted} messages{' ' + ', '.join(filters) if filters else ''}"
+                            f" (up to {amount}).",
+                thumbnail_url="https://i.imgur.com/EDy6jCp.png",
+                color="soft_red"
+            )
+            embed.add_field(name="Reason:", value=reason, inline=False)
+            embed.add_field(name="Scanned:", value=purge.scanned, inline=True)
+            embed.add_field(name="Bulk deleted:", value=purge.bulk_deleted, inline=True)
+            embed.add_field(name="Deleted one by one:", value=purge.single_deleted, inline=True)
+            if purge.failed:
+                embed.add_field(name="Failed:", value=purge.failed, inline=True)
+            if purge.filter.pattern and purge.filter.pattern.timeouts:
+                embed.add_field(name="Skipped, pattern too slow:", value=purge.filter.pattern.timeouts, inline=True)
+            if not purge.done:
+                embed.set_footer(text=f"React with {CANCEL_EMOJI} to stop the purge.")
+            return embed
+
+        async def report_progress():
+            while True:
+                await asyncio.sleep(PURGE_PROGRESS_INTERVAL)
+                await message.edit(embed=progress_embed())
+
+        async def wait_for_cancel():
+            # The moderator who started the purge, or anyone else allowed to manage the channel's messages, can stop it.
+            def check(reaction: discord.Reaction, user: discord.User) -> bool:
+                return (
+                    reaction.message.id == message.id
+                    and str(reaction.emoji) == CANCEL_EMOJI
+                    and (user.id == ctx.author_id or ctx.channel.permissions_for(user).manage_messages)
+                    and user != self.bot.user
+                )
+            await self.bot.wait_for("reaction_add", check=check)
+            purge.cancel()
+
+        message = await ctx.send(embed=progress_embed())
+        await message.add_reaction(CANCEL_EMOJI)
+
+        reporter = self.bot.loop.create_task(report_progress())
+        canceller = self.bot.loop.create_task(wait_for_cancel())
+        try:
+            await purge.run()
+        finally:
+            reporter.cancel()
+            canceller.cancel()
+
+        await message.clear_reactions()
+        await message.edit(embed=progress_embed())
 
 
 def setup(bot: Bot) -> None:
@@ -1,8 +1,5 @@
-import datetime
 import logging
-import time
 
-import dataset
 import discord
 from discord.ext import commands
 from discord.ext.commands import Cog, Bot
@@ -12,8 +9,9 @@ from discord_slash.utils.manage_commands import create_option, create_permission
 
 import utils.duration
 from cogs.commands import settings
-from utils import database
 from utils import embeds
+from utils import repositories
+from utils import resources
 from utils.moderation import can_action_member
 from utils.record import record_usage
 
@@ -29,66 +27,52 @@ class RestrictCog(Cog):
 
     @staticmethod
     async def is_user_restricted(ctx: SlashContext, member: discord.Member) -> bool:
-        if discord.utils.get(ctx.guild.roles, id=settings.get_value("role_restricted")) in member.roles:
+        if resources.role(ctx.guild, "role_restricted") in member.roles:
             return True
         return False
 
     @staticmethod
     async def restrict_member(ctx: SlashContext, member: discord.Member, reason: str, end_time: float = None) -> None:
-        role = discord.utils.get(ctx.guild.roles, id=settings.get_value("role_restricted"))
+        role = resources.role(ctx.guild, "role_restricted")
         await member.add_roles(role, reason=reason)
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Add the restrict to the mod_log database.
-        db["mod_logs"].insert(dict(
-            user_id=member.id, mod_id=ctx.author.id, timestamp=int(time.time()), reason=reason, type="restrict"
-        ))
+        await repositories.mod_logs.add(user_id=member.id, mod_id=ctx.author.id, type="restrict", reason=reason)
 
         # Add the entry to timed_mod_actions so that it's easier to check for is_done and handle the restrict evasions.
-        db["timed_mod_actions"].insert(dict(
-            user_id=member.id,
-            mod_id=ctx.author.id,
-            action_type="restrict",
-            reason=reason,
-            start_time=datetime.datetime.now(tz=datetime.timezone.utc).timestamp(),
-            end_time=end_time,
-            is_done=False
-        ))
-
-        # Commit the changes to the database.
-        db.commit()
-        db.close()
+        action_id = await repositories.timed_mod_actions.add(
+            user_id=member.id, mod_id=ctx.author.id, action_type="restrict", reason=reason, end_time=end_time
+        )
+
+        # Remember the restrict so it is restored if the member rejoins.
+        restricts_handler = ctx.bot.get_cog("RestrictsHandler")
+        if restricts_handler:
+            restricts_handler.add(member.id)
+
+        # Register the deadline so the restrict is reversed as soon as it expires.
+        timed_mod_actions = ctx.bot.get_cog("TimedModActionsTask")
+        if timed_mod_actions and end_time is not None:
+            timed_mod_actions.schedule(action_id, end_time)
 
     async def unrestrict_member(self, member: discord.Member, reason: str, ctx: SlashContext = None, guild: discord.Guild = None) -> None:
         guild = guild or ctx.guild
         moderator = ctx.author if ctx else self.bot.user
 
         # Removes "Restricted" role from member.
-        role = discord.utils.get(guild.roles, id=settings.get_value("role_restricted"))
+        role = resources.role(guild, "role_restricted")
         await member.remove_roles(role, reason=reason)
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Add the unrestrict to the mod_log database.
-        db["mod_logs"].insert(dict(
-            user_id=member.id,
-            mod_id=moderator.id,
-            timestamp=int(time.time()),
-            reason=reason,
-            type="unrestrict"
-        ))
-
-        # Update the unrestrict in timed_mod_actions.
-        timed_restriction_entry = db["timed_mod_actions"].find_one(user_id=member.id, is_done=False)
-        if timed_restriction_entry:
-            db["timed_mod_actions"].update(dict(id=timed_restriction_entry["id"], is_done=True), ["id"])
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        await repositories.mod_logs.add(user_id=member.id, mod_id=moderator.id, type="unrestrict", reason=reason)
+
+        # Update the unrestrict in timed_mod_actions and drop its deadline.
+        entry = await repositories.timed_mod_actions.resolve(user_id=member.id)
+        timed_mod_actions = self.bot.get_cog("TimedModActionsTask")
+        if entry and timed_mod_actions:
+            timed_mod_actions.cancel(entry["id"])
+        restricts_handler = self.bot.get_cog("RestrictsHandler")
+        if restricts_handler:
+            restricts_handler.discard(member.id)
 
     @staticmethod
     async def send_restricted_dm_embed(ctx: SlashContext, member: discord.Member, reason: str = None, duration: str = None) -> bool:
@@ -0,0 +1,129 @@
+import datetime
+import logging
+
+import discord
+from discord.ext import commands
+from discord.ext.commands import Cog, Bot
+from discord_slash import cog_ext, SlashContext
+from discord_slash.model import SlashCommandPermissionType
+from discord_slash.utils.manage_commands import create_option, create_permission
+
+from cogs.commands import settings
+from utils import embeds
+from utils import repositories
+from utils.record import record_usage
+
+# Enabling logs
+log = logging.getLogger(__name__)
+
+# Most days /modstats looks back, far enough for the whole history without overflowing the date arithmetic.
+MAX_DAYS = 3650
+
+
+def format_duration(seconds: float) -> str:
+    """ Formats a duration as its two largest units, e.g. "2d 4h". """
+    seconds = int(seconds)
+    units = [("d", 86400), ("h", 3600), ("m", 60), ("s", 1)]
+    parts = []
+    for unit, size in units:
+        if seconds >= size:
+            parts.append(f"{seconds // size}{unit}")
+            seconds %= size
+    return " ".join(parts[:2]) or "0s"
+
+
+class StatsCog(Cog):
+    """ Moderation Statistics Cog """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.bot_has_permissions(send_messages=True)
+    @commands.before_invoke(record_usage)
+    @cog_ext.cog_slash(
+        name="modstats",
+        description="View moderation statistics",
+        guild_ids=[settings.get_value("guild_id")],
+        options=[
+            create_option(
+                name="days",
+                description=f"How many days back to look, defaults to 30, up to {MAX_DAYS}",
+                option_type=4,
+                required=False
+            ),
+            create_option(
+                name="moderator",
+                description="Only count the actions of this moderator",
+                option_type=6,
+                required=False
+            ),
+        ],
+        default_permission=False,
+        permissions={
+            settings.get_value("guild_id"): [
+                create_permission(settings.get_value("role_staff"), SlashCommandPermissionType.ROLE, True),
+                create_permission(settings.get_value("role_trial_mod"), SlashCommandPermissionType.ROLE, True)
+            ]
+        }
+    )
+    async def mod_stats(self, ctx: SlashContext, days: int = 30, moderator: discord.User = None):
+        """ Shows the moderation activity of the last days, read from the mod_stats rollups only. """
+        await ctx.defer()
+
+        if days < 1:
+            await embeds.error_message(ctx=ctx, description="The amount of days must be at least 1.")
+            return
+        days = min(days, MAX_DAYS)
+
+        # If we received an int instead of a discord.Member, the user is not in the server.
+        if moderator and not isinstance(moderator, discord.Member):
+            moderator = await self.bot.fetch_user(moderator)
+
+        # Rollups are kept per UTC day, so today counts as the first day.
+        since = repositories.stats_day((datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(days=days - 1)).timestamp())
+        mod_id = moderator.id if moderator else None
+
+        totals = await repositories.mod_stats.totals(since, mod_id=mod_id)
+        if not any(row["actions"] or row["timed"] for row in totals):
+            await embeds.error_message(ctx=ctx, description="No mod actions were taken in that period!")
+            return
+
+        embed = embeds.make_embed(
+            ctx=ctx,
+            title=f"Moderation statistics of {moderator}" if moderator else "Moderation statistics",
+            description=f"Last {days} day{'s' if days != 1 else ''}, since {since} UTC.",
+            thumbnail_url="https://i.imgur.com/A4c19BJ.png",
+            color="blurple"
+        )
+
+        # One line per action type, with the average length of the temporary ones.
+        lines = []
+        for row in totals:
+            line = f"**{row['type'].capitalize()}:** {row['actions']}"
+            if row["timed"]:
+                line += f" ({row['timed']} temporary, {format_duration(row['duration'] / row['timed'])} on average)"
+            lines.append(line)
+        embed.add_field(name="Actions:", value="\n".join(lines), inline=False)
+
+        # The busiest day of the period.
+        per_day = await repositories.mod_stats.per_day(since, mod_id=mod_id)
+        busiest = max(per_day, key=lambda row: row["actions"])
+        embed.add_field(name="Busiest Day:", value=f"{busiest['day']} ({busiest['actions']} actions)", inline=True)
+        embed.add_field(name="Daily Average:", value=f"{sum(row['actions'] for row in per_day) / days:.1f} actions", inline=True)
+
+        # The most active moderators, unless a single moderator was asked for.
+        if not moderator:
+            top = await repositories.mod_stats.top_moderators(since)
+            embed.add_field(
+                name="Most Active Moderators:",
+                value="\n".join(f"<@!{row['mod_id']}>: {row['actions']}" for row in top),
+                inline=False
+            )
+
+        await ctx.send(embed=embed)
+
+
+def setup(bot: Bot) -> None:
+    """ Load the Stats cog. """
+    bot.add_cog(StatsCog(bot))
+    log.info("Commands loaded: stats")
@@ -1,10 +1,7 @@
 import logging
 import re
-import time
 
-import dataset
 import discord
-import privatebinapi
 from discord.ext import commands
 from discord.ext.commands import Cog, Bot
 from discord_slash import cog_ext, SlashContext
@@ -12,9 +9,12 @@ from discord_slash.model import SlashCommandPermissionType
 from discord_slash.utils.manage_commands import create_option, create_permission
 
 from cogs.commands import settings
-from utils import database
 from utils import embeds
+from utils import repositories
+from utils import resources
 from utils.record import record_usage
+from utils.transcript_journal import journal
+from utils.transcripts import uploader
 
 # Enabling logs
 log = logging.getLogger(__name__)
@@ -45,7 +45,7 @@ class TicketCog(Cog):
         await ctx.defer(hidden=True)
 
         # Check if a duplicate ticket already exists for the member.
-        category = discord.utils.get(ctx.guild.categories, id=settings.get_value("category_tickets"))
+        category = resources.channel(ctx.guild, "category_tickets")
         ticket = discord.utils.get(category.text_channels, name=f"ticket-{ctx.author.id}")
 
         # Throw an error and return if we found an already existing ticket.
@@ -58,8 +58,8 @@ class TicketCog(Cog):
         channel = await ctx.guild.create_text_channel(f"ticket-{ctx.author.id}", category=category)
 
         # Give both the staff and the user perms to access the channel. 
-        await channel.set_permissions(discord.utils.get(ctx.guild.roles, id=settings.get_value("role_trial_mod")), read_messages=True)
-        await channel.set_permissions(discord.utils.get(ctx.guild.roles, id=settings.get_value("role_staff")), read_messages=True)
+        await channel.set_permissions(resources.role(ctx.guild, "role_trial_mod"), read_messages=True)
+        await channel.set_permissions(resources.role(ctx.guild, "role_staff"), read_messages=True)
         await channel.set_permissions(ctx.author, read_messages=True)
 
         # If the ticket creator is a VIP, ping the staff for fast response.
@@ -76,22 +76,8 @@ class TicketCog(Cog):
         embed.add_field(name="Ticket Topic:", value=topic, inline=False)
         await channel.send(embed=embed)
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Insert a pending ticket into the database.
-        db["tickets"].insert(dict(
-            user_id=ctx.author.id,
-            status="in-progress",
-            guild=ctx.guild.id,
-            timestamp=int(time.time()),
-            ticket_topic=topic,
-            log_url=None
-        ))
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        await repositories.tickets.add(user_id=ctx.author.id, guild=ctx.guild.id, ticket_topic=topic)
 
         # Send the user a ping and then immediately delete it because mentions via embeds do not ping.
         ping = await channel.send(ctx.author.mention)
@@ -123,12 +109,8 @@ class TicketCog(Cog):
             await embeds.error_message(ctx=ctx, description="You can only run this command in active ticket channels.")
             return
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Get the ticket in the database.
-        table = db["tickets"]
-        ticket = table.find_one(user_id=int(ctx.channel.name.replace("ticket-", "")), status="in-progress")
+        ticket = await repositories.tickets.open_for(user_id=int(ctx.channel.name.replace("ticket-", "")))
 
         # If the ticket exists in the database.
         if ticket:
@@ -162,31 +144,25 @@ class TicketCog(Cog):
         mod_list = set()
 
         # Fetch the staff and trial mod role.
-        role_staff = discord.utils.get(ctx.guild.roles, id=settings.get_value("role_staff"))
-        role_trial_mod = discord.utils.get(ctx.guild.roles, id=settings.get_value("role_trial_mod"))
-
-        # Loop through all messages in the ticket from old to new.
-        async for message in ctx.channel.history(oldest_first=True):
-            # Ignore the bot replies.
-            if not message.author.bot:
+        role_staff = resources.role(ctx.guild, "role_staff")
+        role_trial_mod = resources.role(ctx.guild, "role_trial_mod")
 
-                # Time format is unnecessarily lengthy so trimming it down and keep the log go easier on the eyes.
-                formatted_time = str(message.created_at).split(".")[-2]
+        # Get the messages in the ticket from old to new, the bot replies are already left out.
+        entries = await journal.entries(ctx.channel)
+        message_log += journal.format(entries)
 
-                # Append the new messages to the current log as we loop.
-                message_log += f"[{formatted_time}] {message.author}: {message.content}\n"
-
-                # If the messenger has either staff role or trial mod role, add their ID to the mod_list set.
-                if role_staff in message.author.roles or role_trial_mod in message.author.roles:
-                    mod_list.add(message.author)
+        for entry in entries:
+            # If the messenger has either staff role or trial mod role, add their ID to the mod_list set.
+            if role_staff in entry.author.roles or role_trial_mod in entry.author.roles:
+                mod_list.add(entry.author)
 
         # An empty mod_list (ticket with no conversation) will raise a HTTPException for using an empty field in embed.
         # Using "\u200b" (zero width space) is also not an option because .mention cannot be called on it.
         if len(mod_list) == 0:
             mod_list.add(self.bot.user)
 
-        # Dump message log to PrivateBin. This returns a dictionary, but only the url is needed for the embed.
-        url = privatebinapi.send("https://bin.piracy.moe", text=message_log, expiration="never")["full_url"]
+        # Dump message log to PrivateBin, or keep a local copy to attach if it can't be reached right now.
+        transcript = await uploader.archive(message_log, name=ctx.channel.name)
 
         # Create the embed in #ticket-log.
         embed = embeds.make_embed(
@@ -201,11 +177,14 @@ class TicketCog(Cog):
         embed.add_field(name="Closed By:", value=ctx.author.mention, inline=True)
         embed.add_field(name="Ticket Topic:", value=ticket_topic, inline=False)
         embed.add_field(name="Participating Moderators:", value=" ".join(mod.mention for mod in mod_list), inline=False)
-        embed.add_field(name="Ticket Log: ", value=url, inline=False)
+        embed.add_field(name="Ticket Log: ", value=transcript.link, inline=False)
+
+        # Send the embed to #ticket-log, along with the local copy of the transcript if the upload is still pending.
+        ticket_log = resources.channel(ctx.guild, "channel_ticket_log")
+        archive = await ticket_log.send(embed=embed, file=transcript.file())
 
-        # Send the embed to #ticket-log.
-        ticket_log = discord.utils.get(ctx.guild.channels, id=settings.get_value("channel_ticket_log"))
-        await ticket_log.send(embed=embed)
+        # Link to the attached copy until the upload succeeds.
+        url = transcript.url or archive.attachments[0].url
 
         # DM the user that their ticket was closed.
         try:
@@ -224,23 +203,16 @@ class TicketCog(Cog):
 
         # If the ticket somehow does not exists in the database, we add it.
         if not ticket:
-            db["tickets"].insert(dict(
-                user_id=ticket_creator_id,
-                status="completed",
-                guild=ctx.guild.id,
-                timestamp=int(time.time()),
-                ticket_topic=ticket_topic,
-                log_url=url
-            ))
+            ticket_id = await repositories.tickets.add(
+                user_id=ticket_creator_id, guild=ctx.guild.id, ticket_topic=ticket_topic, status="completed", log_url=url
+            )
         else:
             # Otherwise, update the ticket status from "in-progress" to "completed" and the PrivateBin URL field in the database.
-            ticket["status"] = "completed"
-            ticket["log_url"] = url
-            table.update(ticket, ["id"])
+            ticket_id = ticket["id"]
+            await repositories.tickets.complete(id=ticket_id, log_url=url)
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        # Have the archive message and the ticket updated with the PrivateBin URL once a pending upload goes through.
+        await uploader.track(transcript, archive, ticket_id=ticket_id)
 
         # Delete the channel.
         await ctx.channel.delete()
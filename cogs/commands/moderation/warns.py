@@ -1,7 +1,5 @@
 import logging
-import time
 
-import dataset
 import discord
 from discord.ext import commands
 from discord.ext.commands import Cog, Bot
@@ -10,8 +8,8 @@ from discord_slash.model import SlashCommandPermissionType
 from discord_slash.utils.manage_commands import create_option, create_permission
 
 from cogs.commands import settings
-from utils import database
 from utils import embeds
+from utils import repositories
 from utils.record import record_usage
 
 # Enabling logs
@@ -91,21 +89,8 @@ class WarnsCog(Cog):
         except discord.HTTPException:
             embed.add_field(name="Notice:", value=f"Unable to message {member.mention} about this action. This can be caused by the user not being in the server, having DMs disabled, or having the bot blocked.")
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Add the warning to the mod_log database.
-        db["mod_logs"].insert(dict(
-            user_id=member.id, 
-            mod_id=ctx.author.id, 
-            timestamp=int(time.time()), 
-            reason=reason, 
-            type="warn"
-        ))
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        await repositories.mod_logs.add(user_id=member.id, mod_id=ctx.author.id, type="warn", reason=reason)
 
         await ctx.send(embed=embed)
 
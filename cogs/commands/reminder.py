@@ -1,7 +1,6 @@
 import logging
 from datetime import datetime
 
-import dataset
 from discord.ext import commands
 from discord.ext.commands import Bot, Cog
 from discord_slash import cog_ext, SlashContext
@@ -9,7 +8,7 @@ from discord_slash.utils.manage_commands import create_option
 
 import utils.duration
 from cogs.commands import settings
-from utils import database, embeds
+from utils import embeds, repositories
 from utils.pagination import LinePaginator
 from utils.record import record_usage
 
@@ -54,20 +53,19 @@ class Reminder(Cog):
             await embeds.error_message(ctx=ctx, description=f"Duration syntax: `#d#h#m#s` (day, hour, min, sec)\nYou can specify up to all four but you only need one.")
             return
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
-        remind_id = db["remind_me"].insert(dict(
+        # Store the reminder in the database.
+        reminder = dict(
             reminder_location=ctx.channel.id,
             author_id=ctx.author.id,
             date_to_remind=end_time.timestamp(),
-            message=message,
-            sent=False
-        ))
+            message=message
+        )
+        remind_id = await repositories.reminders.add(**reminder)
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        # Hand the reminder to the scheduler so it is sent as soon as it is due.
+        reminder_task = self.bot.get_cog("ReminderTask")
+        if reminder_task:
+            reminder_task.schedule(dict(reminder, id=remind_id))
 
         embed = embeds.make_embed(
             ctx=ctx,
@@ -104,11 +102,8 @@ class Reminder(Cog):
         """ Edit a reminder message. """
         await ctx.defer()
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
+        reminder = await repositories.reminders.get(reminder_id)
 
-        remind_me = db["remind_me"]
-        reminder = remind_me.find_one(id=reminder_id)
         old_message = reminder["message"]
 
         if reminder["author_id"] != ctx.author.id:
@@ -119,12 +114,13 @@ class Reminder(Cog):
             await embeds.error_message(ctx, "That reminder doesn't exist.")
             return
 
-        data = dict(id=reminder["id"], message=new_message)
-        remind_me.update(data, ["id"])
+        # Update the reminder message.
+        await repositories.reminders.set_message(reminder["id"], new_message)
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        # Reschedule the reminder so the updated message is the one that gets sent.
+        reminder_task = self.bot.get_cog("ReminderTask")
+        if reminder_task:
+            reminder_task.schedule(dict(reminder, message=new_message))
 
         embed = embeds.make_embed(
             ctx=ctx,
@@ -148,12 +144,8 @@ class Reminder(Cog):
         """ List your reminders. """
         await ctx.defer()
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         # Find all reminders from user and haven't been sent.
-        remind_me = db["remind_me"]
-        result = remind_me.find(sent=False, author_id=ctx.author.id)
+        result = await repositories.reminders.pending_for(ctx.author.id)
 
         reminders = []
 
@@ -173,9 +165,6 @@ class Reminder(Cog):
             color="blurple"
         )
 
-        # Close the connection to the database.
-        db.close()
-
         # Paginate results.
         await LinePaginator.paginate(reminders, ctx=ctx, embed=embed, max_lines=5,
                                      max_size=2000, restrict_to_user=ctx.author)
@@ -198,12 +187,8 @@ class Reminder(Cog):
         """ Delete Reminders. User `reminder list` to find ID """
         await ctx.defer()
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
-        # Find all reminders from user and haven't been sent.
-        table = db["remind_me"]
-        reminder = table.find_one(id=reminder_id)
+        # Find the reminder.
+        reminder = await repositories.reminders.get(reminder_id)
 
         if not reminder:
             await embeds.error_message(ctx=ctx, description="Invalid ID")
@@ -218,12 +203,12 @@ class Reminder(Cog):
             return
 
         # All the checks should be done.
-        data = dict(id=reminder_id, sent=True)
-        table.update(data, ["id"])
+        await repositories.reminders.mark_sent(reminder_id)
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        # Cancel the scheduled reminder.
+        reminder_task = self.bot.get_cog("ReminderTask")
+        if reminder_task:
+            reminder_task.cancel(reminder["id"])
 
         embed = embeds.make_embed(
             ctx=ctx,
@@ -246,18 +231,12 @@ class Reminder(Cog):
         """ Clears all reminders. """
         await ctx.defer()
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
-        remind_me = db["remind_me"]
-        result = remind_me.find(author_id=ctx.author.id, sent=False)
-        for reminder in result:
-            updated_data = dict(id=reminder["id"], sent=True)
-            remind_me.update(updated_data, ["id"])
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        # Mark all of the user's pending reminders as sent and cancel them in the scheduler.
+        cleared = await repositories.reminders.clear(ctx.author.id)
+        reminder_task = self.bot.get_cog("ReminderTask")
+        if reminder_task:
+            for reminder in cleared:
+                reminder_task.cancel(reminder["id"])
 
         await ctx.send("All your reminders have been cleared.")
 
@@ -1,36 +1,21 @@
 import logging
 
-import dataset
 from discord.ext.commands import Bot, Cog
 from discord_slash import cog_ext, SlashContext
 from discord_slash.model import SlashCommandPermissionType
 from discord_slash.utils.manage_commands import create_option, create_permission
 
-from utils import database
 from utils import embeds
-from utils.database import get_db
+from utils import repositories
+from utils.config import store as config_store
 
 log = logging.getLogger(__name__)
 
 
 def get_value(config: str):
-    # Get all of the settings from the table and load them into the dictionary.
-    db = dataset.connect(get_db())
-    data = db["settings"].all()
-
-    # Iterate through database entries and add them as a dictionary.
-    settings = {}
-    for setting in data:
-        settings[setting["name"]] = {"value": setting["value"], "censored": bool(setting["censored"])}
-
-    # If the entry's value consists of only numbers, return it as an int.
-    if settings[config]["value"].isdecimal():
-        db.close()
-        return int(settings[config]["value"])
-
-    # Otherwise, return the value normally (as a string by default).
-    db.close()
-    return settings[config]["value"]
+    """ Returns the value of a setting from the in-memory settings store. """
+    # Numeric values are already stored as ints, everything else is returned as a string.
+    return config_store.get(config)
 
 
 class Settings(Cog):
@@ -72,23 +57,17 @@ class Settings(Cog):
         }
     )
     async def add(self, ctx: SlashContext, name: str, value: str, censored: bool):
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-        table = db["settings"]
-        result = table.find_one(name=name)
+        # Add the setting to the database if a setting with that name doesn't already exist.
+        added = await repositories.settings.add(name=name, value=value, censored=censored)
 
         # Error if a setting already exists with that name.
-        if result:
+        if not added:
             embed = embeds.make_embed(description="A setting with that name already exists.", color="soft_red")
             await ctx.send(embed=embed)
             return
 
-        # Add the setting to the database.
-        table.insert(dict(
-            name=name,
-            value=value,
-            censored=censored
-        ))
+        # Keep the in-memory settings store in sync with the database.
+        config_store.set(name, value, censored)
 
         # Send a confirmation embed to the command invoker.
         embed = embeds.make_embed(description=f"Added '{name}' to the database.", color="soft_green")
@@ -99,10 +78,6 @@ class Settings(Cog):
         else:
             await ctx.send(embed=embed)
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
-
     @cog_ext.cog_subcommand(
         base="settings",
         name="edit",
@@ -138,33 +113,22 @@ class Settings(Cog):
     async def edit(self, ctx: SlashContext, name: str, value: str, censored: bool = None):
         await ctx.defer()
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-        table = db["settings"]
-        result = table.find_one(name=name)
+        # Update the value(s) in the database, only updating the censored value if the user specified the optional parameter.
+        updated = await repositories.settings.edit(name=name, value=value, censored=censored)
 
         # Error if a setting does not exist with that name.
-        if not result:
+        if not updated:
             embed = embeds.make_embed(description="A setting with that name does not exist.", color="soft_red")
             await ctx.send(embed=embed)
             return
 
-        # Update the value(s) in the database.
-        result["value"] = value
-
-        # Only update the censored value if the user specified the optional parameter.
-        if censored is not None:
-            result["censored"] = censored
-        table.update(result, ["id"])
+        # Keep the in-memory settings store in sync with the database.
+        config_store.set(name, value, censored)
 
         # Send a confirmation embed to the command invoker.
         embed = embeds.make_embed(description=f"Updated '{name}' in the database.", color="soft_green")
         await ctx.send(embed=embed)
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
-
     @cog_ext.cog_subcommand(
         base="settings",
         name="delete",
@@ -186,28 +150,22 @@ class Settings(Cog):
         }
     )
     async def delete(self, ctx: SlashContext, name: str):
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-        table = db["settings"]
-        result = table.find_one(name=name)
+        # Delete the setting from the database.
+        deleted = await repositories.settings.remove(name=name)
 
         # Error if a setting does not exist with that name.
-        if not result:
+        if not deleted:
             embed = embeds.make_embed(description="A setting with that name does not exist.", color="soft_red")
             await ctx.send(embed=embed)
             return
 
-        # Delete the setting from the database.
-        table.delete(name=name)
+        # Keep the in-memory settings store in sync with the database.
+        config_store.remove(name)
 
         # Send a confirmation embed to the command invoker.
         embed = embeds.make_embed(description=f"Deleted '{name}' from the database.", color="soft_green")
         await ctx.send(embed=embed)
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
-
     @cog_ext.cog_subcommand(
         base="settings",
         name="list",
@@ -221,13 +179,8 @@ class Settings(Cog):
         }
     )
     async def list(self, ctx: SlashContext):
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-        table = db["settings"]
-        settings = table.all()
-
-        # Append all of the setting names to a list.
-        names = [setting["name"] for setting in settings]
+        # Get all of the setting names as a list.
+        names = await repositories.settings.names()
 
         # Error if the list is empty because it means the table is empty.
         if not names:
@@ -242,9 +195,6 @@ class Settings(Cog):
         embed = embeds.make_embed(description=f"Found the following settings: {names}", color="soft_green")
         await ctx.send(embed=embed)
 
-        # Close the connection to the database.
-        db.close()
-
     @cog_ext.cog_subcommand(
         base="settings",
         name="view",
@@ -266,10 +216,7 @@ class Settings(Cog):
         }
     )
     async def view(self, ctx: SlashContext, name: str):
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-        table = db["settings"]
-        result = table.find_one(name=name)
+        result = await repositories.settings.find_one(name=name)
 
         # Error if a setting does not exist with that name.
         if not result:
@@ -290,9 +237,6 @@ class Settings(Cog):
         embed.add_field(name="Censored:", value=str(bool(result["censored"])), inline=False)
         await ctx.send(embed=embed)
 
-        # Close the connection to the database.
-        db.close()
-
 
 def setup(bot: Bot) -> None:
     """ Load the Settings cog. """
@@ -1,53 +1,148 @@
+import asyncio
+import datetime
 import logging
 import time
-from typing import Union
+from collections import defaultdict
+from typing import Dict, Union
 
-import dataset
 import discord
 from discord import User, Member, Guild
-from discord.ext import commands
+from discord.ext import commands, tasks
 
-from utils import database
+from utils import repositories
+from utils.ban_list import bans as ban_list
 
 log = logging.getLogger(__name__)
 
+# How long to collect ban events before attributing them, so a ban wave costs one audit log request.
+ATTRIBUTION_WINDOW = 2
+# The audit log entry of a ban can lag behind the ban event, so unmatched bans are retried in the next windows.
+MAX_ATTEMPTS = 3
+# Audit log entries older than the ban event by more than this belong to an earlier ban of the same user.
+AUDIT_LOG_SLACK = datetime.timedelta(seconds=30)
+# How often the ban list mirror is reloaded in full, in case an event was missed.
+BAN_LIST_RECONCILE_HOURS = 6
+# How long a ban issued by the bot is remembered, its ban event arrives within seconds of the request.
+ISSUED_BAN_SECONDS = 300
+
 
 class BansHandler(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        # Guild ID to the user ID to the [time of the ban event, attribution attempts] of bans awaiting attribution.
+        self.pending: Dict[int, Dict[int, list]] = defaultdict(dict)
+        # Guild ID to the user ID to the time of the bans the bot issued itself, which are logged by their command.
+        self.issued: Dict[int, Dict[int, float]] = defaultdict(dict)
+        self.worker = None
+        self.reconcile_ban_list.start()
+
+    def cog_unload(self):
+        self.reconcile_ban_list.cancel()
+        if self.worker:
+            self.worker.cancel()
+
+    @tasks.loop(hours=BAN_LIST_RECONCILE_HOURS)
+    async def reconcile_ban_list(self) -> None:
+        """ Loads the ban list mirror of every guild at startup, then reloads it periodically. """
+        # Wait for bot to start.
+        await self.bot.wait_until_ready()
+
+        for guild in self.bot.guilds:
+            try:
+                await ban_list.load(guild)
+            except discord.HTTPException:
+                log.exception(f"Unable to load the ban list of {guild}.")
+
+    def expect_ban(self, guild: Guild, user_id: int) -> None:
+        """ Records a ban the bot is about to issue, so its ban event isn't logged a second time. """
+        self.issued[guild.id][user_id] = time.monotonic()
+
+    def forget_ban(self, guild: Guild, user_id: int) -> None:
+        """ Drops a ban recorded by expect_ban() that didn't go through. """
+        self.issued[guild.id].pop(user_id, None)
+
+    def _issued_by_bot(self, guild: Guild, user_id: int) -> bool:
+        issued = self.issued[guild.id]
+        expired = time.monotonic() - ISSUED_BAN_SECONDS
+        for issued_user_id in [issued_user_id for issued_user_id, issued_at in issued.items() if issued_at < expired]:
+            del issued[issued_user_id]
+        return issued.pop(user_id, None) is not None
+
+    @commands.Cog.listener()
+    async def on_member_unban(self, guild: Guild, user: User):
+        ban_list.discard(guild, user.id)
 
     @commands.Cog.listener()
     async def on_member_ban(self, guild: Guild, user: Union[User, Member]):
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
-        # Get the ban entry of the user who just got banned.
-        ban_entry = await guild.fetch_ban(user)
-
-        """ 
-        Attempts to get the ban author from the most recent ban entry from the mod log. We can use
-        "async for entry in logs:" to convert the AsyncIterator into a list but it's not as clean as flatten().
-        See: https://discordpy.readthedocs.io/en/stable/api.html?highlight=audit_logs#discord.Guild.audit_logs 
-        """
-        logs = await guild.audit_logs(limit=1, action=discord.AuditLogAction.ban).flatten()
-
-        # Get the most recent ban entry in the audit log.
-        logs = logs[0]
-
-        # If the ban author was not a bot (manual ban), add the entry into the database.
-        if logs.user != self.bot.user:
-            db["mod_logs"].insert(dict(
-                user_id=user.id,
-                mod_id=logs.user.id,
-                timestamp=int(time.time()),
-                reason=ban_entry.reason,
-                type="ban"
-            ))
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        ban_list.add(guild, user.id)
+
+        # Bans from /ban and /massban are logged by the command, with the moderator who ran it.
+        if self._issued_by_bot(guild, user.id):
+            return
+
+        # Queue the ban, it is attributed together with any other ban that lands in the same window.
+        self.pending[guild.id].setdefault(user.id, [datetime.datetime.utcnow(), 0])
+        if self.worker is None or self.worker.done():
+            self.worker = self.bot.loop.create_task(self.attribute_bans())
+
+    async def attribute_bans(self) -> None:
+        """ Attributes the queued bans once per window until the queue is empty. """
+        while self.pending:
+            await asyncio.sleep(ATTRIBUTION_WINDOW)
+            batches, self.pending = self.pending, defaultdict(dict)
+
+            for guild_id, bans in batches.items():
+                guild = self.bot.get_guild(guild_id)
+                if not guild:
+                    continue
+                try:
+                    await self.attribute(guild, bans)
+                except Exception:
+                    log.exception(f"Unable to attribute {len(bans)} bans in {guild}.")
+
+    async def attribute(self, guild: Guild, bans: Dict[int, list]) -> None:
+        """ Logs the moderator and reason of a batch of bans, reading the audit log only as far back as they go. """
+        # Keep the newest audit log entry of each banned user, entries are returned from new to old in pages of 100.
+        entries = {}
+        found = 0
+        oldest = min(banned_at for banned_at, _ in bans.values()) - AUDIT_LOG_SLACK
+        async for entry in guild.audit_logs(limit=None, action=discord.AuditLogAction.ban):
+            # Anything older belongs to earlier bans.
+            if entry.created_at < oldest:
+                break
+            if entry.target.id in entries:
+                continue
+            entries[entry.target.id] = entry
+            found += entry.target.id in bans
+            if found == len(bans):
+                break
+
+        logs = []
+        for user_id, (banned_at, attempts) in bans.items():
+            entry = entries.get(user_id)
+            if entry and entry.created_at >= banned_at - AUDIT_LOG_SLACK:
+                # If the ban author was not a bot (manual ban), add the entry into the database.
+                if entry.user != self.bot.user:
+                    logs.append(dict(user_id=user_id, mod_id=entry.user.id, type="ban", reason=entry.reason))
+                continue
+
+            # Give the audit log another window to catch up.
+            if attempts + 1 < MAX_ATTEMPTS:
+                self.pending[guild.id][user_id] = [banned_at, attempts + 1]
+                continue
+
+            # Still no audit log entry, fall back to the ban itself for the reason.
+            try:
+                ban_entry = await guild.fetch_ban(discord.Object(id=user_id))
+            except discord.NotFound:
+                # The user was unbanned in the meantime.
+                continue
+            log.warning(f"No audit log entry found for the ban of {user_id} in {guild}, logging it without a moderator.")
+            logs.append(dict(user_id=user_id, mod_id=None, type="ban", reason=ban_entry.reason))
+
+        # Log the whole batch in one insert.
+        await repositories.mod_logs.add_many(logs)
 
 
 def setup(bot: commands.Bot) -> None:
@@ -5,7 +5,8 @@ import discord
 from discord.ext import commands
 
 from handlers import boosts
-from utils import embeds
+from utils import embeds, resources
+from utils.transcript_journal import journal
 
 log = logging.getLogger(__name__)
 
@@ -30,6 +31,9 @@ class GuildUpdates(commands.Cog):
         """
         log.info(f'{guild.name} has become available.')
 
+        # The guild's roles and channels were rebuilt, drop the ones resolved from the previous session.
+        resources.invalidate(guild)
+
     @commands.Cog.listener()
     async def on_guild_unavailable(self, guild: discord.Guild) -> None:
         """Event Listener which is called when a guild becomes unavailable.
@@ -41,6 +45,7 @@ class GuildUpdates(commands.Cog):
             https://discordpy.readthedocs.io/en/stable/api.html#discord.on_guild_unavailable
         """
         log.info(f'{guild.name} is now unavailable.')
+        resources.invalidate(guild)
 
     @commands.Cog.listener()
     async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
@@ -56,6 +61,10 @@ class GuildUpdates(commands.Cog):
             https://discordpy.readthedocs.io/en/stable/api.html#discord.on_guild_channel_create
         """
         log.info(f'{channel.name} has been created in {channel.guild}.')
+        resources.invalidate(channel.guild)
+
+        # Start the transcript of new ticket and mute channels.
+        journal.open(channel)
 
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
@@ -71,6 +80,8 @@ class GuildUpdates(commands.Cog):
             https://discordpy.readthedocs.io/en/stable/api.html#discord.on_guild_channel_delete
         """
         log.info(f'{channel.name} has been deleted in {channel.guild}.')
+        resources.invalidate(channel.guild)
+        journal.close(channel.id)
 
     @commands.Cog.listener()
     async def on_guild_channel_pins_update(self, channel: discord.abc.GuildChannel, last_pin: datetime.datetime) -> None:
@@ -102,6 +113,7 @@ class GuildUpdates(commands.Cog):
         For more information:
             https://discordpy.readthedocs.io/en/stable/api.html#discord.on_guild_channel_update
         """
+        resources.invalidate(after.guild)
 
     @commands.Cog.listener()
     async def on_guild_emojis_update(self, guild: discord.Guild, before: discord.Emoji, after: discord.Emoji) -> None:
@@ -175,6 +187,7 @@ class GuildUpdates(commands.Cog):
         For more information:
             https://discordpy.readthedocs.io/en/stable/api.html#discord.on_guild_role_create
         """
+        resources.invalidate(role.guild)
 
     @commands.Cog.listener()
     async def on_guild_role_delete(self, role: discord.Role) -> None:
@@ -189,6 +202,7 @@ class GuildUpdates(commands.Cog):
         For more information:
             https://discordpy.readthedocs.io/en/stable/api.html#discord.on_guild_role_delete
         """
+        resources.invalidate(role.guild)
 
     @commands.Cog.listener()
     async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
@@ -204,6 +218,7 @@ class GuildUpdates(commands.Cog):
         For more information:
             https://discordpy.readthedocs.io/en/stable/api.html#discord.on_guild_role_update
         """
+        resources.invalidate(after.guild)
 
     @commands.Cog.listener()
     async def on_guild_update(self, before: discord.Guild, after: discord.Guild) -> None:
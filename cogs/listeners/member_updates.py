@@ -1,10 +1,14 @@
 import logging
 from typing import Union
 
+import discord
 from discord import User, Member, Guild
 from discord.ext import commands
 
 from handlers import boosts
+from utils import embeds, resources
+from utils.config import store as config_store
+from utils.join_analyzer import analyzer, JoinVerdict, BURST_WINDOW
 
 log = logging.getLogger(__name__)
 
@@ -60,7 +64,51 @@ class MemberUpdates(commands.Cog):
         For more information:
             https://discordpy.readthedocs.io/en/latest/api.html#discord.on_member_join
         """
-        log.info(f'{member} has joined {member.guild.name}.')       
+        log.info(f'{member} has joined {member.guild.name}.')
+
+        # Score the join and alert the moderators right away if it starts a raid.
+        verdict = analyzer.analyze(member)
+        if verdict.suspicious:
+            log.debug(f"Suspicious join of {member}: {', '.join(verdict.reasons)}.")
+        if verdict.burst:
+            await self.raid_alert(member, verdict)
+
+    @staticmethod
+    async def raid_alert(member: Member, verdict: JoinVerdict) -> None:
+        """ Alerts #moderation of a join burst, locking the guild down first if the raid_lockdown setting is on. """
+        guild = member.guild
+        log.warning(f"Join burst in {guild}: {verdict.joins} joins, {verdict.suspicious_joins} suspicious, in {BURST_WINDOW}s.")
+
+        try:
+            lockdown = bool(config_store.get("raid_lockdown"))
+        except KeyError:
+            lockdown = False
+
+        # Raise the verification level so new accounts can't talk until a moderator lowers it again.
+        locked = False
+        if lockdown and guild.verification_level < discord.VerificationLevel.high:
+            try:
+                await guild.edit(verification_level=discord.VerificationLevel.high, reason="Join burst detected.")
+                locked = True
+            except discord.HTTPException:
+                log.exception(f"Unable to lock {guild} down.")
+
+        embed = embeds.make_embed(
+            title="Possible raid in progress",
+            description=f"{verdict.joins} members joined in the last {BURST_WINDOW} seconds, {verdict.suspicious_joins} of them suspicious.",
+            thumbnail_url="https://i.imgur.com/l0jyxkz.png",
+            color="red",
+            author=False
+        )
+        embed.add_field(name="Latest join:", value=f"{member.mention} ({', '.join(verdict.reasons) or 'not suspicious'})", inline=False)
+        if verdict.cluster:
+            embed.add_field(name="Name pattern:", value=f"`{verdict.cluster}`", inline=False)
+        if locked:
+            embed.add_field(name="Lockdown:", value="The verification level was raised to high.", inline=False)
+
+        channel = resources.channel(guild, "channel_moderation")
+        if channel:
+            await channel.send(embed=embed)
 
     @commands.Cog.listener()
     async def on_member_remove(self, member: Member) -> None:
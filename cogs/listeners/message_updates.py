@@ -1,8 +1,12 @@
 import logging
 
-from discord import Message, RawBulkMessageDeleteEvent, RawMessageUpdateEvent
+from discord import Message, RawBulkMessageDeleteEvent, RawMessageDeleteEvent, RawMessageUpdateEvent
 from discord.ext import commands
 
+from utils import link_filter
+from utils.message_pipeline import MessageContext, pipeline
+from utils.transcript_journal import journal
+
 log = logging.getLogger(__name__)
 
 
@@ -11,6 +15,24 @@ class MessageUpdates(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        pipeline.register("scam_links", self.ban_scam_links, priority=0)
+
+    def cog_unload(self):
+        pipeline.unregister("scam_links")
+
+    @staticmethod
+    async def ban_scam_links(ctx: MessageContext) -> bool:
+        """ Auto-bans scam bots. A message gets a single verdict, so it is banned once no matter how many links match. """
+        link = link_filter.scam_links.match_hosts(ctx.hosts)
+        if not link or not ctx.guild:
+            return False
+
+        await ctx.guild.ban(
+            user=ctx.author,
+            reason=f"Scam link: {link}",
+            delete_message_days=1
+        )
+        return True
 
     @commands.Cog.listener()
     async def on_message_delete(self, message: Message):
@@ -30,15 +52,17 @@ class MessageUpdates(commands.Cog):
             log.info(f"{message.author} was deleted: {message.clean_content}")
 
     @commands.Cog.listener()
-    async def on_raw_message_delete(self, payload: RawBulkMessageDeleteEvent):
+    async def on_raw_message_delete(self, payload: RawMessageDeleteEvent):
         """Event Listener which is called when a message is deleted.
         Args:
-            payload (RawBulkMessageDeleteEvent): The raw event payload data.
+            payload (RawMessageDeleteEvent): The raw event payload data.
         Note:
             This requires Intents.messages to be enabled.
         For more information:
             https://discordpy.readthedocs.io/en/latest/api.html#discord.on_raw_message_delete
         """
+        # Deleted messages are left out of ticket and mute transcripts.
+        journal.delete(payload.channel_id, [payload.message_id])
 
     @commands.Cog.listener()
     async def on_bulk_message_delete(self, messages: list):
@@ -61,6 +85,7 @@ class MessageUpdates(commands.Cog):
         For more information:
             https://discordpy.readthedocs.io/en/latest/api.html#discord.on_raw_bulk_message_delete
         """
+        journal.delete(payload.channel_id, payload.message_ids)
 
     @commands.Cog.listener()
     async def on_message_edit(self, before: Message, after: Message):
@@ -92,6 +117,8 @@ class MessageUpdates(commands.Cog):
         For more information:
             https://discordpy.readthedocs.io/en/stable/api.html#discord.on_raw_message_edit
         """
+        # Ticket and mute transcripts show the latest version of a message.
+        journal.edit(payload)
 
     @commands.Cog.listener()
     async def on_reaction_add(self, reaction, user):
@@ -120,16 +147,14 @@ class MessageUpdates(commands.Cog):
         # Ignore messages from all bots (this includes itself).
         if message.author.bot:
             return
-        
-        # Temporary auto-ban solution for scam bots.
-        scam_links = ["stearncommunytiy.ru", "stearncormuntity.ru", "discord-drop.info"]
-        for link in scam_links:
-            if link in message.clean_content:
-                await message.guild.ban(
-                    user=message.author, 
-                    reason=f"Scam link: {link}",
-                    delete_message_days=1
-                )
+
+        # Add the message to the transcript of the ticket or mute channel it was sent in.
+        journal.record(message)
+
+        # Run the message through every registered filter once, stop if one of them dealt with it.
+        ctx = await pipeline.process(message)
+        if ctx.handled_by:
+            return
 
         # If message does not follow with the above code, treat it as a potential command.
         await self.bot.process_commands(message)
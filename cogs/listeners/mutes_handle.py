@@ -1,13 +1,10 @@
 import logging
-import time
 
-import dataset
 import discord
 from discord import Member
 from discord.ext import commands
 
-from cogs.commands import settings
-from utils import database, embeds
+from utils import embeds, repositories, resources
 
 # Enabling logs
 log = logging.getLogger(__name__)
@@ -21,32 +18,21 @@ class MutesHandler(commands.Cog):
 
     @commands.Cog.listener()
     async def on_member_remove(self, member: Member) -> None:
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
         guild = member.guild
         mute_channel = discord.utils.get(guild.channels, name=f"mute-{member.id}")
 
         if mute_channel:
-            mod_channel = guild.get_channel(settings.get_value("channel_moderation"))
+            mod_channel = resources.channel(guild, "channel_moderation")
             user = await self.bot.fetch_user(member.id)
 
             # Add an unmute entry in the database to prevent archive_mute_channel()'s unmuter throwing NoneType() exception.
-            mute_entry = db["mod_logs"].find_one(user_id=member.id, type="mute")
+            mute_entry = await repositories.mod_logs.find_one(user_id=member.id, type="mute")
             # Add an "unmute" entry into the database.
             if mute_entry:
-                db["mod_logs"].insert(dict(
-                    user_id=user.id,
-                    mod_id=self.bot.user.id,
-                    timestamp=int(time.time()),
-                    reason="Mute evasion.",
-                    type="unmute"
-                ))
+                await repositories.mod_logs.add(user_id=user.id, mod_id=self.bot.user.id, type="unmute", reason="Mute evasion.")
 
             # Update the mute entry in the timed_mod_actions database to prevent issues with task looping.
-            tempmute_entry = db["timed_mod_actions"].find_one(user_id=member.id, is_done=False, action_type="mute")
-            if tempmute_entry:
-                db["timed_mod_actions"].update(dict(id=tempmute_entry["id"], is_done=True), ["id"])
+            await repositories.timed_mod_actions.resolve(user_id=member.id, action_type="mute")
 
             # Archive the mute channel
             mutes = self.bot.get_cog("MuteCog")
@@ -58,13 +44,7 @@ class MutesHandler(commands.Cog):
             )
 
             # Add the ban to the mod_log database.
-            db["mod_logs"].insert(dict(
-                user_id=user.id,
-                mod_id=self.bot.user.id,
-                timestamp=int(time.time()),
-                reason="Mute evasion.",
-                type="ban"
-            ))
+            await repositories.mod_logs.add(user_id=user.id, mod_id=self.bot.user.id, type="ban", reason="Mute evasion.")
 
             # Ban the user.
             await guild.ban(user, reason="Mute evasion.")
@@ -79,10 +59,6 @@ class MutesHandler(commands.Cog):
             )
             await mod_channel.send(embed=embed)
 
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
-
 
 def setup(bot) -> None:
     """Load the cog."""
@@ -1,12 +1,11 @@
 import logging
+from typing import Optional, Set
 
-import dataset
-import discord
-from discord import Member, Message
+from discord import Member
 from discord.ext import commands
 
-from cogs.commands import settings
-from utils import database
+from utils import repositories, resources
+from utils.message_pipeline import MessageContext, pipeline
 
 # Enabling logs
 log = logging.getLogger(__name__)
@@ -17,39 +16,50 @@ class RestrictsHandler(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        # IDs of the users with an unresolved restrict, None until it is loaded from the database.
+        self.restricted: Optional[Set[int]] = None
+        pipeline.register("restricted_emotes", self.delete_fake_emotes, priority=10)
+        self.bot.loop.create_task(self.load_restricted())
 
-    @commands.Cog.listener()
-    async def on_member_join(self, member: Member):
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
-        # Get the "Restricted" role.
-        role_restricted = discord.utils.get(member.guild.roles, id=settings.get_value("role_restricted"))
+    def cog_unload(self):
+        pipeline.unregister("restricted_emotes")
 
-        # Get the restrict entries with is_done = False from database and check if its ID matches the user who just joined.
-        timed_restriction_entry = db["timed_mod_actions"].find_one(user_id=member.id, is_done=False)
-        if timed_restriction_entry:
-            await member.add_roles(role_restricted)
+    async def load_restricted(self) -> None:
+        """ Loads the users with an unresolved restrict, so joins don't need a database query. """
+        # Wait for bot to start.
+        await self.bot.wait_until_ready()
 
-        # Close the connection.
-        db.close()
+        actions = await repositories.timed_mod_actions.unresolved()
+        self.restricted = {action["user_id"] for action in actions if action["action_type"] == "restrict"}
+        log.info(f"Loaded {len(self.restricted)} restricted users.")
 
-    @commands.Cog.listener()
-    async def on_message(self, message: Message):
-        # Ignore bot messages.
-        if message.author.bot:
-            return
+    def add(self, user_id: int) -> None:
+        if self.restricted is not None:
+            self.restricted.add(user_id)
 
-        # Get the guild that the member belongs to.
-        guild = message.author.guild
+    def discard(self, user_id: int) -> None:
+        if self.restricted is not None:
+            self.restricted.discard(user_id)
 
-        # Get the "Restricted" role.
-        role_restricted = discord.utils.get(guild.roles, id=settings.get_value("role_restricted"))
+    async def is_restricted(self, user_id: int) -> bool:
+        # Until the set is loaded, fall back to the database.
+        if self.restricted is None:
+            return bool(await repositories.timed_mod_actions.pending(user_id=user_id, action_type="restrict"))
+        return user_id in self.restricted
 
-        # Automatically deletes fake Discord Nitro emotes.
-        if role_restricted in message.author.roles:
-            if "https://cdn.discordapp.com/emojis/" in message.content:
-                await message.delete()
+    @commands.Cog.listener()
+    async def on_member_join(self, member: Member):
+        # Restore the "Restricted" role of users who left and rejoined while restricted.
+        if await self.is_restricted(member.id):
+            await member.add_roles(resources.role(member.guild, "role_restricted"))
+
+    @staticmethod
+    async def delete_fake_emotes(ctx: MessageContext) -> bool:
+        """ Automatically deletes fake Discord Nitro emotes posted by restricted members. """
+        if ctx.has_role("role_restricted") and "https://cdn.discordapp.com/emojis/" in ctx.message.content:
+            await ctx.message.delete()
+            return True
+        return False
 
 
 def setup(bot) -> None:
@@ -1,15 +1,44 @@
 import logging
 import os
 import time
+from collections import OrderedDict
 
-import asyncpraw
 import discord
 from discord.ext import tasks, commands
 
 from cogs.commands import settings
+from utils import repositories
 
 log = logging.getLogger(__name__)
 
+# How many submissions are fetched at most when catching up on the posts made while the bot was down.
+CATCH_UP_LIMIT = int(os.getenv("REDDIT_CATCH_UP_LIMIT") or 100)
+# How many submissions are fetched on a regular poll, we should never get more than 10 new submissions between polls.
+POLL_LIMIT = 10
+# How many relayed submission IDs are remembered to skip duplicates.
+SEEN_SUBMISSIONS = 1000
+
+
+class SeenSubmissions:
+    """ The IDs of the most recently relayed submissions, forgetting the oldest ones past `size`. """
+
+    def __init__(self, size: int = SEEN_SUBMISSIONS):
+        self.size = size
+        self._ids = OrderedDict()
+
+    def __contains__(self, submission_id: str) -> bool:
+        return submission_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, submission_id: str) -> None:
+        self._ids[submission_id] = None
+        self._ids.move_to_end(submission_id)
+        if len(self._ids) > self.size:
+            self._ids.popitem(last=False)
+
+
 class RedditTask(commands.Cog):
     """ Reddit Background Task """
 
@@ -31,6 +60,9 @@ class RedditTask(commands.Cog):
             log.warning("Reddit functionality is disabled due to missing prerequisites")
             return
 
+        # Imported only once the feature is known to be enabled, asyncpraw is one of the slowest imports of the bot.
+        import asyncpraw
+
         self.reddit = asyncpraw.Reddit(
             client_id=self.client_id,
             client_secret=self.client_secret,
@@ -38,74 +70,121 @@ class RedditTask(commands.Cog):
         )
 
         log.info("Starting reddit functionality background task")
-        self.cache = []
-        self.bot_started_at = time.time()
-        self.check_for_posts.start() 
+        self.seen = SeenSubmissions()
+        # The (created_utc, ID) of the newest submission relayed from mark_subreddit, loaded from the database on the first poll.
+        self.mark = None
+        self.mark_subreddit = None
+        # Catch up on the posts made while the bot was down, and after a failed poll.
+        self.catching_up = True
+        self.check_for_posts.start()
 
     def cog_unload(self):
         self.check_for_posts.cancel()
 
-    @tasks.loop(seconds=settings.get_value("poll_rate"))
-    async def check_for_posts(self):
-        """ Checking for new reddit posts """
-        # Wait before starting or else new posts may not post to discord.
-        await self.bot.wait_until_ready()
-
-        try:
-            subreddit = await self.reddit.subreddit(settings.get_value("subreddit"))
-            # Grabs 10 latest posts, we should never get more than 10 new submissions in < 10 seconds.
-            async for submission in subreddit.new(limit=10):
-                # Skips over any posts already stored in cache.
-                if submission.id in self.cache:
-                    continue
-
-                # Skips over any posts from before the bot started to avoid infinite loops.
-                if submission.created_utc <= self.bot_started_at:
-                    continue
-
-                # Loads the subreddit and author so we can access extra data.
-                await submission.author.load()
-                await submission.subreddit.load()
+    async def load_mark(self, subreddit: str) -> None:
+        """ Loads the newest submission relayed before the restart, starting from now if there is none. """
+        self.mark_subreddit = subreddit
+        mark = await repositories.reddit_marks.get_mark(subreddit)
+        if mark:
+            self.mark = (mark["created_utc"], mark["submission_id"])
+            self.seen.add(mark["submission_id"])
+            log.info(f"Catching up on /r/{subreddit} since {mark['submission_id']}.")
+        else:
+            # First run, only relay what is posted from now on.
+            self.mark = (time.time(), None)
+
+    @staticmethod
+    def build_embed(submission) -> discord.Embed:
+        """ Builds the embed relaying a submission. """
+        embed = discord.Embed(
+            title=submission.title[0:252],
+            url=f"https://reddit.com{submission.permalink}",
+            description=submission.selftext[0:350],  # Cuts off the description.
+        )
 
-                log.info(f"{submission.title} was posted by /u/{submission.author.name}")
+        # Deleted accounts leave no author, suspended ones have no avatar.
+        if submission.author is None:
+            embed.set_author(name="[deleted]")
+        else:
+            embed.set_author(
+                name=submission.author.name,
+                url=f"https://reddit.com/u/{submission.author.name}",
+                icon_url=getattr(submission.author, "icon_img", None) or discord.Embed.Empty
+            )
 
-                # Builds and populates the embed.
-                embed = discord.Embed(
-                    title=submission.title[0:252],
-                    url=f"https://reddit.com{submission.permalink}",
-                    description=submission.selftext[0:350],  # Cuts off the description.
-                )
+        embed.set_footer(
+            text=f"{submission.link_flair_text} posted on /r/{submission.subreddit}",
+            icon_url=submission.subreddit.community_icon)
 
-                embed.set_author(
-                    name=submission.author.name,
-                    url=f"https://reddit.com/u/{submission.author.name}",
-                    icon_url=submission.author.icon_img
-                )
+        # Adds ellipsis if the data is too long to signify cutoff.
+        if len(submission.selftext) >= 350:
+            embed.description = embed.description + "..."
 
-                embed.set_footer(
-                    text=f"{submission.link_flair_text} posted on /r/{submission.subreddit}",
-                    icon_url=submission.subreddit.community_icon)
+        if len(submission.title) >= 252:
+            embed.title = embed.title + "..."
 
-                # Adds ellipsis if the data is too long to signify cutoff.
-                if len(submission.selftext) >= 350:
-                    embed.description = embed.description + "..."
+        return embed
 
-                if len(submission.title) >= 252:
-                    embed.title = embed.title + "..."
+    @tasks.loop(seconds=settings.get_value("poll_rate"))
+    async def check_for_posts(self):
+        """ Checking for new reddit posts """
+        # Wait before starting or else new posts may not post to discord.
+        await self.bot.wait_until_ready()
 
-                # Attempts to find the channel to send to and skips if unable to locate.
-                channel = self.bot.get_channel(settings.get_value("channel_reddit"))
-                if not channel:
-                    log.warning(f"Unable to find channel to post: {submission.title} by /u/{submission.author.name}")
+        try:
+            name = settings.get_value("subreddit")
+            if self.mark is None or self.mark_subreddit != name:
+                await self.load_mark(name)
+
+            # Collect the submissions newer than the mark, listings are sorted from new to old.
+            submissions = []
+            subreddit = await self.reddit.subreddit(name)
+            async for submission in subreddit.new(limit=CATCH_UP_LIMIT if self.catching_up else POLL_LIMIT):
+                if submission.created_utc < self.mark[0]:
+                    break
+                # Skips over any posts already relayed.
+                if submission.id in self.seen:
                     continue
-
-                # Sends embed into the Discord channel and adds to cache to avoid dupes in the future.
-                await channel.send(embed=embed)
-                self.cache.append(submission.id)
+                submissions.append(submission)
+
+            if self.catching_up and len(submissions) == CATCH_UP_LIMIT:
+                log.warning(f"Only catching up on the last {CATCH_UP_LIMIT} posts of /r/{name}, older ones are skipped.")
+            self.catching_up = False
+
+            # Attempts to find the channel to send to and stops if unable to locate, the posts are retried next poll.
+            channel = self.bot.get_channel(settings.get_value("channel_reddit"))
+            if submissions and not channel:
+                log.warning(f"Unable to find the channel to relay {len(submissions)} posts of /r/{name} to.")
+                return
+
+            # Relay them from old to new so the mark only moves forward.
+            for submission in reversed(submissions):
+                # A post that can't be relayed is skipped, it would otherwise be fetched and fail again on every poll.
+                try:
+                    # Loads the subreddit and author so we can access extra data.
+                    if submission.author is not None:
+                        await submission.author.load()
+                    await submission.subreddit.load()
+                    embed = self.build_embed(submission)
+                except Exception:
+                    log.exception(f"Unable to relay the post {submission.id} of /r/{name}, skipping it.")
+                    embed = None
+
+                if embed:
+                    log.info(f"{submission.title} was posted by /u/{submission.author.name if submission.author else '[deleted]'}")
+                    # Sends embed into the Discord channel, a failure stops the relay and the post is retried next poll.
+                    await channel.send(embed=embed)
+
+                # Moves the mark past it to avoid dupes in the future.
+                self.seen.add(submission.id)
+                self.mark = (submission.created_utc, submission.id)
+                await repositories.reddit_marks.set_mark(name, submission.created_utc, submission.id)
 
         # Catch all exceptions to avoid crashing and log the error.
         except Exception as e:
             log.error(e)
+            # Posts may have been missed, look further back on the next poll.
+            self.catching_up = True
 
 
 def setup(bot) -> None:
@@ -1,12 +1,10 @@
 import logging
-from datetime import datetime, timezone
 
-import dataset
 import discord
-from discord.ext import tasks
 from discord.ext.commands import Bot, Cog
 
-from utils import database, embeds
+from utils import embeds, repositories
+from utils.scheduler import Scheduler
 
 log = logging.getLogger(__name__)
 
@@ -16,56 +14,53 @@ class ReminderTask(Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.check_for_reminder.start()
+        # Sleeps until the next reminder is due instead of polling the database.
+        self.scheduler = Scheduler(self.send_reminder, name="reminders")
+        self.bot.loop.create_task(self.load_reminders())
 
     def cog_unload(self):
-        self.check_for_reminder.cancel()
+        self.scheduler.stop()
 
-    @tasks.loop(seconds=3.0)
-    async def check_for_reminder(self) -> None:
-        """ Checking for reminders to send """
+    async def load_reminders(self) -> None:
+        """ Rebuilds the schedule from the reminders that haven't been sent yet. """
+        # Wait for bot to start.
         await self.bot.wait_until_ready()
 
-        # Get current time to compare.
-        current_time = datetime.now(tz=timezone.utc).timestamp()
-
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
-        # Find all reminders that are older than current time and have not been sent yet.
-        remind_me = db["remind_me"]
-        result = remind_me.find(sent=False, date_to_remind={"<": current_time})
-
-        # If no results are found, simply terminate the db connection and return.
-        if not result:
-            db.close()
-            return
-
-        # Iterate over all the results found from the DB query if a result is found.
-        for reminder in result:
-            channel = self.bot.get_channel(reminder["reminder_location"])
-            user = self.bot.get_user(reminder["author_id"])
-            embed = embeds.make_embed(
-                title=f"Here is your reminder",
-                description=reminder["message"],
-                color="blurple"
-            )
-
-            # Attempt to send the reminder in the channel that it was created in. If fail, send it to their DM.
-            if channel:
-                try:
-                    await channel.send(user.mention, embed=embed)
-                except discord.HTTPException:
-                    dm = await user.create_dm()
-                    if not await dm.send(embed=embed):
-                        log.warning(f"Unable to post or DM {user}'s reminder {reminder['id']=}.")
-
-            # Mark the reminder as sent so it doesn't loop again.
-            remind_me.update(dict(id=reminder["id"], sent=True), ["id"])
-
-        # Commit the changes to the database and close the connection.
-        db.commit()
-        db.close()
+        # Reminders that came due while the bot was offline are sent right away.
+        for reminder in await repositories.reminders.unsent():
+            self.schedule(reminder)
+
+        self.scheduler.start()
+        log.info(f"Scheduled {len(self.scheduler)} pending reminders.")
+
+    def schedule(self, reminder: dict) -> None:
+        """ Schedules a reminder, or reschedules it with its new contents if it was already scheduled. """
+        self.scheduler.schedule(reminder["id"], reminder["date_to_remind"], reminder)
+
+    def cancel(self, reminder_id: int) -> None:
+        self.scheduler.cancel(reminder_id)
+
+    async def send_reminder(self, reminder_id: int, reminder: dict) -> None:
+        """ Sends a reminder once it is due. """
+        channel = self.bot.get_channel(reminder["reminder_location"])
+        user = self.bot.get_user(reminder["author_id"])
+        embed = embeds.make_embed(
+            title=f"Here is your reminder",
+            description=reminder["message"],
+            color="blurple"
+        )
+
+        # Attempt to send the reminder in the channel that it was created in. If fail, send it to their DM.
+        if channel:
+            try:
+                await channel.send(user.mention, embed=embed)
+            except discord.HTTPException:
+                dm = await user.create_dm()
+                if not await dm.send(embed=embed):
+                    log.warning(f"Unable to post or DM {user}'s reminder {reminder['id']=}.")
+
+        # Mark the reminder as sent so it isn't scheduled again on the next start.
+        await repositories.reminders.mark_sent(reminder_id)
 
 
 def setup(bot: Bot) -> None:
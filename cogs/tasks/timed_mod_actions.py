@@ -1,155 +1,216 @@
+import asyncio
 import logging
-from datetime import datetime, timezone
+import time
 
-import dataset
-from discord.ext import tasks
+import discord
 from discord.ext.commands import Bot, Cog
 
 from cogs.commands import settings
-from utils import database, embeds
+from utils import embeds, repositories, resources
+from utils.scheduler import Scheduler
 
 log = logging.getLogger(__name__)
 
+# A failed action is retried after RETRY_DELAY seconds, doubling up to RETRY_MAX_DELAY, and given up after MAX_ATTEMPTS.
+RETRY_DELAY = 10
+RETRY_MAX_DELAY = 30 * 60
+MAX_ATTEMPTS = 8
+
 
 class TimedModActionsTask(Cog):
     """ Timed Mod Actions Background  """
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.check_for_pending_mod_actions.start()
+        # Sleeps until the next action expires instead of polling the database.
+        self.scheduler = Scheduler(self.expire_action, name="timed_mod_actions")
+        # Maps an action type to the coroutine reversing it and the semaphore limiting how many run at once.
+        self.handlers = {}
+        self.register_handler("mute", self.expire_mute, concurrency=2)
+        self.register_handler("ban", self.expire_ban, concurrency=5)
+        self.register_handler("restrict", self.expire_restrict, concurrency=5)
+        self.bot.loop.create_task(self.load_actions())
 
     def cog_unload(self):
-        self.check_for_pending_mod_actions.cancel()
+        self.scheduler.stop()
+
+    def register_handler(self, action_type: str, handler, concurrency: int = 1) -> None:
+        """ Registers the coroutine that reverses an action type once it expires, allowing up to `concurrency` at once. """
+        self.handlers[action_type] = (handler, asyncio.Semaphore(concurrency))
 
-    @tasks.loop(seconds=3.0)
-    async def check_for_pending_mod_actions(self) -> None:
-        """ Checks for mod actions periodically, and reverses them accordingly if the time lapsed. """
+    async def load_actions(self) -> None:
+        """ Rebuilds the schedule from the temporary mod actions that haven't been reversed yet. """
         # Wait for bot to start.
         await self.bot.wait_until_ready()
 
-        # Open a connection to the database.
-        db = dataset.connect(database.get_db())
-
-        # Query the database for all temporary mod actions that haven't executed yet.
-        results = db["timed_mod_actions"].find(
-            is_done=False,
-            end_time={"lt": datetime.now(tz=timezone.utc).timestamp()}
-        )
-
-        # Get the guild and mod channel to send the expiration notice into.
-        guild = self.bot.get_guild(settings.get_value("guild_id"))
-        channel = guild.get_channel(settings.get_value("channel_moderation"))
-
-        for action in results:
-            if action["action_type"] == "mute":
-                # Update the database to mark the mod action as resolved.
-                db["timed_mod_actions"].update(dict(id=action["id"], is_done=True), ["id"])
-
-                # Get the MuteCog so that we can access functions from it.
-                mutes = self.bot.get_cog("MuteCog")
-
-                # Attempt to get the member if they still exist in the guild.
-                member = guild.get_member(action["user_id"])
-
-                # If the user has left the guild, send a message in #moderation and end the function. We don't need to process anything else.
-                if not member:
-                    # Fetch the user object instead because the user is no longer a member of the server.
-                    user = await self.bot.fetch_user(action["user_id"])
-
-                    # Start creating the embed that will be used to alert the moderator that the user was successfully muted.
-                    embed = embeds.make_embed(
-                        title=f"Unmuting member: {user}",
-                        thumbnail_url="https://i.imgur.com/W7DpUHC.png",
-                        color="soft_orange"
-                    )
-                    embed.description = f"Unmuted {user.mention} because their mute time elapsed but they have since left the server."
-
-                    # Archives the mute channel, sends the embed in the moderation channel, and ends the function.
-                    await channel.send(embed=embed)
-                    await mutes.archive_mute_channel(user_id=user.id, guild=guild, reason="Mute time elapsed.")
-                    return
+        # Actions that expired while the bot was offline are reversed right away.
+        for action in await repositories.timed_mod_actions.unresolved():
+            if action["end_time"] is not None:
+                self.schedule(action["id"], action["end_time"])
 
-                # Start creating the embed that will be used to alert the moderator that the user was successfully muted.
-                embed = embeds.make_embed(
-                    title=f"Unmuting member: {member}",
-                    thumbnail_url="https://i.imgur.com/W7DpUHC.png",
-                    color="soft_green"
-                )
-                embed.description = f"{member.mention} was unmuted as their mute time elapsed."
-
-                # Attempt to DM the user to let them know they were unmuted.
-                if not await mutes.send_unmuted_dm_embed(member=member, reason="Timed mute lapsed.", guild=guild):
-                    embed.add_field(name="Notice:", value=f"Unable to message {member.mention} about this action. This can be caused by the user not being in the server, having DMs disabled, or having the bot blocked.")
-
-                # Unmutes the user and returns the embed letting the moderator know they were successfully muted.
-                await mutes.unmute_member(member=member, reason="Timed mute lapsed.", guild=guild)
-                await mutes.archive_mute_channel(user_id=member.id, guild=guild, reason="Mute time elapsed.")
-                await channel.send(embed=embed)
-
-            if action["action_type"] == "ban":
-                user = await self.bot.fetch_user(action["user_id"])
-
-                # Start creating the embed that will be used to alert the moderator that the user was successfully unbanned.
-                embed = embeds.make_embed(
-                    ctx=None,
-                    title=f"Unbanning user: {user}",
-                    thumbnail_url="https://i.imgur.com/4H0IYJH.png",
-                    color="soft_green"
-                )
-                embed.description = f"{user.mention} was unbanned as their temporary ban elapsed."
+        self.scheduler.start()
+        log.info(f"Scheduled {len(self.scheduler)} pending timed mod actions.")
 
-                # Get the BanCog so that we can access functions from it.
-                bans = self.bot.get_cog("BanCog")
+    def schedule(self, action_id: int, end_time: float, attempts: int = 0) -> None:
+        """ Registers the deadline of a timed mod action, along with how many times reversing it failed already. """
+        self.scheduler.schedule(action_id, end_time, attempts)
 
-                # Unbans the user and returns the embed letting the moderator know they were successfully unbanned.
-                await bans.unban_user(user=user, reason="Temporary ban elapsed.", guild=guild)
-                await channel.send(embed=embed)
-                db["timed_mod_actions"].update(dict(id=action["id"], is_done=True), ["id"])
+    def cancel(self, action_id: int) -> None:
+        self.scheduler.cancel(action_id)
 
-            if action["action_type"] == "restrict":
-                # Update the database to mark the mod action as resolved.
-                db["timed_mod_actions"].update(dict(id=action["id"], is_done=True), ["id"])
+    async def expire_action(self, action_id: int, attempts: int = None) -> None:
+        """ Reverses a mod action once its time lapsed, through the handler registered for its type. """
+        attempts = attempts or 0
 
-                # Get the RestrictCog so that we can access functions from it.
-                restricts = self.bot.get_cog("RestrictCog")
+        # Re-read the action, it may have been lifted by hand since it was scheduled.
+        action = await repositories.timed_mod_actions.get(action_id)
+        if not action or action["is_done"]:
+            return
 
-                # Attempt to get the member if they still exist in the guild.
-                member = guild.get_member(action["user_id"])
+        if action["action_type"] not in self.handlers:
+            log.warning(f"No handler registered for timed mod action {action_id} of type {action['action_type']}.")
+            return
+        handler, semaphore = self.handlers[action["action_type"]]
 
-                # If the user has left the guild, send a message in #moderation and end the function.
-                if not member:
-                    # Fetch the user object instead because the user is no longer a member of the server.
-                    user = await self.bot.fetch_user(action["user_id"])
-
-                    # Create and send an embed that to alert the moderator that the user was unrestricted but is no longer in the guild.
-                    embed = embeds.make_embed(
-                        title=f"Unrestricting member: {user}",
-                        description=f"Unrestricted {user.mention} because their restrict time elapsed but they have since left the server.",
-                        thumbnail_url="https://i.imgur.com/W7DpUHC.png",
-                        color="soft_orange"
+        # Get the guild and mod channel to send the expiration notice into.
+        guild = self.bot.get_guild(settings.get_value("guild_id"))
+        channel = resources.channel(guild, "channel_moderation")
+
+        async with semaphore:
+            # A failing action is retried later with a growing delay, it must not hold up the others.
+            try:
+                await handler(action, guild, channel)
+            except Exception:
+                attempts += 1
+                if attempts >= MAX_ATTEMPTS:
+                    log.exception(
+                        f"Unable to reverse timed {action['action_type']} {action_id} for user {action['user_id']}, "
+                        f"giving up after {attempts} attempts until the next restart."
                     )
-
-                    await channel.send(embed=embed)
                     return
-
-                # Otherwise, create and send an embed to alert the moderator that the user was unrestricted.
-                embed = embeds.make_embed(
-                    title=f"Unrestricting member: {member}",
-                    thumbnail_url="https://i.imgur.com/W7DpUHC.png",
-                    description=f"{member.mention} was unrestricted as their restrict time elapsed.",
-                    color="soft_green"
+                delay = min(RETRY_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+                log.exception(
+                    f"Unable to reverse timed {action['action_type']} {action_id} for user {action['user_id']}, "
+                    f"retrying in {delay}s."
                 )
+                self.schedule(action_id, time.time() + delay, attempts)
+
+    async def expire_mute(self, action: dict, guild: discord.Guild, channel: discord.TextChannel) -> None:
+        # Update the database to mark the mod action as resolved.
+        await repositories.timed_mod_actions.mark_done(action["id"])
+
+        # Get the MuteCog so that we can access functions from it.
+        mutes = self.bot.get_cog("MuteCog")
+
+        # Attempt to get the member if they still exist in the guild.
+        member = guild.get_member(action["user_id"])
+
+        # If the user has left the guild, send a message in #moderation and end the function. We don't need to process anything else.
+        if not member:
+            # Fetch the user object instead because the user is no longer a member of the server.
+            user = await self.bot.fetch_user(action["user_id"])
+
+            # Start creating the embed that will be used to alert the moderator that the user was successfully muted.
+            embed = embeds.make_embed(
+                title=f"Unmuting member: {user}",
+                thumbnail_url="https://i.imgur.com/W7DpUHC.png",
+                color="soft_orange"
+            )
+            embed.description = f"Unmuted {user.mention} because their mute time elapsed but they have since left the server."
+
+            # Archives the mute channel, sends the embed in the moderation channel, and ends the function.
+            await channel.send(embed=embed)
+            await mutes.archive_mute_channel(user_id=user.id, guild=guild, reason="Mute time elapsed.")
+            return
+
+        # Start creating the embed that will be used to alert the moderator that the user was successfully muted.
+        embed = embeds.make_embed(
+            title=f"Unmuting member: {member}",
+            thumbnail_url="https://i.imgur.com/W7DpUHC.png",
+            color="soft_green"
+        )
+        embed.description = f"{member.mention} was unmuted as their mute time elapsed."
+
+        # Attempt to DM the user to let them know they were unmuted.
+        if not await mutes.send_unmuted_dm_embed(member=member, reason="Timed mute lapsed.", guild=guild):
+            embed.add_field(name="Notice:", value=f"Unable to message {member.mention} about this action. This can be caused by the user not being in the server, having DMs disabled, or having the bot blocked.")
+
+        # Unmutes the user and returns the embed letting the moderator know they were successfully muted.
+        await mutes.unmute_member(member=member, reason="Timed mute lapsed.", guild=guild)
+        await mutes.archive_mute_channel(user_id=member.id, guild=guild, reason="Mute time elapsed.")
+        await channel.send(embed=embed)
+
+    async def expire_ban(self, action: dict, guild: discord.Guild, channel: discord.TextChannel) -> None:
+        user = await self.bot.fetch_user(action["user_id"])
+
+        # Get the BanCog so that we can access functions from it.
+        bans = self.bot.get_cog("BanCog")
+
+        # The unban is always attempted, the ban list mirror isn't trusted with letting a ban stay forever.
+        if not await bans.unban_user(user=user, reason="Temporary ban elapsed.", guild=guild):
+            # The user was already unbanned by hand, there is nothing left to reverse.
+            await repositories.timed_mod_actions.mark_done(action["id"])
+            return
+
+        # Start creating the embed that will be used to alert the moderator that the user was successfully unbanned.
+        embed = embeds.make_embed(
+            ctx=None,
+            title=f"Unbanning user: {user}",
+            thumbnail_url="https://i.imgur.com/4H0IYJH.png",
+            color="soft_green"
+        )
+        embed.description = f"{user.mention} was unbanned as their temporary ban elapsed."
+
+        # Let the moderators know the user was successfully unbanned.
+        await channel.send(embed=embed)
+        await repositories.timed_mod_actions.mark_done(action["id"])
+
+    async def expire_restrict(self, action: dict, guild: discord.Guild, channel: discord.TextChannel) -> None:
+        # Update the database to mark the mod action as resolved.
+        await repositories.timed_mod_actions.mark_done(action["id"])
+
+        # Stop restoring the restrict when the user rejoins.
+        restricts_handler = self.bot.get_cog("RestrictsHandler")
+        if restricts_handler:
+            restricts_handler.discard(action["user_id"])
+
+        # Get the RestrictCog so that we can access functions from it.
+        restricts = self.bot.get_cog("RestrictCog")
+
+        # Attempt to get the member if they still exist in the guild.
+        member = guild.get_member(action["user_id"])
+
+        # If the user has left the guild, send a message in #moderation and end the function.
+        if not member:
+            # Fetch the user object instead because the user is no longer a member of the server.
+            user = await self.bot.fetch_user(action["user_id"])
+
+            # Create and send an embed that to alert the moderator that the user was unrestricted but is no longer in the guild.
+            embed = embeds.make_embed(
+                title=f"Unrestricting member: {user}",
+                description=f"Unrestricted {user.mention} because their restrict time elapsed but they have since left the server.",
+                thumbnail_url="https://i.imgur.com/W7DpUHC.png",
+                color="soft_orange"
+            )
+
+            await channel.send(embed=embed)
+            return
+
+        # Otherwise, create and send an embed to alert the moderator that the user was unrestricted.
+        embed = embeds.make_embed(
+            title=f"Unrestricting member: {member}",
+            thumbnail_url="https://i.imgur.com/W7DpUHC.png",
+            description=f"{member.mention} was unrestricted as their restrict time elapsed.",
+            color="soft_green"
+        )
 
-                # Attempt to DM the user to let them know they were unrestricted.
-                if not await restricts.send_unrestricted_dm_embed(member=member, reason="Timed restriction lapsed.", guild=guild):
-                    embed.add_field(name="Notice:", value=f"Unable to message {member.mention} about this action. This can be caused by the user not being in the server, having DMs disabled, or having the bot blocked.")
-
-                # Unrestricts the user and returns the embed letting the moderator know they were successfully unrestricted.
-                await restricts.unrestrict_member(member=member, reason="Timed restriction lapsed.", guild=guild)
-                await channel.send(embed=embed)
+        # Attempt to DM the user to let them know they were unrestricted.
+        if not await restricts.send_unrestricted_dm_embed(member=member, reason="Timed restriction lapsed.", guild=guild):
+            embed.add_field(name="Notice:", value=f"Unable to message {member.mention} about this action. This can be caused by the user not being in the server, having DMs disabled, or having the bot blocked.")
 
-        # Close the connection to the database once we're done.
-        db.close()
+        # Unrestricts the user and returns the embed letting the moderator know they were successfully unrestricted.
+        await restricts.unrestrict_member(member=member, reason="Timed restriction lapsed.", guild=guild)
+        await channel.send(embed=embed)
 
 
 def setup(bot: Bot) -> None:
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+import time
+
+import aiohttp
+import discord
+from discord.ext import tasks
+from discord.ext.commands import Bot, Cog
+
+from utils import repositories
+from utils.transcripts import PENDING_LINK, TranscriptUploadError, retry_delay, uploader
+
+log = logging.getLogger(__name__)
+
+
+class TranscriptUploadTask(Cog):
+    """ Transcript Upload Retry Background Task """
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.retry_uploads.start()
+
+    def cog_unload(self):
+        self.retry_uploads.cancel()
+        # The shared session is recreated by the uploader on its next use.
+        self.bot.loop.create_task(uploader.close())
+
+    @tasks.loop(minutes=1)
+    async def retry_uploads(self) -> None:
+        """ Retries the transcript uploads that are due, backing off exponentially on each failure. """
+        # Wait for bot to start.
+        await self.bot.wait_until_ready()
+
+        for upload in await repositories.transcript_uploads.due(time.time()):
+            try:
+                url = await uploader.retry(upload)
+            except FileNotFoundError:
+                # Without its local copy there is nothing left to upload, stop retrying it.
+                log.error(f"Dropping queued transcript {upload['id']}, its local copy {upload['path']} is gone.")
+                await repositories.transcript_uploads.mark_uploaded(upload["id"], url=None)
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError, TranscriptUploadError, ValueError) as error:
+                attempts = upload["attempts"] + 1
+                await repositories.transcript_uploads.postpone(
+                    upload["id"], attempts=attempts, next_attempt=time.time() + retry_delay(attempts)
+                )
+                log.warning(f"Upload {attempts} of transcript {upload['name']} failed, retrying later: {error}")
+                # The instance is most likely still down, leave the rest of the queue for the next round.
+                break
+
+            await repositories.transcript_uploads.mark_uploaded(upload["id"], url=url)
+            if upload["ticket_id"]:
+                await repositories.tickets.set_log_url(upload["ticket_id"], url)
+            await self.update_archive_message(upload, url)
+
+            # The local copy is no longer needed once the paste exists.
+            try:
+                os.remove(upload["path"])
+            except OSError:
+                log.warning(f"Unable to remove the local copy of transcript {upload['name']} at {upload['path']}.")
+            log.info(f"Uploaded queued transcript {upload['name']} to {url}.")
+
+    async def update_archive_message(self, upload: dict, url: str) -> None:
+        """ Replaces the pending notice in the archive embed with the URL of the paste. """
+        channel = self.bot.get_channel(upload["channel_id"]) if upload["channel_id"] else None
+        if not channel:
+            return
+
+        try:
+            message = await channel.fetch_message(upload["message_id"])
+        except discord.HTTPException:
+            log.warning(f"Unable to fetch the archive message of transcript {upload['name']}.")
+            return
+
+        embed = message.embeds[0]
+        for index, field in enumerate(embed.fields):
+            if field.value == PENDING_LINK:
+                embed.set_field_at(index, name=field.name, value=url, inline=field.inline)
+        await message.edit(embed=embed)
+
+
+def setup(bot: Bot) -> None:
+    """ Load the TranscriptUploadTask cog. """
+    bot.add_cog(TranscriptUploadTask(bot))
+    log.info("Cog loaded: transcript_upload_task")
@@ -0,0 +1,38 @@
+import argparse
+import logging
+
+import __init__
+from utils import export
+
+log = logging.getLogger(__name__)
+
+
+def main() -> None:
+    """ Exports moderation data from the command line, using the same MYSQL_* environment variables as the bot. """
+    parser = argparse.ArgumentParser(description="Export moderation data to gzip compressed JSONL or CSV files.")
+    parser.add_argument("table", choices=list(export.EXPORTABLE_TABLES), help="The table to export.")
+    parser.add_argument("--format", choices=export.FORMATS, default="jsonl", help="The output format, defaults to jsonl.")
+    parser.add_argument("--since", type=export.parse_date, help="Only export rows dated on or after this day (YYYY-MM-DD).")
+    parser.add_argument("--until", type=export.parse_date, help="Only export rows dated before this day (YYYY-MM-DD).")
+    parser.add_argument("--user", type=int, help="Only export rows about this user ID.")
+    parser.add_argument("--output", default="exports", help="The folder the files are written to, defaults to exports.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="How many rows are fetched at a time.")
+    parser.add_argument("--part-size", type=int, help="Split the output into files of about this many megabytes.")
+    args = parser.parse_args()
+
+    paths = export.export_table(
+        args.table,
+        args.output,
+        format=args.format,
+        since=args.since,
+        until=args.until,
+        user_id=args.user,
+        chunk_size=args.chunk_size,
+        part_size=args.part_size * 1024 * 1024 if args.part_size else None
+    )
+    for path in paths:
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
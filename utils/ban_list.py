@@ -0,0 +1,100 @@
+import logging
+import time
+from typing import Dict, List, Set, Tuple
+
+import discord
+
+log = logging.getLogger(__name__)
+
+# The most bans Discord returns per request of the ban list.
+BANS_PAGE_SIZE = 1000
+
+
+async def fetch_ban_ids(guild: discord.Guild) -> Set[int]:
+    """ Returns the IDs of every user banned from a guild, reading the ban list page by page.
+
+    The ban list endpoint is paginated, and guild.bans() of discord.py 1.7 only ever reads its first page.
+    """
+    route = discord.http.Route("GET", "/guilds/{guild_id}/bans", guild_id=guild.id)
+    ban_ids = set()
+    after = 0
+    while True:
+        page = await guild._state.http.request(route, params=dict(limit=BANS_PAGE_SIZE, after=after))
+        ban_ids.update(int(ban_entry["user"]["id"]) for ban_entry in page)
+        if len(page) < BANS_PAGE_SIZE:
+            return ban_ids
+        # Pages are sorted by user ID.
+        after = max(int(ban_entry["user"]["id"]) for ban_entry in page)
+
+
+class BanList:
+    """ An in-memory mirror of the ban list of each guild, answering "is this user banned?" without an API request.
+
+    A guild's bans are fetched once with fetch_ban_ids() the first time they are needed (or at startup through
+    cogs/listeners/bans_handle.py) and then kept in sync from the ban and unban events. The same listener cog reloads
+    the list periodically in case an event was missed, e.g. while the bot was disconnected. Events that arrive while
+    the list is being fetched are recorded and replayed onto it, as the fetched list may predate them.
+    """
+
+    def __init__(self):
+        self._bans: Dict[int, Set[int]] = {}
+        # Guild ID to the (user ID, banned) events received during each fetch of its ban list in flight.
+        self._journals: Dict[int, List[List[Tuple[int, bool]]]] = {}
+
+    async def load(self, guild: discord.Guild) -> None:
+        """ (Re)fetches the whole ban list of a guild. """
+        started = time.perf_counter()
+        journal = []
+        self._journals.setdefault(guild.id, []).append(journal)
+        try:
+            bans = await fetch_ban_ids(guild)
+        finally:
+            self._journals[guild.id].remove(journal)
+            if not self._journals[guild.id]:
+                del self._journals[guild.id]
+
+        for user_id, banned in journal:
+            if banned:
+                bans.add(user_id)
+            else:
+                bans.discard(user_id)
+
+        previous = self._bans.get(guild.id)
+        if previous is not None and previous != bans:
+            log.info(f"Reconciled the ban list of {guild}: {len(bans - previous)} missed bans, {len(previous - bans)} missed unbans.")
+
+        self._bans[guild.id] = bans
+        log.info(f"Loaded {len(bans)} bans of {guild} in {time.perf_counter() - started:.2f}s.")
+
+    def is_loaded(self, guild: discord.Guild) -> bool:
+        return guild.id in self._bans
+
+    async def is_banned(self, guild: discord.Guild, user_id: int) -> bool:
+        """ Returns True if the user is banned from the guild, loading its ban list if it wasn't yet. """
+        if guild.id not in self._bans:
+            await self.load(guild)
+        return user_id in self._bans[guild.id]
+
+    async def banned(self, guild: discord.Guild) -> Set[int]:
+        """ Returns a copy of the IDs of the users banned from the guild. """
+        if guild.id not in self._bans:
+            await self.load(guild)
+        return set(self._bans[guild.id])
+
+    def _record(self, guild: discord.Guild, user_id: int, banned: bool) -> None:
+        for journal in self._journals.get(guild.id, ()):
+            journal.append((user_id, banned))
+
+    def add(self, guild: discord.Guild, user_id: int) -> None:
+        # Events for a guild that was never loaded are dropped, the list is complete once it gets loaded.
+        self._record(guild, user_id, True)
+        if guild.id in self._bans:
+            self._bans[guild.id].add(user_id)
+
+    def discard(self, guild: discord.Guild, user_id: int) -> None:
+        self._record(guild, user_id, False)
+        if guild.id in self._bans:
+            self._bans[guild.id].discard(user_id)
+
+
+bans = BanList()
@@ -0,0 +1,116 @@
+import builtins
+import contextlib
+import logging
+import sys
+import threading
+import time
+from typing import Dict, List, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class ImportProfile:
+    """ Times the imports made during startup, like `python -X importtime` but reported in the startup log.
+
+    Wraps builtins.__import__ while active and records each module imported for the first time, with its cumulative
+    time (including the modules it imports) and its self time. Only the main thread is profiled, and imports of modules
+    that are already loaded go straight through.
+    """
+
+    def __init__(self):
+        # Module name to [self time, cumulative time].
+        self.timings: Dict[str, List[float]] = {}
+        self._original = None
+        # Time spent in nested imports, one entry per import in progress.
+        self._children: List[float] = []
+
+    def start(self) -> None:
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def stop(self) -> None:
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original or builtins.__import__
+        if level or threading.current_thread() is not threading.main_thread():
+            return original(name, globals, locals, fromlist, level)
+
+        # `from package import module` loads the module even when the package is already loaded.
+        new = [module for module in [name, *(f"{name}.{item}" for item in fromlist or ())] if module not in sys.modules]
+        if not new:
+            return original(name, globals, locals, fromlist, level)
+
+        self._children.append(0.0)
+        started = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            # A fromlist entry that isn't a module (e.g. a class) never lands in sys.modules, skip it.
+            modules = [module for module in new if module in sys.modules]
+            if len(modules) > 1 and name in modules:
+                modules.remove(name)
+            if modules:
+                self.timings[" + ".join(modules)] = [elapsed - children, elapsed]
+
+    def slowest(self, count: int = 10) -> List[Tuple[str, float, float]]:
+        """ Returns the (module, self time, cumulative time) of the imports with the highest self time. """
+        timings = sorted(self.timings.items(), key=lambda item: item[1][0], reverse=True)
+        return [(module, own, cumulative) for module, (own, cumulative) in timings[:count]]
+
+
+class BootTimer:
+    """ Records how long each phase of the startup took, so slow boots can be traced back to their cause. """
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+        # Phase name to the timings of its steps, e.g. the extensions loaded during the "cogs" phase.
+        self.steps: Dict[str, List[Tuple[str, float]]] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases.append((name, seconds))
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """ Times the block as a phase of the startup. """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    @contextlib.contextmanager
+    def step(self, phase: str, name: str):
+        """ Times the block as a step of a phase, e.g. loading one extension. """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.setdefault(phase, []).append((name, time.perf_counter() - started))
+
+    def report(self, slowest: int = 5) -> str:
+        """ Returns the breakdown of the startup, listing the slowest steps of each phase. """
+        total = sum(seconds for _, seconds in self.phases)
+        lines = [f"Startup took {total:.2f}s:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name}: {seconds:.2f}s ({seconds / total:.0%})" if total else f"  {name}: {seconds:.2f}s")
+            steps = sorted(self.steps.get(name, []), key=lambda step: step[1], reverse=True)
+            for step, step_seconds in steps[:slowest]:
+                lines.append(f"    {step}: {step_seconds:.3f}s")
+
+        if import_profile.timings:
+            lines.append(f"Slowest of the {len(import_profile.timings)} imports (self / cumulative):")
+            for module, own, cumulative in import_profile.slowest():
+                lines.append(f"  {module}: {own:.3f}s / {cumulative:.3f}s")
+        return "\n".join(lines)
+
+
+import_profile = ImportProfile()
+boot = BootTimer()
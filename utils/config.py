@@ -0,0 +1,133 @@
+import asyncio
+import contextlib
+import logging
+import os
+import threading
+import time
+from typing import Optional, Union
+
+from utils import database
+
+log = logging.getLogger(__name__)
+
+
+class SettingsStore:
+    """ Process-wide, in-memory copy of the settings table.
+
+    The table is read once and every lookup afterwards is served from memory. The /settings commands write
+    through to the store so changes are visible immediately, and an optional TTL (SETTINGS_CACHE_TTL, in seconds)
+    reloads the table to pick up edits made directly in the database.
+    """
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        # Bumped on every change so consumers can cheaply tell when to rebuild anything derived from settings.
+        self.version = 0
+        self._values = {}
+        self._censored = {}
+        self._loaded_at = None
+        self._refreshing = False
+        self._pinned = 0
+        # How many times the table was read, for the startup report.
+        self.loads = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _parse(value: Optional[str]) -> Union[int, str, None]:
+        # If the entry's value consists of only numbers, store it as an int, otherwise keep it as a string.
+        if value is not None and value.isdecimal():
+            return int(value)
+        return value
+
+    def load(self) -> None:
+        """ Reads the whole settings table in a single query and replaces the in-memory copy. """
+        with database.session() as db:
+            rows = list(db["settings"].all())
+
+        with self._lock:
+            self._values = {row["name"]: self._parse(row["value"]) for row in rows}
+            self._censored = {row["name"]: bool(row["censored"]) for row in rows}
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+            self.version += 1
+
+        log.debug(f"Loaded {len(rows)} settings into memory.")
+
+    @property
+    def is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        if self._pinned:
+            return False
+        return bool(self.ttl) and time.monotonic() - self._loaded_at > self.ttl
+
+    @contextlib.contextmanager
+    def pinned(self):
+        """ Serves every lookup from the current copy until the block exits, whatever the TTL.
+
+        Used while the cogs are loaded, as their slash command decorators look settings up at import time.
+        """
+        self._ensure_loaded()
+        self._pinned += 1
+        try:
+            yield self
+        finally:
+            self._pinned -= 1
+
+    def _ensure_loaded(self) -> None:
+        # The very first load has to block, there is nothing to serve yet.
+        if self._loaded_at is None:
+            self.load()
+        elif self.is_stale:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        """ Reloads an expired store without blocking the event loop, serving the current values meanwhile. """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not called from a coroutine (e.g. at import time), a blocking reload is fine.
+            self.load()
+            return
+
+        if self._refreshing:
+            return
+        self._refreshing = True
+        loop.create_task(self._refresh_in_background())
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            await database.run(self.load)
+        except Exception:
+            log.exception("Unable to refresh the settings store, serving the previous values.")
+            # Wait a full TTL before retrying rather than hammering the database on every lookup.
+            self._loaded_at = time.monotonic()
+        finally:
+            self._refreshing = False
+
+    def get(self, name: str) -> Union[int, str, None]:
+        """ Returns the value of a setting, raising a KeyError if it does not exist. """
+        self._ensure_loaded()
+        return self._values[name]
+
+    def is_censored(self, name: str) -> bool:
+        self._ensure_loaded()
+        return self._censored[name]
+
+    def set(self, name: str, value: Optional[str], censored: bool = None) -> None:
+        """ Write-through for a setting that was just added or edited in the database. """
+        with self._lock:
+            self._values[name] = self._parse(value)
+            if censored is not None or name not in self._censored:
+                self._censored[name] = bool(censored)
+            self.version += 1
+
+    def remove(self, name: str) -> None:
+        """ Write-through for a setting that was just deleted from the database. """
+        with self._lock:
+            self._values.pop(name, None)
+            self._censored.pop(name, None)
+            self.version += 1
+
+
+store = SettingsStore(ttl=float(os.getenv("SETTINGS_CACHE_TTL") or 0))
@@ -1,12 +1,35 @@
+import asyncio
+import functools
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import dataset
-from sqlalchemy import create_engine
+from sqlalchemy import event
 from sqlalchemy_utils import database_exists, create_database
 
+from utils import migrations
+
 log = logging.getLogger(__name__)
 
+# Connection pool sizing, overridable through the environment.
+POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE") or 5)
+POOL_MAX_OVERFLOW = int(os.getenv("MYSQL_POOL_MAX_OVERFLOW") or 5)
+POOL_TIMEOUT = int(os.getenv("MYSQL_POOL_TIMEOUT") or 30)
+# MariaDB drops idle connections after wait_timeout (8 hours by default), recycle well before that.
+POOL_RECYCLE = int(os.getenv("MYSQL_POOL_RECYCLE") or 3600)
+
+# The shared, long-lived database handle and its pool statistics.
+_database = None
+_database_lock = threading.Lock()
+_stats = dict(checkouts=0, wait_total=0.0, wait_max=0.0)
+
+# Dedicated threads for blocking queries, sized to the pool so a worker never waits on a connection.
+executor = ThreadPoolExecutor(max_workers=POOL_SIZE + POOL_MAX_OVERFLOW, thread_name_prefix="database")
+
 
 def get_db():
     """ Returns the OS friendly path to the SQLite database. """
@@ -17,61 +40,101 @@ def get_db():
     return f"mysql://{USER}:{PASSWORD}@{HOST}/{DATABASE}"
 
 
+def get_database() -> dataset.Database:
+    """ Returns the shared database handle, creating its engine and connection pool on first use. """
+    global _database
+
+    with _database_lock:
+        if _database is None:
+            _database = dataset.Database(get_db(), engine_kwargs=dict(
+                pool_size=POOL_SIZE,
+                max_overflow=POOL_MAX_OVERFLOW,
+                pool_timeout=POOL_TIMEOUT,
+                pool_recycle=POOL_RECYCLE,
+                pool_pre_ping=True
+            ))
+
+            @event.listens_for(_database.engine, "checkout")
+            def on_checkout(dbapi_connection, connection_record, connection_proxy):
+                _stats["checkouts"] += 1
+
+            log.info(f"Created database connection pool (size={POOL_SIZE}, overflow={POOL_MAX_OVERFLOW}).")
+
+    return _database
+
+
+@contextmanager
+def session():
+    """ Checks a connection out of the pool and wraps the block in a transaction.
+
+    The transaction is committed when the block exits normally and rolled back if it raises. The connection is
+    returned to the pool afterwards rather than being closed, so no handshake is paid on the next use.
+
+    Example:
+        with database.session() as db:
+            db["mod_logs"].insert(dict(...))
+    """
+    db = get_database()
+
+    # Check out this thread's connection ourselves rather than through db.executable, which would hold the
+    # database-wide lock while waiting on the pool and stop other threads from returning their connections.
+    thread_id = threading.get_ident()
+    if thread_id not in db.connections:
+        # Time how long it takes to get a connection so pool starvation shows up in the statistics.
+        started = time.perf_counter()
+        connection = db.engine.connect()
+        waited = time.perf_counter() - started
+        _stats["wait_total"] += waited
+        _stats["wait_max"] = max(_stats["wait_max"], waited)
+        with db.lock:
+            db.connections[thread_id] = connection
+
+    db.begin()
+    try:
+        yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        # Only hand the connection back once the outermost session on this thread is done with it.
+        if not db.in_transaction:
+            with db.lock:
+                connection = db.connections.pop(thread_id, None)
+            if connection is not None:
+                connection.close()
+
+
+async def run(func, *args, **kwargs):
+    """ Runs a blocking database function on the database thread pool and awaits its result.
+
+    Keeps slow queries off the event loop so they cannot stall the gateway heartbeat or other commands.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def pool_stats() -> dict:
+    """ Returns a snapshot of the connection pool usage for monitoring. """
+    pool = get_database().engine.pool
+    checkouts = _stats["checkouts"]
+    return dict(
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        checked_in=pool.checkedin(),
+        overflow=max(pool.overflow(), 0),
+        max_overflow=POOL_MAX_OVERFLOW,
+        checkouts=checkouts,
+        wait_avg=_stats["wait_total"] / checkouts if checkouts else 0.0,
+        wait_max=_stats["wait_max"]
+    )
+
+
 def setup_db():
-    """ Sets up the tables needed for Chiya. """
+    """ Sets up the database and brings the tables needed for Chiya up to date. """
     # Create the database if it doesn't already exist.
-    engine = create_engine(get_db())
-    if not database_exists(engine.url):
-        create_database(engine.url)
-
-    # Open a connection to the database.
-    db = dataset.connect(get_db())
-
-    # TODO: Add check to see if tables exists before creating.
-    # Create mod_logs table and columns to store moderator actions.
-    mod_logs = db.create_table("mod_logs")
-    mod_logs.create_column("user_id", db.types.bigint)
-    mod_logs.create_column("mod_id", db.types.bigint)
-    mod_logs.create_column("timestamp", db.types.bigint)
-    mod_logs.create_column("reason", db.types.text)
-    mod_logs.create_column("type", db.types.text)
-
-    # Create remind_me table and columns to store remind_me messages.
-    remind_me = db.create_table("remind_me")
-    remind_me.create_column("reminder_location", db.types.bigint)
-    remind_me.create_column("author_id", db.types.bigint)
-    remind_me.create_column("date_to_remind", db.types.bigint)
-    remind_me.create_column("message", db.types.text)
-    remind_me.create_column("sent", db.types.boolean, default=False)
-
-    # Create timed_mod_actions table and columns to store timed moderator actions.
-    timed_mod_actions = db.create_table("timed_mod_actions")
-    timed_mod_actions.create_column("user_id", db.types.bigint)
-    timed_mod_actions.create_column("mod_id", db.types.bigint)
-    timed_mod_actions.create_column("action_type", db.types.text)
-    timed_mod_actions.create_column("start_time", db.types.bigint)
-    timed_mod_actions.create_column("end_time", db.types.bigint)
-    timed_mod_actions.create_column("is_done", db.types.boolean, default=False)
-    timed_mod_actions.create_column("reason", db.types.text)
-
-    # Create ticket table and columns to store the ticket status information
-    tickets = db.create_table("tickets")
-    tickets.create_column("user_id", db.types.bigint)
-    tickets.create_column("status", db.types.text)
-    tickets.create_column("guild", db.types.bigint)
-    tickets.create_column("timestamp", db.types.bigint)
-    tickets.create_column("ticket_topic", db.types.text)
-    tickets.create_column("log_url", db.types.text)
-
-    # Create settings table and columns to store key:value pairs.
-    settings = db.create_table("settings")
-    settings.create_column("name", db.types.text)
-    settings.create_column("value", db.types.text)
-    settings.create_column("censored", db.types.boolean)
-
-    # Commit the changes to the database and close the connection.
-    db.commit()
-    db.close()
-
-    # TODO: Retain what tables didn't exist/were created so we can print those to console.
-    log.info("Created any missing tables and columns.")
+    if not database_exists(get_db()):
+        create_database(get_db())
+
+    # Create any missing tables, columns and indexes through the versioned schema migrations.
+    migrations.migrate()
@@ -0,0 +1,145 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import logging
+import os
+import time
+from typing import List, Optional
+
+from sqlalchemy import and_
+
+from utils import database
+
+log = logging.getLogger(__name__)
+
+# Tables that can be exported, mapped to the column their date filters apply to.
+EXPORTABLE_TABLES = {
+    "mod_logs": "timestamp",
+    "timed_mod_actions": "start_time",
+    "tickets": "timestamp",
+}
+FORMATS = ("jsonl", "csv")
+
+# Discord refuses attachments above 8 MB, keep some room for the gzip trailer and the request.
+ATTACHMENT_PART_SIZE = 7 * 1024 * 1024
+
+
+def parse_date(value: str) -> float:
+    """ Turns a YYYY-MM-DD date into the timestamp of midnight UTC on that day. """
+    return datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+class _PartWriter:
+    """ Writes rows to gzip compressed files, starting a new file whenever the current one reaches part_size bytes. """
+
+    def __init__(self, directory: str, name: str, format: str, columns: List[str], part_size: Optional[int]):
+        self.directory = directory
+        self.name = name
+        self.format = format
+        self.columns = columns
+        self.part_size = part_size
+        self.paths = []
+        self._raw = None
+        self._text = None
+        self._csv = None
+
+    def _open(self) -> None:
+        path = os.path.join(self.directory, f"{self.name}.part{len(self.paths) + 1}.{self.format}.gz")
+        self.paths.append(path)
+        self._raw = open(path, "wb")
+        self._text = io.TextIOWrapper(gzip.GzipFile(fileobj=self._raw, mode="wb"), encoding="utf-8", newline="")
+        # Every part is a complete file of its own, so CSV parts each get the header.
+        if self.format == "csv":
+            self._csv = csv.writer(self._text)
+            self._csv.writerow(self.columns)
+
+    def write(self, rows: List[tuple]) -> None:
+        if self._raw is None:
+            self._open()
+
+        if self.format == "csv":
+            self._csv.writerows(rows)
+        else:
+            self._text.write("".join(json.dumps(dict(zip(self.columns, row)), default=str) + "\n" for row in rows))
+
+        if self.part_size:
+            # Flush the compressor so the file size is exact, a part then overshoots by at most one chunk.
+            self._text.flush()
+            if self._raw.tell() >= self.part_size:
+                self.close()
+
+    def close(self) -> None:
+        if self._text is not None:
+            self._text.close()
+            self._raw.close()
+        self._raw = self._text = self._csv = None
+
+
+def export_table(
+    table: str,
+    directory: str,
+    format: str = "jsonl",
+    since: float = None,
+    until: float = None,
+    user_id: int = None,
+    chunk_size: int = 1000,
+    part_size: int = None
+) -> List[str]:
+    """ Streams a table to gzip compressed JSONL or CSV files and returns their paths.
+
+    Rows are read through a server-side cursor `chunk_size` at a time and written out as they arrive, so memory use
+    doesn't depend on the size of the table. With a part_size the output is split into files of about that many
+    (compressed) bytes, e.g. ATTACHMENT_PART_SIZE to send them as Discord attachments.
+
+    Args:
+        table (str): One of EXPORTABLE_TABLES.
+        directory (str): Where the files are written.
+        format (str): "jsonl" or "csv".
+        since (float): Only export rows dated at or after this timestamp.
+        until (float): Only export rows dated before this timestamp.
+        user_id (int): Only export rows about this user.
+    """
+    if table not in EXPORTABLE_TABLES:
+        raise ValueError(f"{table} can't be exported, choose from {', '.join(EXPORTABLE_TABLES)}.")
+    if format not in FORMATS:
+        raise ValueError(f"{format} isn't a supported format, choose from {', '.join(FORMATS)}.")
+
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    rows_written = 0
+
+    with database.session() as db:
+        sa_table = db[table].table
+        date_column = sa_table.c[EXPORTABLE_TABLES[table]]
+
+        conditions = []
+        if since is not None:
+            conditions.append(date_column >= since)
+        if until is not None:
+            conditions.append(date_column < until)
+        if user_id is not None:
+            conditions.append(sa_table.c.user_id == user_id)
+        query = sa_table.select().order_by(sa_table.c.id)
+        if conditions:
+            query = query.where(and_(*conditions))
+
+        # stream_results makes the driver use a server-side cursor (SSCursor on MySQL) instead of buffering every row.
+        result = db.executable.execution_options(stream_results=True).execute(query)
+        writer = _PartWriter(directory, f"{table}-{int(time.time())}", format, list(result.keys()), part_size)
+        try:
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                writer.write([tuple(row) for row in rows])
+                rows_written += len(rows)
+        finally:
+            result.close()
+            writer.close()
+
+    log.info(
+        f"Exported {rows_written} rows of {table} to {len(writer.paths)} file(s) in {time.perf_counter() - started:.2f}s."
+    )
+    return writer.paths
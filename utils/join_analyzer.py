@@ -0,0 +1,152 @@
+import datetime
+import difflib
+import logging
+import re
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Tuple
+
+import discord
+
+from utils.link_filter import normalize_text
+
+log = logging.getLogger(__name__)
+
+# A burst is this many joins within the window, or this many suspicious joins (see JoinAnalyzer) within the window.
+BURST_WINDOW = 10
+BURST_JOINS = 15
+BURST_SUSPICIOUS_JOINS = 6
+# Accounts younger than this are suspicious on their own.
+NEW_ACCOUNT_AGE = datetime.timedelta(days=7)
+# Usernames at least this similar to a recent one belong to the same cluster.
+NAME_SIMILARITY = 0.8
+# How many recent name clusters are compared against, and how long they are kept.
+NAME_CLUSTERS = 50
+NAME_CLUSTER_TTL = 5 * 60
+# A cluster of this many recent joins is suspicious.
+NAME_CLUSTER_SIZE = 3
+# Alerts aren't repeated until the guild has been calm for this long.
+ALERT_COOLDOWN = 5 * 60
+
+
+class SlidingWindowCounter:
+    """ Counts the events of the last `window` seconds. """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._events: Deque[float] = deque()
+
+    def _expire(self, now: float) -> None:
+        while self._events and self._events[0] <= now - self.window:
+            self._events.popleft()
+
+    def add(self, now: float) -> int:
+        """ Records an event and returns the count of the window it falls in. """
+        self._expire(now)
+        self._events.append(now)
+        return len(self._events)
+
+    def count(self, now: float) -> int:
+        self._expire(now)
+        return len(self._events)
+
+
+def name_skeleton(name: str) -> str:
+    """ Folds a username down to what raid bots don't vary: lookalikes, case, digits and separators are dropped. """
+    return re.sub(r"[\W\d_]+", "", normalize_text(name))
+
+
+class JoinVerdict:
+    """ What the analyzer made of a join. """
+
+    def __init__(self, reasons: List[str], joins: int, suspicious_joins: int, cluster: Optional[str], burst: bool):
+        # Why the join is suspicious, empty if it isn't.
+        self.reasons = reasons
+        # How many joins and suspicious joins the guild had within the burst window, this one included.
+        self.joins = joins
+        self.suspicious_joins = suspicious_joins
+        # The name cluster the member fell into, if it is large enough to be suspicious.
+        self.cluster = cluster
+        # True if this join tripped a burst alert.
+        self.burst = burst
+
+    @property
+    def suspicious(self) -> bool:
+        return bool(self.reasons)
+
+
+class _GuildJoins:
+    def __init__(self):
+        self.joins = SlidingWindowCounter(BURST_WINDOW)
+        self.suspicious_joins = SlidingWindowCounter(BURST_WINDOW)
+        # Name skeleton to (size, last seen) of the recent name clusters, least recently joined first.
+        self.clusters: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self.last_burst = float("-inf")
+
+
+class JoinAnalyzer:
+    """ Watches the stream of joins of each guild for raids.
+
+    Every join is scored with cheap heuristics: account age, a default avatar, and whether the username is close to
+    other recent joins (names are folded to a skeleton, then compared to the recent clusters with difflib). Joins and
+    suspicious joins are counted over a sliding window, and a join that pushes either count over its threshold is
+    reported as a burst, at most once per ALERT_COOLDOWN of calm. Everything is kept in memory and in O(1) per join
+    apart from the bounded name comparison, so it keeps up with thousands of joins a minute.
+    """
+
+    def __init__(self):
+        self._guilds: Dict[int, _GuildJoins] = {}
+
+    def _cluster(self, state: _GuildJoins, name: str, now: float) -> Tuple[str, int]:
+        # Forget the clusters nobody joined in for a while, they are all at the front.
+        while state.clusters and next(iter(state.clusters.values()))[1] <= now - NAME_CLUSTER_TTL:
+            state.clusters.popitem(last=False)
+
+        skeleton = name_skeleton(name)
+        key = skeleton
+        if skeleton and skeleton not in state.clusters:
+            matcher = difflib.SequenceMatcher(b=skeleton)
+            for candidate in islice(reversed(state.clusters), NAME_CLUSTERS):
+                matcher.set_seq1(candidate)
+                if matcher.real_quick_ratio() >= NAME_SIMILARITY and matcher.ratio() >= NAME_SIMILARITY:
+                    key = candidate
+                    break
+
+        size = state.clusters.get(key, (0, now))[0] + 1
+        state.clusters[key] = (size, now)
+        # Keeps the most recently joined clusters at the end.
+        state.clusters.move_to_end(key)
+        return key, size
+
+    def analyze(self, member: discord.Member, now: float = None) -> JoinVerdict:
+        """ Scores a join and updates the counters of its guild. """
+        now = now or time.monotonic()
+        state = self._guilds.setdefault(member.guild.id, _GuildJoins())
+
+        reasons = []
+        account_age = datetime.datetime.utcnow() - member.created_at
+        if account_age < NEW_ACCOUNT_AGE:
+            reasons.append(f"account created {account_age.days}d {account_age.seconds // 3600}h ago")
+        if member.avatar is None:
+            reasons.append("default avatar")
+
+        cluster, size = self._cluster(state, member.name, now)
+        if cluster and size >= NAME_CLUSTER_SIZE:
+            reasons.append(f"name similar to {size - 1} recent joins")
+        else:
+            cluster = None
+
+        joins = state.joins.add(now)
+        suspicious_joins = state.suspicious_joins.add(now) if reasons else state.suspicious_joins.count(now)
+
+        burst = False
+        if joins >= BURST_JOINS or suspicious_joins >= BURST_SUSPICIOUS_JOINS:
+            # Only alert on the join that starts a burst, not on every join that follows.
+            burst = now - state.last_burst >= ALERT_COOLDOWN
+            state.last_burst = now
+
+        return JoinVerdict(reasons, joins, suspicious_joins, cluster, burst)
+
+
+analyzer = JoinAnalyzer()
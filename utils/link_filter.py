@@ -0,0 +1,165 @@
+import logging
+import re
+import unicodedata
+from typing import Iterable, Iterator, List, Optional, Set
+
+from utils.config import store as config_store
+
+log = logging.getLogger(__name__)
+
+# Used until a "scam_links" setting (domains separated by commas or whitespace) is added to the database.
+DEFAULT_SCAM_LINKS = ["stearncommunytiy.ru", "stearncormuntity.ru", "discord-drop.info"]
+
+# Lookalike characters scam links use to dodge filters, mapped to the ASCII character they imitate.
+CONFUSABLES = str.maketrans({
+    # Cyrillic.
+    "а": "a", "в": "b", "е": "e", "ё": "e", "һ": "h", "і": "i", "ї": "i", "ј": "j", "к": "k", "м": "m", "н": "h",
+    "о": "o", "р": "p", "с": "c", "ѕ": "s", "т": "t", "у": "y", "х": "x", "ԁ": "d", "ԛ": "q", "ԝ": "w", "ӏ": "l",
+    # Greek.
+    "α": "a", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x",
+    # Latin lookalikes outside of ASCII.
+    "ı": "i", "ɡ": "g", "ɩ": "i", "ʟ": "l",
+    # Dots that browsers treat as a label separator.
+    "\u3002": ".", "\uff61": ".", "\ufe12": ".",
+    # Invisible characters that split a domain without changing how it looks.
+    "\u00ad": None, "\u200b": None, "\u200c": None, "\u200d": None, "\u2060": None, "\ufeff": None,
+})
+
+# Anything that looks like a hostname: dot separated labels ending in an alphabetic or punycode TLD. Hostnames are
+# found in two steps that are each linear, a single pattern nesting the label repeat backtracks quadratically.
+# First the runs of characters a hostname can be made of,
+TOKEN_PATTERN = re.compile(r"[\w.-]+")
+# then the labels of each run, checked one at a time. Both patterns only ever run on a single label of <= 63 chars.
+LABEL_PATTERN = re.compile(r"[^\W_](?:[\w-]{0,61}[^\W_])?")
+TLD_PATTERN = re.compile(r"[^\W\d_]{2,63}|xn--[a-z0-9-]{1,59}")
+# Messages are at most 4000 characters, anything past that isn't worth scanning.
+MAX_SCAN_LENGTH = 4000
+
+
+def _decode_label(label: str) -> str:
+    # Punycode labels are decoded so their lookalike characters can be folded like any other.
+    if label.startswith("xn--"):
+        try:
+            return label.encode("ascii").decode("idna")
+        except UnicodeError:
+            return label
+    return label
+
+
+def normalize_text(text: str) -> str:
+    """ Folds compatibility forms, case and lookalike characters so a disguised link reads like the real one. """
+    return unicodedata.normalize("NFKC", text).casefold().translate(CONFUSABLES)
+
+
+def normalize_host(host: str) -> str:
+    """ Returns the comparable form of a hostname, decoding punycode and folding lookalike characters. """
+    host = normalize_text(host).strip(".")
+    return ".".join(normalize_text(_decode_label(label)) for label in host.split("."))
+
+
+def _is_label(label: str) -> bool:
+    return 0 < len(label) <= 63 and LABEL_PATTERN.fullmatch(label) is not None
+
+
+def _host(labels: List[str], tail: Optional[str]) -> Optional[str]:
+    """ Returns the longest hostname made of the leading labels and a TLD, the TLD being the start of `tail` or of one of the labels. """
+    candidates = [(len(labels), tail)] if tail else []
+    candidates += [(end, labels[end]) for end in range(len(labels) - 1, 0, -1)]
+    for end, label in candidates:
+        tld = TLD_PATTERN.match(label[:63])
+        if tld and end:
+            return ".".join(labels[:end] + [tld.group()])
+    return None
+
+
+def _hosts_in_token(token: str) -> Iterator[str]:
+    # Split the token into runs of valid labels, an invalid label ends a run but may still start with its TLD.
+    run = []
+    for label in token.split("."):
+        if _is_label(label):
+            run.append(label)
+            continue
+        host = _host(run, label)
+        if host:
+            yield host
+        # A hostname can still start inside the label, e.g. in "-evil.com" or a label longer than 63 characters.
+        suffix = label[-63:].lstrip("-_")
+        run = [suffix] if _is_label(suffix) else []
+    host = _host(run, None)
+    if host:
+        yield host
+
+
+def find_hosts(text: str) -> Iterator[str]:
+    """ Yields what looks like a hostname in a normalized text, in time linear to the length of the text. """
+    for token in TOKEN_PATTERN.finditer(text[:MAX_SCAN_LENGTH]):
+        yield from _hosts_in_token(token.group())
+
+
+def has_host(text: str) -> bool:
+    """ Returns True if the text contains anything that looks like a link. """
+    return next(find_hosts(normalize_text(text[:MAX_SCAN_LENGTH])), None) is not None
+
+
+def extract_hosts(text: str) -> Set[str]:
+    """ Returns the normalized hostnames found in a message, with or without a scheme in front of them. """
+    return {normalize_host(host) for host in find_hosts(normalize_text(text[:MAX_SCAN_LENGTH]))}
+
+
+class LinkFilter:
+    """ Matches the links in a message against a blocklist of domains.
+
+    The blocklist is held as a set of normalized domains. Every hostname in a message is extracted once and each of
+    its parent domains is looked up in the set, so a check costs O(message length) however many domains are listed,
+    and a blocked domain also catches its subdomains. The set is rebuilt whenever the settings store changes.
+    """
+
+    def __init__(self, setting: str = "scam_links", defaults: Iterable[str] = ()):
+        self.setting = setting
+        self.defaults = list(defaults)
+        self._domains = frozenset()
+        self._version = None
+
+    def _load(self) -> None:
+        try:
+            value = config_store.get(self.setting)
+        except KeyError:
+            value = None
+
+        # Only rebuild the set if the settings changed since it was built.
+        if self._version == config_store.version:
+            return
+
+        entries = re.split(r"[\s,]+", str(value)) if value else self.defaults
+        domains = set()
+        for entry in entries:
+            # Keep only the hostname of entries that were pasted as a full URL.
+            entry = re.sub(r"^[a-z][a-z0-9+.-]*://", "", entry.strip().lower()).split("/")[0]
+            if entry:
+                domains.add(normalize_host(entry))
+
+        self._domains = frozenset(domains)
+        self._version = config_store.version
+        log.info(f"Loaded {len(self._domains)} domains into the {self.setting} filter.")
+
+    def match(self, text: str) -> Optional[str]:
+        """ Returns the blocked domain the text links to, or None if it is clean. """
+        return self.match_hosts(extract_hosts(text))
+
+    def match_hosts(self, hosts: Iterable[str]) -> Optional[str]:
+        """ Returns the blocked domain out of hostnames that were already extracted with extract_hosts(). """
+        self._load()
+        if not self._domains:
+            return None
+
+        for host in hosts:
+            labels = host.split(".")
+            # Check the host itself and every parent domain down to (but excluding) the TLD.
+            for i in range(len(labels) - 1):
+                domain = ".".join(labels[i:])
+                if domain in self._domains:
+                    return domain
+        return None
+
+
+scam_links = LinkFilter(setting="scam_links", defaults=DEFAULT_SCAM_LINKS)
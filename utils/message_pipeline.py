@@ -0,0 +1,122 @@
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import discord
+
+from utils import link_filter, resources
+from utils.config import store as config_store
+
+log = logging.getLogger(__name__)
+
+
+class MessageContext:
+    """ Everything the filter stages need to know about a message, computed at most once per message. """
+
+    def __init__(self, message: discord.Message):
+        self.message = message
+        self.author = message.author
+        self.guild = message.guild
+        # Name of the stage that stopped the pipeline, if any.
+        self.handled_by = None
+        self._role_ids = None
+        self._hosts = None
+
+    @property
+    def role_ids(self) -> Set[int]:
+        """ IDs of the author's roles, empty for messages outside of a guild. """
+        if self._role_ids is None:
+            self._role_ids = {role.id for role in getattr(self.author, "roles", ())}
+        return self._role_ids
+
+    @property
+    def hosts(self) -> Set[str]:
+        """ Normalized hostnames of every link in the message. """
+        if self._hosts is None:
+            self._hosts = link_filter.extract_hosts(self.message.clean_content)
+        return self._hosts
+
+    def has_role(self, setting: str) -> bool:
+        """ Returns True if the author has the role whose ID is stored in a setting. """
+        try:
+            return config_store.get(setting) in self.role_ids
+        except KeyError:
+            return False
+
+    def role(self, setting: str) -> Optional[discord.Role]:
+        """ Returns the role whose ID is stored in a setting. """
+        return resources.role(self.guild, setting) if self.guild else None
+
+
+class Stage:
+    def __init__(self, name: str, callback: Callable[[MessageContext], Awaitable[bool]], priority: int):
+        self.name = name
+        self.callback = callback
+        self.priority = priority
+        self.calls = 0
+        self.hits = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class MessagePipeline:
+    """ Runs every message through the registered filter stages in a single pass.
+
+    Stages are coroutines taking a MessageContext and returning True once they have dealt with the message (deleted
+    it, banned the author, ...), which stops the remaining stages from running. They run in ascending priority, so
+    cheap or decisive filters should get a low number. The time spent in each stage is recorded for stats().
+    """
+
+    def __init__(self):
+        self._stages: List[Stage] = []
+
+    def register(self, name: str, callback: Callable[[MessageContext], Awaitable[bool]], priority: int = 100) -> None:
+        """ Adds a stage, replacing any stage with the same name (e.g. after a cog reload). """
+        self.unregister(name)
+        self._stages.append(Stage(name, callback, priority))
+        self._stages.sort(key=lambda stage: stage.priority)
+
+    def unregister(self, name: str) -> None:
+        self._stages = [stage for stage in self._stages if stage.name != name]
+
+    async def process(self, message: discord.Message) -> MessageContext:
+        """ Runs a message through the stages until one of them handles it, returning the message context. """
+        ctx = MessageContext(message)
+
+        for stage in self._stages:
+            started = time.perf_counter()
+            try:
+                handled = await stage.callback(ctx)
+            except Exception:
+                # A broken stage is logged and skipped so the remaining stages still get to check the message.
+                log.exception(f"Message pipeline stage {stage.name} failed on message {message.id}.")
+                handled = False
+            elapsed = time.perf_counter() - started
+
+            stage.calls += 1
+            stage.total_time += elapsed
+            stage.max_time = max(stage.max_time, elapsed)
+
+            if handled:
+                stage.hits += 1
+                ctx.handled_by = stage.name
+                break
+
+        return ctx
+
+    def stats(self) -> List[Dict]:
+        """ Returns the call counts and timings of every stage, in the order they run. """
+        return [
+            dict(
+                name=stage.name,
+                priority=stage.priority,
+                calls=stage.calls,
+                hits=stage.hits,
+                avg=stage.total_time / stage.calls if stage.calls else 0.0,
+                max=stage.max_time
+            )
+            for stage in self._stages
+        ]
+
+
+pipeline = MessagePipeline()
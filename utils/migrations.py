@@ -0,0 +1,214 @@
+import collections
+import logging
+import time
+
+import dataset
+from sqlalchemy import Index
+
+from utils import database, repositories
+
+log = logging.getLogger(__name__)
+
+# Every migration in the order it has to be applied, as (version, description, function) tuples.
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    """ Registers the decorated function as the schema migration for a version.
+
+    Versions are applied in ascending order, each in its own transaction, and recorded in the schema_migrations table
+    so they are only ever applied once. Never edit a migration that has shipped, add a new version instead.
+    """
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return func
+    return decorator
+
+
+def _to_varchar(db: dataset.Database, table: str, column: str, length: int) -> None:
+    """ Turns a TEXT column into a VARCHAR so it can be indexed as a whole. """
+    # MySQL and MariaDB can only index a prefix of TEXT columns, other databases index them as is.
+    if db.engine.dialect.name == "mysql":
+        db.query(f"ALTER TABLE `{table}` MODIFY `{column}` VARCHAR({length})")
+
+
+def _create_index(db: dataset.Database, table: str, name: str, columns: list, unique: bool = False) -> None:
+    """ Creates an index over the columns of a table, unless one with that name already exists. """
+    if name in {index["name"] for index in db.inspect.get_indexes(table)}:
+        return
+
+    sa_table = db[table].table
+    Index(name, *(sa_table.c[column] for column in columns), unique=unique).create(db.executable)
+    log.info(f"Created index {name} on {table}({', '.join(columns)}).")
+
+
+@migration(1, "Create the base tables")
+def create_tables(db: dataset.Database) -> None:
+    # Creating a table or a column that already exists is a no-op, so this is safe to run on existing databases.
+    # Create mod_logs table and columns to store moderator actions.
+    mod_logs = db.create_table("mod_logs")
+    mod_logs.create_column("user_id", db.types.bigint)
+    mod_logs.create_column("mod_id", db.types.bigint)
+    mod_logs.create_column("timestamp", db.types.bigint)
+    mod_logs.create_column("reason", db.types.text)
+    mod_logs.create_column("type", db.types.text)
+
+    # Create remind_me table and columns to store remind_me messages.
+    remind_me = db.create_table("remind_me")
+    remind_me.create_column("reminder_location", db.types.bigint)
+    remind_me.create_column("author_id", db.types.bigint)
+    remind_me.create_column("date_to_remind", db.types.bigint)
+    remind_me.create_column("message", db.types.text)
+    remind_me.create_column("sent", db.types.boolean, default=False)
+
+    # Create timed_mod_actions table and columns to store timed moderator actions.
+    timed_mod_actions = db.create_table("timed_mod_actions")
+    timed_mod_actions.create_column("user_id", db.types.bigint)
+    timed_mod_actions.create_column("mod_id", db.types.bigint)
+    timed_mod_actions.create_column("action_type", db.types.text)
+    timed_mod_actions.create_column("start_time", db.types.bigint)
+    timed_mod_actions.create_column("end_time", db.types.bigint)
+    timed_mod_actions.create_column("is_done", db.types.boolean, default=False)
+    timed_mod_actions.create_column("reason", db.types.text)
+
+    # Create ticket table and columns to store the ticket status information
+    tickets = db.create_table("tickets")
+    tickets.create_column("user_id", db.types.bigint)
+    tickets.create_column("status", db.types.text)
+    tickets.create_column("guild", db.types.bigint)
+    tickets.create_column("timestamp", db.types.bigint)
+    tickets.create_column("ticket_topic", db.types.text)
+    tickets.create_column("log_url", db.types.text)
+
+    # Create settings table and columns to store key:value pairs.
+    settings = db.create_table("settings")
+    settings.create_column("name", db.types.text)
+    settings.create_column("value", db.types.text)
+    settings.create_column("censored", db.types.boolean)
+
+
+@migration(2, "Index the hot lookups and make setting names unique")
+def create_indexes(db: dataset.Database) -> None:
+    # The short, enum-like columns that take part in an index were created as TEXT.
+    _to_varchar(db, "mod_logs", "type", 32)
+    _to_varchar(db, "tickets", "status", 32)
+    # 191 characters is the longest key that fits in an index under utf8mb4.
+    _to_varchar(db, "settings", "name", 191)
+
+    _create_index(db, "mod_logs", "ix_mod_logs_user_id_type_id", ["user_id", "type", "id"])
+    _create_index(db, "timed_mod_actions", "ix_timed_mod_actions_is_done_end_time", ["is_done", "end_time"])
+    _create_index(db, "timed_mod_actions", "ix_timed_mod_actions_user_id_is_done", ["user_id", "is_done"])
+    _create_index(db, "remind_me", "ix_remind_me_sent_date_to_remind", ["sent", "date_to_remind"])
+    _create_index(db, "remind_me", "ix_remind_me_author_id_sent", ["author_id", "sent"])
+    _create_index(db, "tickets", "ix_tickets_user_id_status", ["user_id", "status"])
+
+    # Drop duplicate settings before enforcing uniqueness, keeping the oldest row of each name.
+    duplicates = list(db.query("SELECT name, MIN(id) AS keep FROM settings GROUP BY name HAVING COUNT(*) > 1"))
+    for duplicate in duplicates:
+        log.warning(f"Removing duplicate entries of setting '{duplicate['name']}', keeping ID {duplicate['keep']}.")
+        db["settings"].delete(name=duplicate["name"], id={"!=": duplicate["keep"]})
+    _create_index(db, "settings", "ux_settings_name", ["name"], unique=True)
+
+
+@migration(3, "Queue transcripts that failed to upload")
+def create_transcript_uploads(db: dataset.Database) -> None:
+    transcript_uploads = db.create_table("transcript_uploads")
+    transcript_uploads.create_column("name", db.types.string(100))
+    transcript_uploads.create_column("path", db.types.text)
+    transcript_uploads.create_column("attempts", db.types.integer, default=0)
+    transcript_uploads.create_column("next_attempt", db.types.bigint)
+    transcript_uploads.create_column("created_at", db.types.bigint)
+    transcript_uploads.create_column("uploaded", db.types.boolean, default=False)
+    transcript_uploads.create_column("url", db.types.text)
+    transcript_uploads.create_column("channel_id", db.types.bigint)
+    transcript_uploads.create_column("message_id", db.types.bigint)
+    transcript_uploads.create_column("ticket_id", db.types.bigint)
+
+    _create_index(db, "transcript_uploads", "ix_transcript_uploads_uploaded_next_attempt", ["uploaded", "next_attempt"])
+
+
+@migration(4, "Full-text index the mod log reasons")
+def create_reason_fulltext_index(db: dataset.Database) -> None:
+    # Only MySQL and MariaDB have FULLTEXT indexes, mod_logs.search_reasons() falls back to LIKE elsewhere.
+    if db.engine.dialect.name != "mysql":
+        return
+    if "ft_mod_logs_reason" in {index["name"] for index in db.inspect.get_indexes("mod_logs")}:
+        return
+    db.query("ALTER TABLE `mod_logs` ADD FULLTEXT INDEX `ft_mod_logs_reason` (`reason`)")
+    log.info("Created full-text index ft_mod_logs_reason on mod_logs(reason).")
+
+
+@migration(5, "Roll up moderation statistics")
+def create_mod_stats(db: dataset.Database) -> None:
+    mod_stats = db.create_table("mod_stats")
+    mod_stats.create_column("day", db.types.string(10))
+    mod_stats.create_column("mod_id", db.types.bigint)
+    mod_stats.create_column("type", db.types.string(32))
+    mod_stats.create_column("actions", db.types.integer, default=0)
+    mod_stats.create_column("timed", db.types.integer, default=0)
+    mod_stats.create_column("duration", db.types.bigint, default=0)
+    # The upserts in repositories.bump_mod_stats() rely on this key.
+    _create_index(db, "mod_stats", "ux_mod_stats_day_mod_id_type", ["day", "mod_id", "type"], unique=True)
+
+    # Backfill the rollups from the existing history, aggregating in memory so each rollup row is written once.
+    counters = collections.defaultdict(lambda: [0, 0, 0])
+    for row in db.query("SELECT timestamp, mod_id, type FROM mod_logs WHERE timestamp IS NOT NULL"):
+        counters[(repositories.stats_day(row["timestamp"]), row["mod_id"], row["type"])][0] += 1
+    for row in db.query(
+        "SELECT start_time, end_time, mod_id, action_type FROM timed_mod_actions "
+        "WHERE start_time IS NOT NULL AND end_time IS NOT NULL"
+    ):
+        counter = counters[(repositories.stats_day(row["start_time"]), row["mod_id"], row["action_type"])]
+        counter[1] += 1
+        counter[2] += row["end_time"] - row["start_time"]
+
+    for (day, mod_id, type), (actions, timed, duration) in counters.items():
+        repositories.bump_mod_stats(db, day, mod_id, type, actions=actions, timed=timed, duration=duration)
+    log.info(f"Backfilled {len(counters)} mod_stats rollups from the moderation history.")
+
+
+@migration(6, "Remember the last slash command sync")
+def create_slash_commands(db: dataset.Database) -> None:
+    slash_commands = db.create_table("slash_commands")
+    # The guild the command is registered in, 0 for global commands.
+    slash_commands.create_column("scope", db.types.bigint)
+    slash_commands.create_column("name", db.types.string(32))
+    slash_commands.create_column("command_id", db.types.bigint)
+    slash_commands.create_column("hash", db.types.string(64))
+    slash_commands.create_column("permissions_hash", db.types.string(64))
+
+    _create_index(db, "slash_commands", "ux_slash_commands_scope_name", ["scope", "name"], unique=True)
+
+
+@migration(7, "Remember the last Reddit post relayed")
+def create_reddit_marks(db: dataset.Database) -> None:
+    reddit_marks = db.create_table("reddit_marks")
+    reddit_marks.create_column("subreddit", db.types.string(255))
+    reddit_marks.create_column("created_utc", db.types.float)
+    reddit_marks.create_column("submission_id", db.types.string(16))
+
+    _create_index(db, "reddit_marks", "ux_reddit_marks_subreddit", ["subreddit"], unique=True)
+
+
+def migrate() -> None:
+    """ Applies every schema migration that hasn't been applied to the database yet. """
+    with database.session() as db:
+        schema_migrations = db.create_table(
+            "schema_migrations", primary_id="version", primary_type=db.types.integer, primary_increment=False
+        )
+        schema_migrations.create_column("description", db.types.text)
+        schema_migrations.create_column("applied_at", db.types.bigint)
+        applied = {row["version"] for row in schema_migrations.all()}
+
+    pending = [entry for entry in MIGRATIONS if entry[0] not in applied]
+    if not pending:
+        log.info(f"Database schema is up to date (version {max(applied, default=0)}).")
+        return
+
+    for version, description, func in pending:
+        started = time.perf_counter()
+        with database.session() as db:
+            func(db)
+            db["schema_migrations"].insert(dict(version=version, description=description, applied_at=int(time.time())))
+        log.info(f"Applied schema migration {version}: {description} ({time.perf_counter() - started:.2f}s).")
@@ -1,7 +1,7 @@
 import discord
 from discord_slash import SlashContext
 
-from cogs.commands import settings
+from utils import resources
 
 
 async def can_action_member(bot, ctx: SlashContext, member: discord.Member) -> bool:
@@ -12,8 +12,8 @@ async def can_action_member(bot, ctx: SlashContext, member: discord.Member) -> b
 
     # Stop mods from actioning one another, people higher ranked than them or themselves.
     if member.top_role >= ctx.author.top_role:
-        role_muted = discord.utils.get(member.guild.roles, id=settings.get_value("role_muted"))
-        role_restricted = discord.utils.get(member.guild.roles, id=settings.get_value("role_restricted"))
+        role_muted = resources.role(member.guild, "role_muted")
+        role_restricted = resources.role(member.guild, "role_restricted")
         # Enable mods to use /unmute and /unrestrict on others since the role "Muted" and "Restricted" is placed higher than "Staff".
         if role_muted in member.roles or role_restricted in member.roles:
             return True
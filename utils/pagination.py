@@ -1,6 +1,8 @@
 import asyncio
 import logging
+import math
 import typing
+from collections import OrderedDict
 
 import discord
 from discord.abc import User
@@ -16,6 +18,93 @@ PAGINATION_EMOJI = (FIRST_EMOJI, LEFT_EMOJI, RIGHT_EMOJI, LAST_EMOJI, DELETE_EMO
 
 log = logging.getLogger(__name__)
 
+# Fetches a page of rows sorted by descending ID, either below before_id or above after_id (see KeysetPageSource).
+PageFetcher = typing.Callable[..., typing.Awaitable[typing.List[dict]]]
+
+
+class KeysetPageSource:
+    """ Lazily fetches and renders the pages of rows sorted by descending ID.
+
+    Instead of loading every row up front, a page is fetched only when it is shown, with a keyset query relative to
+    the ID of the page next to it (`before_id` for the page after, `after_id` for the page before), and the next page
+    is prefetched in the background while the current one is displayed. The first and last page are fetched without
+    a key, so time to the first page doesn't depend on how many rows there are. The most recently shown pages are
+    kept rendered in a small LRU.
+
+    Available attributes include:
+        fetch (PageFetcher): Coroutine taking before_id, after_id and limit keyword arguments.
+        render (callable): Turns the rows of a page and the page number into the object to display, e.g. an embed.
+        total (int): The amount of rows, used to number the pages.
+        per_page (int): The maximum amount of rows on a page.
+        cache_size (int): How many rendered pages are kept.
+    """
+
+    def __init__(
+        self,
+        fetch: PageFetcher,
+        render: typing.Callable[[typing.List[dict], int], typing.Any],
+        total: int,
+        per_page: int = 4,
+        cache_size: int = 5
+    ) -> None:
+        self.fetch = fetch
+        self.render = render
+        self.total = total
+        self.per_page = per_page
+        self.cache_size = cache_size
+        # Highest and lowest ID of every page fetched so far, the keys to reach the pages next to them.
+        self._bounds: typing.Dict[int, typing.Tuple[int, int]] = {}
+        self._cache: typing.OrderedDict[int, typing.Any] = OrderedDict()
+        self._pending: typing.Dict[int, asyncio.Task] = {}
+
+    @property
+    def page_count(self) -> int:
+        return math.ceil(self.total / self.per_page)
+
+    async def _load(self, page_no: int) -> typing.Any:
+        last = self.page_count - 1
+        if page_no == 0:
+            rows = await self.fetch(limit=self.per_page)
+        elif page_no - 1 in self._bounds:
+            rows = await self.fetch(before_id=self._bounds[page_no - 1][1], limit=self.per_page)
+        elif page_no + 1 in self._bounds:
+            rows = await self.fetch(after_id=self._bounds[page_no + 1][0], limit=self.per_page)
+        elif page_no == last:
+            # The last page holds whatever is left over, read upwards from the lowest ID.
+            rows = await self.fetch(after_id=0, limit=self.total - last * self.per_page)
+        else:
+            raise IndexError(f"Page {page_no} can only be reached from the page before or after it.")
+
+        if rows:
+            self._bounds[page_no] = (rows[0]["id"], rows[-1]["id"])
+        return self.render(rows, page_no)
+
+    async def get_page(self, page_no: int) -> typing.Any:
+        """ Returns the rendered page, fetching it unless it is cached or already being prefetched. """
+        if page_no in self._cache:
+            self._cache.move_to_end(page_no)
+            return self._cache[page_no]
+
+        if page_no not in self._pending:
+            self._pending[page_no] = asyncio.ensure_future(self._load(page_no))
+        try:
+            page = await self._pending[page_no]
+        finally:
+            self._pending.pop(page_no, None)
+
+        self._cache[page_no] = page
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return page
+
+    def prefetch(self, page_no: int) -> None:
+        """ Starts fetching a page in the background, so it is ready by the time it is asked for. """
+        if 0 <= page_no < self.page_count and page_no not in self._cache and page_no not in self._pending:
+            task = asyncio.ensure_future(self.get_page(page_no))
+            # A failed prefetch is retried when the page is actually shown.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
 class EmptyPaginatorEmbed(Exception):
     """Raised when attempting to paginate with empty contents."""
     pass
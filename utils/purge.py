@@ -0,0 +1,332 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import re
+import sys
+from typing import List, Optional
+
+import discord
+
+from utils.link_filter import has_host
+
+try:
+    from re import _parser as sre_parse
+    from re._constants import BRANCH, LITERAL, MAX_REPEAT, MIN_REPEAT, SUBPATTERN
+except ImportError:
+    # Before Python 3.11.
+    import sre_parse
+    from sre_constants import BRANCH, LITERAL, MAX_REPEAT, MIN_REPEAT, SUBPATTERN
+
+log = logging.getLogger(__name__)
+
+# Discord refuses to bulk delete messages older than 14 days, keep a margin for the time a purge takes.
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(minutes=30)
+BULK_DELETE_SIZE = 100
+# Old messages are deleted one request at a time, spaced out to stay clear of the rate limit.
+SINGLE_DELETE_DELAY = 1.2
+# The queue of old messages is bounded so a purge going far back doesn't hold the whole channel in memory.
+SINGLE_DELETE_QUEUE_SIZE = 500
+# History is read, and filtered, in pages of this many messages.
+HISTORY_PAGE_SIZE = 100
+# The folder utils.pattern_worker is run from.
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# How long a purge pattern may take on a single message before the message is skipped, in seconds.
+PATTERN_TIMEOUT = 0.5
+
+
+def _subpatterns(value):
+    """ Yields the parsed subpatterns found in the argument of a parsed regular expression node. """
+    if isinstance(value, sre_parse.SubPattern):
+        yield value
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _subpatterns(item)
+
+
+def _ungrouped(pattern: sre_parse.SubPattern) -> sre_parse.SubPattern:
+    """ Strips the groups wrapped around a parsed pattern that is a single group. """
+    while len(pattern) == 1 and pattern[0][0] is SUBPATTERN:
+        pattern = pattern[0][1][-1]
+    return pattern
+
+
+def _first_literal(pattern: sre_parse.SubPattern) -> Optional[int]:
+    """ Returns the character a parsed pattern always starts with, or None if it can start with several or none. """
+    pattern = _ungrouped(pattern)
+    if not len(pattern):
+        return None
+    op, value = pattern[0]
+    if op is LITERAL:
+        return value
+    if op is SUBPATTERN:
+        return _first_literal(value[-1])
+    return None
+
+
+def _is_repeat(op, value) -> bool:
+    return op in (MAX_REPEAT, MIN_REPEAT) and value[1] > 1
+
+
+def _backtracks(pattern: sre_parse.SubPattern, repeated: bool = False) -> bool:
+    """ Returns True if a pattern repeats a repeat, e.g. (a+)+, or repeats alternatives that start alike, e.g. (a|ab)*. """
+    for op, value in pattern:
+        if _is_repeat(op, value):
+            body = _ungrouped(value[2])
+            if len(body) == 1 and _is_repeat(*body[0]):
+                return True
+            if _backtracks(value[2], True):
+                return True
+            continue
+        if op is BRANCH and repeated:
+            # Alternatives starting with distinct characters can only match a given text one way.
+            firsts = [_first_literal(branch) for branch in value[1]]
+            if None in firsts or len(set(firsts)) < len(firsts):
+                return True
+        if any(_backtracks(subpattern, repeated) for subpattern in _subpatterns(value)):
+            return True
+    return False
+
+
+def compile_pattern(pattern: str) -> re.Pattern:
+    """ Compiles a purge pattern, raising ValueError if it is invalid or could backtrack exponentially.
+
+    The classic exponential shapes, a repeated repeat like (a+)+$ or repeated alternatives that start alike like
+    (a|ab)*$, are refused up front. Any other slow pattern (e.g. a*a*a*b) is stopped by PatternMatcher.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+        regex = re.compile(pattern)
+    except re.error as error:
+        raise ValueError(f"Invalid pattern: {error}")
+    if _backtracks(parsed):
+        raise ValueError(
+            "Patterns cannot repeat a repeat or alternatives that start alike, e.g. (a+)+ or (a|ab)*."
+        )
+    return regex
+
+
+class PatternMatcher:
+    """ Searches messages for a pattern in a worker process, giving up after PATTERN_TIMEOUT seconds per message.
+
+    re holds the GIL for the whole search, so a slow pattern would block the event loop (gateway heartbeat included)
+    even from a thread. A process can be stopped instead. The worker (utils/pattern_worker.py) is a fresh interpreter
+    rather than a fork, so it doesn't inherit the bot's threads, database pool or event loop, nor re-runs chiya.py like
+    a multiprocessing spawn would, and it is sent a whole page of messages at a time over its stdin. When a page takes
+    longer than a single message may, the worker is killed and the page is searched again one message at a time to
+    skip only the messages that are too slow; they count as not matching.
+    """
+
+    def __init__(self, pattern: re.Pattern):
+        self.pattern = pattern
+        self.timeouts = 0
+        self._process = None
+
+    async def _send(self, data, timeout: Optional[float]):
+        self._process.stdin.write(json.dumps(data).encode("utf-8") + b"\n")
+        await self._process.stdin.drain()
+        line = await asyncio.wait_for(self._process.stdout.readline(), timeout)
+        if not line:
+            raise RuntimeError(f"The purge pattern worker exited with code {await self._process.wait()}.")
+        return json.loads(line)
+
+    async def _start(self) -> None:
+        if self._process is None:
+            self._process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "utils.pattern_worker",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                cwd=PROJECT_DIR
+            )
+            # The worker answers once the pattern is compiled, its start isn't counted against the time budget.
+            await self._send(dict(pattern=self.pattern.pattern, flags=self.pattern.flags), None)
+
+    async def search_many(self, contents: List[str]) -> List[bool]:
+        """ Returns whether each of the contents matches the pattern. """
+        if not contents:
+            return []
+        await self._start()
+        try:
+            # Ordinary messages take microseconds each, a page going over the budget of one message has a slow one.
+            return await self._send(contents, PATTERN_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.close()
+        if len(contents) == 1:
+            log.warning(f"The purge pattern {self.pattern.pattern!r} took over {PATTERN_TIMEOUT}s on a message, skipping it.")
+            self.timeouts += 1
+            return [False]
+
+        # Find the slow messages.
+        results = []
+        for content in contents:
+            results += await self.search_many([content])
+        return results
+
+    def close(self) -> None:
+        if self._process is not None:
+            if self._process.returncode is None:
+                self._process.kill()
+            self._process = None
+
+
+class PurgeFilter:
+    """ Decides which messages of a channel a purge removes. Every given criterion has to match. """
+
+    def __init__(
+        self,
+        author: discord.abc.User = None,
+        pattern: re.Pattern = None,
+        links: bool = False,
+        attachments: bool = False,
+        bots: bool = False
+    ):
+        self.author = author
+        self.pattern = PatternMatcher(pattern) if pattern else None
+        self.links = links
+        self.attachments = attachments
+        self.bots = bots
+
+    def _matches(self, message: discord.Message) -> bool:
+        """ Checks every criterion but the pattern. """
+        if self.author and message.author.id != self.author.id:
+            return False
+        if self.bots and not message.author.bot:
+            return False
+        if self.attachments and not message.attachments:
+            return False
+        if self.links and not has_host(message.content):
+            return False
+        return True
+
+    async def matching(self, messages: List[discord.Message]) -> List[discord.Message]:
+        """ Returns the messages that match, in order. The pattern is searched for in all of them at once. """
+        messages = [message for message in messages if self._matches(message)]
+        if not self.pattern:
+            return messages
+        found = await self.pattern.search_many([message.content for message in messages])
+        return [message for message, match in zip(messages, found) if match]
+
+    def close(self) -> None:
+        """ Stops the worker process of the pattern, if any. """
+        if self.pattern:
+            self.pattern.close()
+
+
+class Purge:
+    """ Removes the messages of a channel that match a filter, streaming its history instead of loading it.
+
+    History is read newest first in pages of 100, each filtered as a whole. Matches younger than BULK_DELETE_MAX_AGE are collected into
+    batches of up to 100 removed with a single delete_messages request, older ones go to a bounded queue drained by a
+    worker that deletes them one by one, SINGLE_DELETE_DELAY apart. The counters can be read while the purge runs, and
+    cancel() stops it after the request in flight.
+    """
+
+    def __init__(
+        self,
+        channel: discord.TextChannel,
+        filter: PurgeFilter,
+        limit: int,
+        before: discord.abc.Snowflake = None,
+        after: datetime.datetime = None
+    ):
+        self.channel = channel
+        self.filter = filter
+        # How many messages are removed at most.
+        self.limit = limit
+        self.before = before
+        self.after = after
+        self.scanned = 0
+        self.matched = 0
+        self.bulk_deleted = 0
+        self.single_deleted = 0
+        self.failed = 0
+        self.cancelled = False
+        self.done = False
+
+    @property
+    def deleted(self) -> int:
+        return self.bulk_deleted + self.single_deleted
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    async def _bulk_delete(self, messages: List[discord.Message]) -> None:
+        try:
+            if len(messages) == 1:
+                await messages[0].delete()
+            else:
+                await self.channel.delete_messages(messages)
+            self.bulk_deleted += len(messages)
+        except discord.NotFound:
+            # Some of the batch was deleted by someone else meanwhile, Discord then removes the rest anyway.
+            self.bulk_deleted += len(messages)
+        except discord.HTTPException:
+            log.exception(f"Unable to bulk delete {len(messages)} messages in #{self.channel}.")
+            self.failed += len(messages)
+
+    async def _single_delete_worker(self, queue: "asyncio.Queue[Optional[discord.Message]]") -> None:
+        while True:
+            message = await queue.get()
+            if message is None or self.cancelled:
+                return
+            try:
+                await message.delete()
+                self.single_deleted += 1
+            except discord.NotFound:
+                pass
+            except discord.HTTPException:
+                log.exception(f"Unable to delete message {message.id} in #{self.channel}.")
+                self.failed += 1
+            await asyncio.sleep(SINGLE_DELETE_DELAY)
+
+    async def run(self) -> None:
+        """ Runs the purge to the end of the history, the limit, or a cancel(). """
+        bulk_cutoff = datetime.datetime.utcnow() - BULK_DELETE_MAX_AGE
+        batch = []
+        queue = asyncio.Queue(maxsize=SINGLE_DELETE_QUEUE_SIZE)
+        worker = asyncio.get_event_loop().create_task(self._single_delete_worker(queue))
+
+        def stopped() -> bool:
+            return self.cancelled or worker.done() or self.matched >= self.limit
+
+        try:
+            history = self.channel.history(limit=None, before=self.before, after=self.after, oldest_first=False)
+            async for page in history.chunk(HISTORY_PAGE_SIZE):
+                if stopped():
+                    break
+                self.scanned += len(page)
+
+                for message in await self.filter.matching([message for message in page if not message.pinned]):
+                    if stopped():
+                        break
+                    self.matched += 1
+
+                    if message.created_at > bulk_cutoff:
+                        batch.append(message)
+                        if len(batch) == BULK_DELETE_SIZE:
+                            await self._bulk_delete(batch)
+                            batch = []
+                    else:
+                        # History is newest first, so whatever follows is too old for a bulk delete as well.
+                        if batch:
+                            await self._bulk_delete(batch)
+                            batch = []
+                        await queue.put(message)
+
+            if batch and not self.cancelled:
+                await self._bulk_delete(batch)
+
+            # Let the worker drain the queue, it stops early on a cancel().
+            if not worker.done():
+                await queue.put(None)
+                await worker
+        finally:
+            worker.cancel()
+            self.filter.close()
+            self.done = True
+
+        log.info(
+            f"Purged {self.deleted} of {self.matched} matching messages ({self.scanned} scanned) in #{self.channel}"
+            f"{', cancelled' if self.cancelled else ''}."
+        )
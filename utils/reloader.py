@@ -0,0 +1,184 @@
+import ast
+import glob
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from discord.ext import commands
+
+from utils.config import store as config_store
+
+log = logging.getLogger(__name__)
+
+# Every file matching this is an extension, skipping the ones that start with '__'.
+EXTENSION_GLOB = "cogs/**/[!^_]*.py"
+
+
+def extension_name(path: str) -> str:
+    """ Turns the path of an extension into its module name, e.g. cogs/tasks/reddit.py into cogs.tasks.reddit. """
+    return os.path.splitext(os.path.normpath(path))[0].replace(os.sep, ".")
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def imported_modules(path: str) -> Set[str]:
+    """ Returns the names of the modules a file imports, including `from package import module` forms. """
+    with open(path, "rb") as file:
+        try:
+            tree = ast.parse(file.read(), filename=path)
+        except SyntaxError:
+            # Reloading it fails with a proper error, there is nothing to follow meanwhile.
+            return set()
+
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.add(node.module)
+            modules.update(f"{node.module}.{alias.name}" for alias in node.names)
+    return modules
+
+
+class ReloadResult:
+    """ The outcome of a reload: what was reloaded, loaded, unloaded or failed, with how long each took. """
+
+    def __init__(self):
+        # (extension, action, seconds) of every extension that was touched.
+        self.timings: List[Tuple[str, str, float]] = []
+        self.failed: Dict[str, Exception] = {}
+        # Helper modules that changed but aren't reloaded, see ExtensionReloader.
+        self.restart_needed: List[str] = []
+
+    @property
+    def touched(self) -> int:
+        return len(self.timings)
+
+    def report(self) -> str:
+        if not self.timings and not self.failed and not self.restart_needed:
+            return "No changes, nothing was reloaded."
+
+        lines = [f"`{extension}` {action} in {seconds:.3f}s" for extension, action, seconds in self.timings]
+        lines += [f"`{extension}` failed, kept the previous version: {error.__class__.__name__}: {error}" for extension, error in self.failed.items()]
+        if self.restart_needed:
+            lines.append(f"Changed but only picked up on restart: {', '.join(f'`{path}`' for path in self.restart_needed)}")
+        return "\n".join(lines)
+
+
+class ExtensionReloader:
+    """ Reloads only the extensions whose source changed since they were loaded, and the extensions importing them.
+
+    The hash of every extension file is recorded when it is loaded. A reload hashes the files again, unloads the
+    extensions whose file is gone, loads the new ones and reloads the changed ones along with every extension that
+    imports one of them (e.g. the cogs reading `settings.get_value` from cogs/commands/settings.py), found by parsing
+    their imports. discord.py puts the previous module back when an extension fails to reload, so a broken change
+    leaves the running version in place. Helper modules outside of the extensions (utils, handlers) hold process-wide
+    state such as the database pool and the settings store, they are only reported as changed, not reloaded.
+    """
+
+    def __init__(self):
+        # Extension name to the hash of its file when it was last (re)loaded.
+        self.hashes: Dict[str, str] = {}
+        # Path to the hash of the helper modules when the bot started.
+        self.helper_hashes: Dict[str, str] = {}
+
+    @staticmethod
+    def discover() -> Dict[str, str]:
+        """ Returns the extensions on disk as extension name to path. """
+        return {extension_name(path): path for path in glob.iglob(EXTENSION_GLOB, recursive=True)}
+
+    @staticmethod
+    def helpers() -> List[str]:
+        return [path for pattern in ("utils/*.py", "handlers/*.py") for path in glob.glob(pattern)]
+
+    def load(self, bot: commands.Bot, extension: str, path: str) -> None:
+        """ Loads an extension, recording the hash of its file. """
+        digest = file_hash(path)
+        bot.load_extension(extension)
+        self.hashes[extension] = digest
+        if not self.helper_hashes:
+            self.helper_hashes = {helper: file_hash(helper) for helper in self.helpers()}
+
+    @staticmethod
+    def cog_extension(bot: commands.Bot, name: str) -> Optional[str]:
+        """ Returns the extension a cog was loaded from, or the name itself if it is a loaded extension. """
+        cog = bot.get_cog(name)
+        if cog:
+            return type(cog).__module__
+        return name if name in bot.extensions else None
+
+    @staticmethod
+    def dependents(extensions: Dict[str, str], changed: Set[str]) -> List[str]:
+        """ Returns the extensions that import one of the changed ones, directly or through another extension.
+
+        They are ordered so an extension comes after the ones it was found through, and is reloaded after them.
+        """
+        imports = {extension: imported_modules(path) for extension, path in sorted(extensions.items())}
+        result = []
+        pending = sorted(changed)
+        while pending:
+            module = pending.pop(0)
+            for extension, modules in imports.items():
+                if module in modules and extension not in changed and extension not in result:
+                    result.append(extension)
+                    pending.append(extension)
+        return result
+
+    def _timed(self, result: ReloadResult, extension: str, action: str, func, *args) -> None:
+        started = time.perf_counter()
+        try:
+            func(*args)
+        except commands.ExtensionError as error:
+            log.exception(f"{extension} could not be {action}.")
+            result.failed[extension] = error
+            return
+        result.timings.append((extension, action, time.perf_counter() - started))
+
+    def reload(self, bot: commands.Bot, only: str = None) -> ReloadResult:
+        """ Reloads the changed extensions and their dependents, or `only` one extension and its dependents. """
+        result = ReloadResult()
+        extensions = self.discover()
+        hashes = {extension: file_hash(path) for extension, path in extensions.items()}
+
+        if only:
+            changed = {only}
+            added, removed = set(), set()
+        else:
+            changed = {extension for extension in extensions if extension in bot.extensions and hashes[extension] != self.hashes.get(extension)}
+            added = {extension for extension in extensions if extension not in bot.extensions}
+            removed = {extension for extension in self.hashes if extension not in extensions and extension in bot.extensions}
+            result.restart_needed = [
+                helper for helper in self.helpers() if self.helper_hashes.get(helper) != file_hash(helper)
+            ]
+
+        # Dependents are reloaded after what they depend on, so they import the new version.
+        to_reload = sorted(changed) + [
+            extension for extension in self.dependents(extensions, changed) if extension not in added | removed
+        ]
+
+        # Import-time settings lookups are served from memory, whatever the TTL of the store.
+        with config_store.pinned():
+            for extension in sorted(removed):
+                self._timed(result, extension, "unloaded", bot.unload_extension, extension)
+                self.hashes.pop(extension, None)
+
+            for extension in to_reload:
+                self._timed(result, extension, "reloaded", bot.reload_extension, extension)
+                if extension not in result.failed:
+                    self.hashes[extension] = hashes.get(extension)
+
+            for extension in sorted(added):
+                self._timed(result, extension, "loaded", bot.load_extension, extension)
+                if extension not in result.failed:
+                    self.hashes[extension] = hashes[extension]
+
+        log.info(f"Reload touched {result.touched} of {len(extensions)} extensions, {len(result.failed)} failed.")
+        return result
+
+
+reloader = ExtensionReloader()
@@ -0,0 +1,455 @@
+import collections
+import logging
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from utils import database
+
+log = logging.getLogger(__name__)
+
+
+class Repository:
+    """ Awaitable access to a single table.
+
+    Every query runs in its own session on the database thread pool, so awaiting a repository method never blocks
+    the event loop. Rows are returned as plain dicts (lists for multiple rows) so nothing lazy escapes the session.
+    """
+
+    table = None
+
+    async def _run(self, func, *args, **kwargs):
+        """ Runs func(table, *args, **kwargs) inside a session on the database thread pool. """
+        def transaction():
+            with database.session() as db:
+                return func(db[self.table], *args, **kwargs)
+        return await database.run(transaction)
+
+    async def get(self, id: int) -> Optional[dict]:
+        return await self._run(lambda table: table.find_one(id=id))
+
+    async def find_one(self, **filters) -> Optional[dict]:
+        return await self._run(lambda table: table.find_one(**filters))
+
+    async def find(self, **filters) -> List[dict]:
+        return await self._run(lambda table: list(table.find(**filters)))
+
+    async def insert(self, **row) -> int:
+        return await self._run(lambda table: table.insert(row))
+
+    async def update(self, row: dict, keys: List[str] = None) -> int:
+        return await self._run(lambda table: table.update(row, keys or ["id"]))
+
+
+def stats_day(timestamp: float) -> str:
+    """ Returns the UTC day a timestamp falls on, the granularity of the mod_stats rollups. """
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+# The mod_stats moderator of the actions logged without one, e.g. bans missing from the audit log.
+UNATTRIBUTED_MOD_ID = 0
+
+
+def bump_mod_stats(db, day: str, mod_id: int, type: str, actions: int = 0, timed: int = 0, duration: float = 0) -> None:
+    """ Adds to the rollup counters of a moderator's actions of a type on a day, creating the row if needed.
+
+    Runs as a single upsert on the (day, mod_id, type) unique key, so concurrent writers never lose an increment and
+    the caller can run it in the same transaction as the row being counted. Actions without a known moderator are
+    counted under UNATTRIBUTED_MOD_ID, as NULL would never match the unique key and add a row per call.
+    """
+    if mod_id is None:
+        mod_id = UNATTRIBUTED_MOD_ID
+    params = dict(day=day, mod_id=mod_id, type=type, actions=actions, timed=timed, duration=int(duration))
+    columns = "(day, mod_id, type, actions, timed, duration) VALUES (:day, :mod_id, :type, :actions, :timed, :duration)"
+    if db.engine.dialect.name == "mysql":
+        db.query(
+            f"INSERT INTO mod_stats {columns} ON DUPLICATE KEY UPDATE actions = actions + VALUES(actions), "
+            f"timed = timed + VALUES(timed), duration = duration + VALUES(duration)",
+            **params
+        )
+    else:
+        db.query(
+            f"INSERT INTO mod_stats {columns} ON CONFLICT (day, mod_id, type) DO UPDATE SET "
+            f"actions = actions + excluded.actions, timed = timed + excluded.timed, duration = duration + excluded.duration",
+            **params
+        )
+
+
+class ModLogRepository(Repository):
+    """ Moderator actions (bans, mutes, notes, ...) in the mod_logs table. """
+
+    table = "mod_logs"
+
+    async def add(self, user_id: int, mod_id: int, type: str, reason: str) -> int:
+        """ Logs a moderator action and returns its ID, counting it in the mod_stats rollups. """
+        def add(table):
+            timestamp = int(time.time())
+            id = table.insert(dict(user_id=user_id, mod_id=mod_id, timestamp=timestamp, reason=reason, type=type))
+            bump_mod_stats(table.db, stats_day(timestamp), mod_id, type, actions=1)
+            return id
+        return await self._run(add)
+
+    async def add_many(self, logs: List[dict]) -> None:
+        """ Logs several actions (dicts of user_id, mod_id, type and reason) with a single multi-row insert. """
+        def add_many(table):
+            timestamp = int(time.time())
+            rows = [dict(log, timestamp=timestamp) for log in logs]
+            # Table.insert_many() runs on the connection the table was first loaded with, not this session's.
+            table.db.executable.execute(table.table.insert(), rows)
+
+            counts = collections.Counter((row["mod_id"], row["type"]) for row in rows)
+            for (mod_id, type), actions in counts.items():
+                bump_mod_stats(table.db, stats_day(timestamp), mod_id, type, actions=actions)
+        if logs:
+            await self._run(add_many)
+
+    async def latest(self, user_id: int, type: str) -> Optional[dict]:
+        """ Returns the most recent action of a type for the user, sorted by descending (-) ID. """
+        return await self.find_one(user_id=user_id, type=type, order_by="-id")
+
+    async def for_user(self, user_id: int, type: str = None) -> List[dict]:
+        """ Returns every action against the user, optionally only those of a type. """
+        if type:
+            return await self.find(user_id=user_id, type=type)
+        return await self.find(user_id=user_id)
+
+    async def count_for_user(self, user_id: int, type: str = None) -> int:
+        """ Returns how many actions were taken against the user, optionally only those of a type. """
+        filters = dict(user_id=user_id, type=type) if type else dict(user_id=user_id)
+        return await self._run(lambda table: table.count(**filters))
+
+    async def page_for_user(
+        self, user_id: int, type: str = None, before_id: int = None, after_id: int = None, limit: int = 10
+    ) -> List[dict]:
+        """ Returns up to `limit` actions against the user by descending ID, starting below `before_id` or above `after_id`.
+
+        Pages are found by the ID of the row next to them (keyset pagination), so every page is a single range scan over
+        the (user_id, type, id) index however deep into the history it is. Pages taken above `after_id` are read upwards
+        from that ID and flipped, so the last page is found with after_id=0.
+        """
+        filters = dict(user_id=user_id, type=type) if type else dict(user_id=user_id)
+        if after_id is not None:
+            rows = await self.find(**filters, id={">": after_id}, order_by="id", _limit=limit)
+            return rows[::-1]
+        if before_id is not None:
+            filters["id"] = {"<": before_id}
+        return await self.find(**filters, order_by="-id", _limit=limit)
+
+    async def search_reasons(
+        self, query: str, type: str = None, since: float = None, until: float = None, limit: int = 100
+    ) -> List[dict]:
+        """ Returns the actions whose reason matches the query, best match first, with their relevance as "score".
+
+        On MySQL/MariaDB this is a natural language search on the ft_mod_logs_reason FULLTEXT index, so it doesn't
+        scan the table. Other databases fall back to a substring match, newest first and without a score.
+        """
+        def search(table):
+            db = table.db
+            params = dict(terms=query, limit=limit)
+            conditions = []
+            if type:
+                conditions.append("type = :type")
+                params["type"] = type
+            if since is not None:
+                conditions.append("timestamp >= :since")
+                params["since"] = int(since)
+            if until is not None:
+                conditions.append("timestamp < :until")
+                params["until"] = int(until)
+            where = "".join(f" AND {condition}" for condition in conditions)
+
+            if db.engine.dialect.name == "mysql":
+                match = "MATCH(reason) AGAINST (:terms IN NATURAL LANGUAGE MODE)"
+                statement = (
+                    f"SELECT id, user_id, mod_id, timestamp, reason, type, {match} AS score FROM mod_logs "
+                    f"WHERE {match}{where} ORDER BY score DESC LIMIT :limit"
+                )
+            else:
+                params["terms"] = f"%{query}%"
+                statement = (
+                    f"SELECT id, user_id, mod_id, timestamp, reason, type, NULL AS score FROM mod_logs "
+                    f"WHERE reason LIKE :terms{where} ORDER BY id DESC LIMIT :limit"
+                )
+            return [dict(row) for row in db.query(statement, **params)]
+        return await self._run(search)
+
+    async def edit_reason(self, id: int, reason: str) -> Optional[dict]:
+        """ Replaces the reason of a log, returning the log as it was before the edit or None if it doesn't exist. """
+        def edit(table):
+            mod_log = table.find_one(id=id)
+            if mod_log:
+                table.update(dict(id=id, reason=reason), ["id"])
+            return mod_log
+        return await self._run(edit)
+
+
+class TimedModActionRepository(Repository):
+    """ Temporary moderator actions that are undone by the scheduler once they expire. """
+
+    table = "timed_mod_actions"
+
+    async def add(self, user_id: int, mod_id: int, action_type: str, reason: str, end_time: float) -> int:
+        """ Stores a temporary action and returns its ID, adding its duration to the mod_stats rollups. """
+        def add(table):
+            start_time = datetime.now(tz=timezone.utc).timestamp()
+            id = table.insert(dict(
+                user_id=user_id,
+                mod_id=mod_id,
+                action_type=action_type,
+                reason=reason,
+                start_time=start_time,
+                end_time=end_time,
+                is_done=False
+            ))
+            bump_mod_stats(table.db, stats_day(start_time), mod_id, action_type, timed=1, duration=end_time - start_time)
+            return id
+        return await self._run(add)
+
+    async def pending(self, user_id: int, action_type: str = None) -> Optional[dict]:
+        """ Returns an unresolved action against the user, optionally only one of a type. """
+        if action_type:
+            return await self.find_one(user_id=user_id, is_done=False, action_type=action_type)
+        return await self.find_one(user_id=user_id, is_done=False)
+
+    async def unresolved(self) -> List[dict]:
+        """ Returns every action that hasn't been reversed yet, expired or not. """
+        return await self.find(is_done=False)
+
+    async def mark_done(self, id: int) -> None:
+        await self.update(dict(id=id, is_done=True))
+
+    async def resolve(self, user_id: int, action_type: str = None) -> Optional[dict]:
+        """ Marks an unresolved action against the user as done, returning it or None if there wasn't one. """
+        def resolve(table):
+            filters = dict(user_id=user_id, is_done=False)
+            if action_type:
+                filters["action_type"] = action_type
+            entry = table.find_one(**filters)
+            if entry:
+                table.update(dict(id=entry["id"], is_done=True), ["id"])
+            return entry
+        return await self._run(resolve)
+
+
+class ReminderRepository(Repository):
+    """ /remindme messages in the remind_me table. """
+
+    table = "remind_me"
+
+    async def add(self, reminder_location: int, author_id: int, date_to_remind: float, message: str) -> int:
+        """ Stores a reminder and returns its ID. """
+        return await self.insert(
+            reminder_location=reminder_location,
+            author_id=author_id,
+            date_to_remind=date_to_remind,
+            message=message,
+            sent=False
+        )
+
+    async def pending_for(self, author_id: int) -> List[dict]:
+        """ Returns the reminders of a user that haven't been sent yet. """
+        return await self.find(sent=False, author_id=author_id)
+
+    async def unsent(self) -> List[dict]:
+        """ Returns every reminder that hasn't been sent yet, due or not. """
+        return await self.find(sent=False)
+
+    async def set_message(self, id: int, message: str) -> None:
+        await self.update(dict(id=id, message=message))
+
+    async def mark_sent(self, id: int) -> None:
+        await self.update(dict(id=id, sent=True))
+
+    async def clear(self, author_id: int) -> List[dict]:
+        """ Marks every unsent reminder of a user as sent, returning the reminders that were cleared. """
+        def clear(table):
+            reminders = list(table.find(author_id=author_id, sent=False))
+            for reminder in reminders:
+                table.update(dict(id=reminder["id"], sent=True), ["id"])
+            return reminders
+        return await self._run(clear)
+
+
+class TicketRepository(Repository):
+    """ Modmail tickets in the tickets table. """
+
+    table = "tickets"
+
+    async def add(self, user_id: int, guild: int, ticket_topic: str, status: str = "in-progress", log_url: str = None) -> int:
+        """ Stores a ticket and returns its ID. """
+        return await self.insert(
+            user_id=user_id,
+            status=status,
+            guild=guild,
+            timestamp=int(time.time()),
+            ticket_topic=ticket_topic,
+            log_url=log_url
+        )
+
+    async def open_for(self, user_id: int) -> Optional[dict]:
+        """ Returns the user's ticket that is still in progress. """
+        return await self.find_one(user_id=user_id, status="in-progress")
+
+    async def complete(self, id: int, log_url: str) -> None:
+        """ Marks a ticket as completed and stores the URL of its transcript. """
+        await self.update(dict(id=id, status="completed", log_url=log_url))
+
+    async def set_log_url(self, id: int, log_url: str) -> None:
+        await self.update(dict(id=id, log_url=log_url))
+
+
+class SettingsRepository(Repository):
+    """ Key:value pairs in the settings table. """
+
+    table = "settings"
+
+    async def names(self) -> List[str]:
+        return await self._run(lambda table: [setting["name"] for setting in table.all()])
+
+    async def add(self, name: str, value: str, censored: bool) -> bool:
+        """ Adds a setting, returning False without changing anything if one with that name already exists. """
+        def add(table):
+            if table.find_one(name=name):
+                return False
+            table.insert(dict(name=name, value=value, censored=censored))
+            return True
+        return await self._run(add)
+
+    async def edit(self, name: str, value: str, censored: bool = None) -> bool:
+        """ Updates a setting, returning False if it doesn't exist. The censored flag is only changed if given. """
+        def edit(table):
+            setting = table.find_one(name=name)
+            if not setting:
+                return False
+            setting["value"] = value
+            if censored is not None:
+                setting["censored"] = censored
+            table.update(setting, ["id"])
+            return True
+        return await self._run(edit)
+
+    async def remove(self, name: str) -> bool:
+        """ Deletes a setting, returning False if it doesn't exist. """
+        return await self._run(lambda table: table.delete(name=name))
+
+
+class TranscriptUploadRepository(Repository):
+    """ Transcripts waiting in the transcript_uploads table to be uploaded to PrivateBin. """
+
+    table = "transcript_uploads"
+
+    async def add(self, name: str, path: str) -> int:
+        """ Queues the local copy of a transcript for upload and returns its ID. """
+        now = int(time.time())
+        return await self.insert(name=name, path=path, attempts=0, next_attempt=now, created_at=now, uploaded=False)
+
+    async def attach(self, id: int, channel_id: int, message_id: int, ticket_id: int = None) -> None:
+        """ Stores the archive message (and ticket) to update with the URL once the transcript is uploaded. """
+        await self.update(dict(id=id, channel_id=channel_id, message_id=message_id, ticket_id=ticket_id))
+
+    async def due(self, now: float) -> List[dict]:
+        """ Returns the transcripts whose next upload attempt is due, oldest first. """
+        return await self.find(uploaded=False, next_attempt={"<=": now}, order_by="next_attempt")
+
+    async def postpone(self, id: int, attempts: int, next_attempt: float) -> None:
+        await self.update(dict(id=id, attempts=attempts, next_attempt=next_attempt))
+
+    async def mark_uploaded(self, id: int, url: str) -> None:
+        await self.update(dict(id=id, uploaded=True, url=url))
+
+
+class SlashCommandRepository(Repository):
+    """ The slash commands as last registered with Discord, in the slash_commands table. """
+
+    table = "slash_commands"
+
+    async def all(self) -> List[dict]:
+        return await self._run(lambda table: list(table.all()))
+
+    async def save(self, scope: int, name: str, command_id: int, hash: str, permissions_hash: str = None) -> None:
+        """ Records the registration of a command, replacing the previous one. """
+        row = dict(scope=scope, name=name, command_id=command_id, hash=hash, permissions_hash=permissions_hash)
+        await self._run(lambda table: table.upsert(row, ["scope", "name"]))
+
+    async def set_permissions_hash(self, scope: int, name: str, permissions_hash: str) -> None:
+        await self.update(dict(scope=scope, name=name, permissions_hash=permissions_hash), ["scope", "name"])
+
+    async def remove(self, scope: int, name: str) -> None:
+        await self._run(lambda table: table.delete(scope=scope, name=name))
+
+    async def replace_scope(self, scope: int, rows: List[dict]) -> None:
+        """ Replaces every recorded command of a scope at once, after the whole scope was registered again. """
+        def replace(table):
+            table.delete(scope=scope)
+            for row in rows:
+                table.insert(dict(row, scope=scope))
+        await self._run(replace)
+
+
+class RedditMarkRepository(Repository):
+    """ The newest submission relayed from each subreddit (or multireddit) in the reddit_marks table. """
+
+    table = "reddit_marks"
+
+    async def get_mark(self, subreddit: str) -> Optional[dict]:
+        return await self.find_one(subreddit=subreddit)
+
+    async def set_mark(self, subreddit: str, created_utc: float, submission_id: str) -> None:
+        row = dict(subreddit=subreddit, created_utc=created_utc, submission_id=submission_id)
+        await self._run(lambda table: table.upsert(row, ["subreddit"]))
+
+
+class ModStatsRepository(Repository):
+    """ Per day, moderator and action type counters in the mod_stats table, kept up to date by bump_mod_stats(). """
+
+    table = "mod_stats"
+
+    async def totals(self, since: str, mod_id: int = None) -> List[dict]:
+        """ Returns the actions, timed actions and their total duration of each type since a day, busiest type first. """
+        def totals(table):
+            where, params = self._filters(since, mod_id)
+            return [dict(row) for row in table.db.query(
+                f"SELECT type, SUM(actions) AS actions, SUM(timed) AS timed, SUM(duration) AS duration "
+                f"FROM mod_stats WHERE {where} GROUP BY type ORDER BY actions DESC",
+                **params
+            )]
+        return await self._run(totals)
+
+    async def top_moderators(self, since: str, limit: int = 5) -> List[dict]:
+        """ Returns the moderators with the most actions since a day, leaving out the unattributed actions. """
+        def top(table):
+            where, params = self._filters(since)
+            return [dict(row) for row in table.db.query(
+                f"SELECT mod_id, SUM(actions) AS actions FROM mod_stats "
+                f"WHERE {where} AND mod_id IS NOT NULL AND mod_id != :unattributed "
+                f"GROUP BY mod_id ORDER BY actions DESC LIMIT :limit",
+                limit=limit, unattributed=UNATTRIBUTED_MOD_ID, **params
+            )]
+        return await self._run(top)
+
+    async def per_day(self, since: str, mod_id: int = None) -> List[dict]:
+        """ Returns the amount of actions of each day since a day, oldest first. """
+        def per_day(table):
+            where, params = self._filters(since, mod_id)
+            return [dict(row) for row in table.db.query(
+                f"SELECT day, SUM(actions) AS actions FROM mod_stats WHERE {where} GROUP BY day ORDER BY day",
+                **params
+            )]
+        return await self._run(per_day)
+
+    @staticmethod
+    def _filters(since: str, mod_id: int = None):
+        if mod_id:
+            return "day >= :since AND mod_id = :mod_id", dict(since=since, mod_id=mod_id)
+        return "day >= :since", dict(since=since)
+
+
+mod_logs = ModLogRepository()
+timed_mod_actions = TimedModActionRepository()
+reminders = ReminderRepository()
+tickets = TicketRepository()
+settings = SettingsRepository()
+transcript_uploads = TranscriptUploadRepository()
+mod_stats = ModStatsRepository()
+slash_commands = SlashCommandRepository()
+reddit_marks = RedditMarkRepository()
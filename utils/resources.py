@@ -0,0 +1,60 @@
+import logging
+from typing import Dict, Optional, Tuple, Union
+
+import discord
+
+from utils.config import store as config_store
+
+log = logging.getLogger(__name__)
+
+
+class ResourceRegistry:
+    """ Resolves the roles, channels and categories that settings refer to by ID.
+
+    Settings such as role_staff or channel_mute_log are resolved through the O(1) guild.get_role() and
+    guild.get_channel() lookups instead of scanning guild.roles or guild.channels, and the result is cached per guild.
+    The cache is dropped whenever the settings change, and per guild by the role and channel listeners in
+    cogs/listeners/guild_updates.py so deleted or recreated objects are never served.
+    """
+
+    def __init__(self):
+        self._cache: Dict[Tuple[int, str], Optional[Union[discord.Role, discord.abc.GuildChannel]]] = {}
+        self._version = None
+
+    def _resolve(self, guild: discord.Guild, name: str, getter):
+        # Anything resolved under older settings may point to the wrong object.
+        if self._version != config_store.version:
+            self._cache.clear()
+            self._version = config_store.version
+
+        key = (guild.id, name)
+        if key not in self._cache:
+            try:
+                resource_id = config_store.get(name)
+            except KeyError:
+                log.warning(f"Unable to resolve '{name}', no setting with that name exists.")
+                resource_id = None
+            self._cache[key] = getter(resource_id) if isinstance(resource_id, int) else None
+        return self._cache[key]
+
+    def role(self, guild: discord.Guild, name: str) -> Optional[discord.Role]:
+        """ Returns the role whose ID is stored in the named setting, or None if it doesn't exist. """
+        return self._resolve(guild, name, guild.get_role)
+
+    def channel(self, guild: discord.Guild, name: str) -> Optional[discord.abc.GuildChannel]:
+        """ Returns the channel or category whose ID is stored in the named setting, or None if it doesn't exist. """
+        return self._resolve(guild, name, guild.get_channel)
+
+    def invalidate(self, guild: discord.Guild = None) -> None:
+        """ Forgets every resolved resource of a guild, or of all guilds if none is given. """
+        if guild is None:
+            self._cache.clear()
+            return
+        for key in [key for key in self._cache if key[0] == guild.id]:
+            del self._cache[key]
+
+
+registry = ResourceRegistry()
+role = registry.role
+channel = registry.channel
+invalidate = registry.invalidate
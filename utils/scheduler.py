@@ -0,0 +1,138 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set, Tuple
+
+log = logging.getLogger(__name__)
+
+# Never sleep longer than this in one go, so changes to the system clock are picked up within the hour.
+MAX_SLEEP = 3600
+
+
+class Scheduler:
+    """ Runs a callback for each scheduled key once its due time (a UNIX timestamp) is reached.
+
+    Entries are kept in a min-heap and the scheduler sleeps until the earliest one is due, so nothing is polled while
+    nothing is due. Scheduling a key that already exists reschedules it, and cancelled entries are simply skipped when
+    they reach the top of the heap, or dropped all at once when they outnumber the live ones. Callbacks in flight are
+    cancelled by stop().
+
+    Example:
+        scheduler = Scheduler(send_reminder, name="reminders")
+        scheduler.start()
+        scheduler.schedule(reminder["id"], reminder["date_to_remind"], reminder)
+    """
+
+    def __init__(self, callback: Callable[[Hashable, Any], Awaitable[None]], name: str = "scheduler"):
+        self.callback = callback
+        self.name = name
+        # Heap of (due time, sequence, key), the sequence breaks ties and tells stale entries apart.
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        # The live entry of every scheduled key: key -> (due time, sequence, payload).
+        self._entries: Dict[Hashable, Tuple[float, int, Any]] = {}
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._task = None
+        # The callbacks in flight, referenced so they aren't garbage collected before they finish.
+        self._running: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def schedule(self, key: Hashable, when: float, payload: Any = None) -> None:
+        """ Schedules the callback for a key at a UNIX timestamp, replacing any existing entry for that key. """
+        sequence = next(self._counter)
+        self._entries[key] = (when, sequence, payload)
+        heapq.heappush(self._heap, (when, sequence, key))
+        self._compact()
+        self._wake()
+
+    def cancel(self, key: Hashable) -> bool:
+        """ Cancels the entry for a key, returning False if it wasn't scheduled. """
+        if self._entries.pop(key, None) is None:
+            return False
+        self._compact()
+        self._wake()
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._heap.clear()
+        self._wake()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._running:
+            task.cancel()
+        self._running.clear()
+
+    def _compact(self) -> None:
+        # Rebuild the heap from the live entries once the stale ones make up most of it.
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [(when, sequence, key) for key, (when, sequence, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _wake(self) -> None:
+        # Makes the run loop re-check the top of the heap, the earliest due time may have changed.
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _pop_due(self, now: float) -> List[Tuple[Hashable, Any]]:
+        due = []
+        while self._heap:
+            when, sequence, key = self._heap[0]
+            entry = self._entries.get(key)
+
+            # Drop entries that were cancelled or rescheduled since they were pushed.
+            if entry is None or entry[1] != sequence:
+                heapq.heappop(self._heap)
+                continue
+
+            if when > now:
+                break
+
+            heapq.heappop(self._heap)
+            del self._entries[key]
+            due.append((key, entry[2]))
+        return due
+
+    def _next_delay(self, now: float):
+        # The top of the heap is always live after _pop_due(), or the heap is empty.
+        if not self._heap:
+            return None
+        return min(self._heap[0][0] - now, MAX_SLEEP)
+
+    async def _run(self) -> None:
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+
+            for key, payload in self._pop_due(now):
+                task = asyncio.get_event_loop().create_task(self._fire(key, payload))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            delay = self._next_delay(now)
+            try:
+                # Sleep until the next entry is due, or indefinitely if there is nothing scheduled.
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key: Hashable, payload: Any) -> None:
+        try:
+            await self.callback(key, payload)
+        except Exception:
+            log.exception(f"{self.name}: callback for {key!r} failed.")
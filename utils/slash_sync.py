@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Dict, Set, Tuple
+
+import discord
+from discord_slash import SlashCommand
+
+from utils import repositories
+
+log = logging.getLogger(__name__)
+
+# The scope global commands are recorded under, guild commands use the guild ID.
+GLOBAL_SCOPE = 0
+
+
+def canonical(data) -> str:
+    """ Serializes a command or its permissions the same way every time, whatever the order it was declared in. """
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def digest(data) -> str:
+    return hashlib.sha256(canonical(data).encode("utf-8")).hexdigest()
+
+
+async def manifest(slash: SlashCommand) -> Dict[int, Dict[str, Tuple[dict, dict]]]:
+    """ Returns the registered commands as scope to command name to (command payload, permissions by guild). """
+    commands = await slash.to_dict()
+    scopes = {GLOBAL_SCOPE: commands["global"], **commands["guild"]}
+
+    result = {}
+    for scope, scope_commands in scopes.items():
+        result[scope] = {}
+        for command in scope_commands:
+            command = dict(command)
+            permissions = command.pop("permissions", None) or {}
+            result[scope][command["name"]] = (command, permissions)
+    return result
+
+
+class SlashCommandSync:
+    """ Registers the slash commands with Discord, sending only what changed since the last sync.
+
+    The command tree of discord_slash is serialized in a canonical form and hashed per command, and the hashes of the
+    last successful sync are kept in the slash_commands table along with the IDs Discord gave the commands. Added,
+    changed and removed commands are then sent one request each, and the permissions of a guild are only sent again if
+    one of its commands changed. A scope nothing is recorded for yet is registered as a whole in a single request,
+    which also drops the commands registered outside of the bot, and so is a full sync (see sync(full=True)). Once
+    everything is recorded, a restart without changes doesn't send a single request.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self._lock = None
+
+    async def _register_scope(self, slash: SlashCommand, scope: int, desired: Dict[str, Tuple[dict, dict]]) -> Dict[str, int]:
+        """ Registers every command of a scope in one request, replacing whatever was registered before. """
+        response = await slash.req.put_slash_commands(
+            slash_commands=[command for command, _ in desired.values()], guild_id=scope or None
+        )
+        self.requests += 1
+        ids = {command["name"]: int(command["id"]) for command in response}
+
+        # The permissions are recorded once they are sent.
+        await repositories.slash_commands.replace_scope(scope, [
+            dict(name=name, command_id=ids[name], hash=digest(command), permissions_hash=None)
+            for name, (command, _) in desired.items()
+        ])
+        return ids
+
+    async def _sync_scope(self, slash: SlashCommand, scope: int, desired: Dict[str, Tuple[dict, dict]], recorded: Dict[str, dict]) -> Dict[str, int]:
+        """ Sends the commands of a scope that changed since the last sync and returns the IDs of all of them. """
+        guild_id = scope or None
+        ids = {name: row["command_id"] for name, row in recorded.items() if name in desired}
+
+        try:
+            for name, (command, _) in desired.items():
+                row = recorded.get(name)
+                if row is None:
+                    response = await slash.req.command_request(method="POST", guild_id=guild_id, json=command)
+                    log.info(f"Registered the new slash command /{name}.")
+                elif row["hash"] != digest(command):
+                    response = await slash.req.command_request(
+                        method="PATCH", guild_id=guild_id, url_ending=f"/{row['command_id']}", json=command
+                    )
+                    log.info(f"Updated the slash command /{name}.")
+                else:
+                    continue
+                self.requests += 1
+                ids[name] = int(response["id"])
+                permissions_hash = row["permissions_hash"] if row and row["command_id"] == ids[name] else None
+                await repositories.slash_commands.save(scope, name, ids[name], digest(command), permissions_hash)
+
+            for name, row in recorded.items():
+                if name not in desired:
+                    await slash.req.remove_slash_command(guild_id, row["command_id"])
+                    self.requests += 1
+                    await repositories.slash_commands.remove(scope, name)
+                    log.info(f"Removed the slash command /{name}.")
+        except discord.NotFound:
+            # A recorded command was deleted outside of the bot, the record can't be trusted anymore.
+            log.warning(f"The recorded slash commands of scope {scope} are out of date, registering them again.")
+            return await self._register_scope(slash, scope, desired)
+
+        return ids
+
+    async def sync(self, slash: SlashCommand, full: bool = False) -> str:
+        """ Brings the slash commands and their permissions registered with Discord up to date, returning a summary. """
+        # A reload can ask for a sync while the startup one is still running.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await self._sync(slash, full)
+
+    async def _sync(self, slash: SlashCommand, full: bool) -> str:
+        self.requests = 0
+        commands = await manifest(slash)
+
+        recorded: Dict[int, Dict[str, dict]] = {}
+        for row in await repositories.slash_commands.all():
+            recorded.setdefault(row["scope"], {})[row["name"]] = row
+
+        # Command IDs by scope and name, to address the permissions.
+        ids: Dict[int, Dict[str, int]] = {}
+        for scope, desired in commands.items():
+            if not full and not desired and not recorded.get(scope):
+                # Nothing registered and nothing to register, only a full sync clears what was registered elsewhere.
+                ids[scope] = {}
+            elif full or not recorded.get(scope):
+                ids[scope] = await self._register_scope(slash, scope, desired)
+            else:
+                ids[scope] = await self._sync_scope(slash, scope, desired, recorded[scope])
+
+        # Scopes that lost all their commands.
+        for scope, rows in recorded.items():
+            if scope not in commands:
+                await self._sync_scope(slash, scope, {}, rows)
+
+        # A guild's permissions are set as a whole, so they are sent again if any of its commands got new ones or a new ID.
+        recorded = {}
+        for row in await repositories.slash_commands.all():
+            recorded.setdefault(row["scope"], {})[row["name"]] = row
+        stale_guilds: Set[int] = set()
+        for scope, desired in commands.items():
+            for name, (_, permissions) in desired.items():
+                if permissions and recorded[scope][name]["permissions_hash"] != digest(permissions):
+                    stale_guilds.update(permissions)
+
+        for guild_id in stale_guilds:
+            guild_permissions = [
+                dict(id=ids[scope][name], permissions=permissions[guild_id])
+                for scope, desired in commands.items()
+                for name, (_, permissions) in desired.items()
+                if guild_id in permissions
+            ]
+            await slash.req.update_guild_commands_permissions(guild_id, guild_permissions)
+            self.requests += 1
+
+        # Record the permissions only once every guild they apply to has them.
+        for scope, desired in commands.items():
+            for name, (_, permissions) in desired.items():
+                if permissions and recorded[scope][name]["permissions_hash"] != digest(permissions):
+                    await repositories.slash_commands.set_permissions_hash(scope, name, digest(permissions))
+
+        count = sum(len(desired) for desired in commands.values())
+        summary = f"Synced {count} slash commands with {self.requests} request(s){' (full sync)' if full else ''}."
+        log.info(summary)
+        return summary
+
+
+slash_sync = SlashCommandSync()
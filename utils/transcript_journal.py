@@ -0,0 +1,92 @@
+import datetime
+import logging
+from typing import Dict, Iterable, List, Union
+
+import discord
+
+log = logging.getLogger(__name__)
+
+# Channels whose transcript is archived when they are closed.
+JOURNALED_PREFIXES = ("ticket-", "mute-")
+
+
+class JournalEntry:
+    """ A message as it will appear in the transcript. """
+
+    __slots__ = ("created_at", "author", "content")
+
+    def __init__(self, created_at: datetime.datetime, author: Union[discord.Member, discord.User], content: str):
+        self.created_at = created_at
+        self.author = author
+        self.content = content
+
+    @classmethod
+    def from_message(cls, message: discord.Message) -> "JournalEntry":
+        return cls(message.created_at, message.author, message.content)
+
+
+class TranscriptJournal:
+    """ Keeps the transcript of ticket and mute channels up to date as messages are sent, edited and deleted.
+
+    A channel is journaled from the moment it is created, so closing it only has to format the entries instead of
+    crawling the whole history (one request per 100 messages). Channels that already existed when the bot started
+    aren't journaled, their transcript is still built from the channel history.
+    """
+
+    def __init__(self):
+        # Channel ID to the message ID to entry of every message sent in it by someone other than a bot.
+        self._channels: Dict[int, Dict[int, JournalEntry]] = {}
+
+    @staticmethod
+    def is_journaled(channel: discord.abc.GuildChannel) -> bool:
+        return isinstance(channel, discord.TextChannel) and channel.name.startswith(JOURNALED_PREFIXES)
+
+    def open(self, channel: discord.abc.GuildChannel) -> None:
+        """ Starts journaling a channel that was just created, if it is a ticket or mute channel. """
+        if self.is_journaled(channel):
+            self._channels.setdefault(channel.id, {})
+
+    def close(self, channel_id: int) -> None:
+        """ Forgets the journal of a channel, once it was archived or deleted. """
+        self._channels.pop(channel_id, None)
+
+    def record(self, message: discord.Message) -> None:
+        entries = self._channels.get(message.channel.id)
+        if entries is not None and not message.author.bot:
+            entries[message.id] = JournalEntry.from_message(message)
+
+    def edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        entries = self._channels.get(payload.channel_id)
+        # Edits that only add an embed to the message don't carry its content.
+        if entries and payload.message_id in entries and "content" in payload.data:
+            entries[payload.message_id].content = payload.data["content"]
+
+    def delete(self, channel_id: int, message_ids: Iterable[int]) -> None:
+        entries = self._channels.get(channel_id)
+        if entries:
+            for message_id in message_ids:
+                entries.pop(message_id, None)
+
+    async def entries(self, channel: discord.TextChannel) -> List[JournalEntry]:
+        """ Returns the messages of a channel from old to new, from the journal or the channel history otherwise. """
+        if channel.id in self._channels:
+            # Message IDs are snowflakes, sorting them puts any event received out of order back in place.
+            return [entry for _, entry in sorted(self._channels[channel.id].items())]
+
+        log.info(f"No journal for {channel.name}, building its transcript from the channel history.")
+        return [
+            JournalEntry.from_message(message)
+            async for message in channel.history(limit=None, oldest_first=True)
+            if not message.author.bot
+        ]
+
+    @staticmethod
+    def format(entries: Iterable[JournalEntry]) -> str:
+        """ Formats entries as transcript lines. """
+        # Time format is unnecessarily lengthy so trimming it down and keep the log go easier on the eyes.
+        return "".join(
+            f"[{str(entry.created_at).split('.')[0]}] {entry.author}: {entry.content}\n" for entry in entries
+        )
+
+
+journal = TranscriptJournal()
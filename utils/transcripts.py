@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import aiohttp
+import discord
+
+from utils import repositories
+
+log = logging.getLogger(__name__)
+
+# PrivateBin instance the transcripts are uploaded to, can be pointed at a local instance for testing.
+PRIVATEBIN_URL = os.getenv("PRIVATEBIN_URL") or "https://bin.piracy.moe"
+# Folder the transcripts are kept in until they could be uploaded.
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR") or "transcripts"
+
+# Shown in the archive embed instead of the link until the upload succeeds.
+PENDING_LINK = "Upload pending, the transcript is attached to this message."
+
+# Failed uploads are retried after 1, 2, 4, ... minutes, capped to once every 6 hours.
+RETRY_BASE_DELAY = 60
+RETRY_MAX_DELAY = 6 * 60 * 60
+
+
+class TranscriptUploadError(Exception):
+    """ Raised when the PrivateBin instance refuses a paste. """
+
+
+class Transcript:
+    """ The outcome of archiving a transcript: either the URL of the paste, or a local copy queued for upload. """
+
+    def __init__(self, url: str = None, path: str = None, upload_id: int = None):
+        self.url = url
+        self.path = path
+        self.upload_id = upload_id
+
+    @property
+    def pending(self) -> bool:
+        return self.url is None
+
+    @property
+    def link(self) -> str:
+        """ The value for the archive embed's log field. """
+        return self.url or PENDING_LINK
+
+    def file(self) -> Optional[discord.File]:
+        """ Returns the local copy to attach to the archive message, or None if the upload went through. """
+        return discord.File(self.path) if self.pending else None
+
+
+def _encrypt(text: str, version: int) -> Tuple[str, str]:
+    """ Encrypts the paste the same way privatebinapi does, returning the request body and the key for the URL. """
+    # Imported on first use, the crypto stack is slow to import and only needed once a ticket or mute is closed.
+    from pbincli.format import Paste
+
+    paste = Paste()
+    paste.setVersion(version)
+    paste.setCompression("zlib" if version == 2 else "none")
+    paste.setText(text)
+    paste.encrypt("plaintext", False, False, "never")
+    return paste.getJSON(), paste.getHash()
+
+
+def retry_delay(attempts: int) -> int:
+    """ Returns how many seconds to wait before retrying an upload that failed `attempts` times. """
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+
+
+class TranscriptUploader:
+    """ Uploads ticket and mute transcripts to PrivateBin without blocking the event loop.
+
+    The paste is encrypted on a dedicated thread pool and sent through a single aiohttp session shared by every
+    upload. When the instance can't be reached, the transcript is written to TRANSCRIPT_DIR and queued in the
+    transcript_uploads table, which cogs/tasks/transcript_uploads.py works through until the upload succeeds.
+    """
+
+    def __init__(self, server: str = PRIVATEBIN_URL, directory: str = TRANSCRIPT_DIR, workers: int = 2):
+        self.server = server.rstrip("/") + "/"
+        self.directory = directory
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcripts")
+        self._session = None
+        self._version = None
+
+    def session(self) -> aiohttp.ClientSession:
+        """ Returns the shared HTTP session, (re)creating it if needed. """
+        if self._session is None or self._session.closed:
+            from privatebinapi.common import DEFAULT_HEADERS
+
+            self._session = aiohttp.ClientSession(headers=DEFAULT_HEADERS, timeout=aiohttp.ClientTimeout(total=30))
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def server_version(self) -> int:
+        """ Returns the PrivateBin API version of the instance, fetched once and then cached. """
+        if self._version is None:
+            async with self.session().get(self.server, params={"jsonld": "paste"}) as response:
+                response.raise_for_status()
+                try:
+                    data = await response.json(content_type=None)
+                    self._version = int(data["@context"]["v"]["@value"])
+                # Instances that don't describe their version are running the first version of the API.
+                except (ValueError, KeyError, TypeError):
+                    self._version = 1
+        return self._version
+
+    async def upload(self, text: str) -> str:
+        """ Uploads a transcript that never expires and returns the URL of the paste. """
+        version = await self.server_version()
+        data, passcode = await asyncio.get_running_loop().run_in_executor(self.executor, _encrypt, text, version)
+
+        async with self.session().post(self.server, data=data) as response:
+            response.raise_for_status()
+            result = await response.json(content_type=None)
+
+        # PrivateBin answers with a status of 0 on success and 1 along with a message otherwise.
+        if result.get("status") != 0:
+            raise TranscriptUploadError(result.get("message", "Unknown error."))
+        return f"{self.server}?{result['id']}#{passcode}"
+
+    async def archive(self, text: str, name: str) -> Transcript:
+        """ Uploads a transcript, falling back to a local copy queued for upload if the instance can't take it. """
+        try:
+            return Transcript(url=await self.upload(text))
+        except (aiohttp.ClientError, asyncio.TimeoutError, TranscriptUploadError, ValueError) as error:
+            log.warning(f"Unable to upload the {name} transcript, queuing it for a retry: {error}")
+
+        path = await asyncio.get_running_loop().run_in_executor(self.executor, self._save, text, name)
+        upload_id = await repositories.transcript_uploads.add(name=name, path=path)
+        return Transcript(path=path, upload_id=upload_id)
+
+    async def track(self, transcript: Transcript, message: discord.Message, ticket_id: int = None) -> None:
+        """ Remembers the archive message (and ticket) of a pending transcript so they can be updated once uploaded. """
+        if transcript.pending:
+            await repositories.transcript_uploads.attach(
+                id=transcript.upload_id, channel_id=message.channel.id, message_id=message.id, ticket_id=ticket_id
+            )
+
+    async def retry(self, upload: dict) -> str:
+        """ Uploads a queued transcript from its local copy and returns the URL of the paste. """
+        text = await asyncio.get_running_loop().run_in_executor(self.executor, self._load, upload["path"])
+        return await self.upload(text)
+
+    def _save(self, text: str, name: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        # Channel names are already safe, but keep anything else out of the path.
+        name = re.sub(r"[^\w-]", "_", name)
+        path = os.path.join(self.directory, f"{name}-{int(time.time())}.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+        return path
+
+    @staticmethod
+    def _load(path: str) -> str:
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+
+
+uploader = TranscriptUploader()